@@ -0,0 +1,206 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Main_Scripts"))
+from synthetic_market import write_market_workbooks
+
+# Performance benchmarks of bess_optimization (one LP per backend), update_prices and run_iterations ladders,
+# on seeded synthetic market years (synthetic_market.py), so they run without the 2024 input workbooks.
+# Every benchmark runs in a fresh process, which makes its peak RSS its own. Results are appended as JSON lines
+# (one record per benchmark, with the commit and machine) and can be compared with an earlier file:
+#   python benchmark_suite.py --quick
+#   python benchmark_suite.py --compare baseline.jsonl --threshold 1.25   (exit code 1 on a slowdown)
+
+HOURS = [168, 720, 8784]
+H_BLOCKS = [4, 8, 24]
+LADDERS = [5, 20]
+BACKENDS = ["matrix", "persistent", "da_only"]
+STEP = 100
+BESS_DURATION = 4
+
+# Price impacts per MW(h) of BESS dispatch, of the order of the fitted 2024 coefficients
+COEFFICIENTS_BESS = {"Day-Ahead Market": 0.002, "Imbalance Shortage": -0.01, "Imbalance Surplus": 0.01,
+                     "aFRR Up Contracted": -0.02, "aFRR Down Contracted": -0.02}
+
+# Fields that identify a benchmark across runs
+KEY_FIELDS = ["benchmark", "backend", "hours", "H_block", "steps", "seed"]
+
+
+def market_folder(root, hours, seed):
+    # Synthetic workbooks are generated once per (hours, seed) and reused by later runs
+    folder = os.path.join(root, f"market-{hours}h-seed{seed}")
+    if not os.path.exists(os.path.join(folder, "settled_imbalance_volumes.xlsx")):
+        write_market_workbooks(folder, hours, seed)
+    return folder
+
+
+def initial_prices(folder):
+    from market_data import load_market_data
+    from run1_extrapolation import load_initial_prices
+
+    market = load_market_data(folder)
+    # Zero RES coefficients: the extrapolated prices are the synthetic ones
+    return load_initial_prices(1, 1, 1, 1, 0, 0, 0, 0, 0, market=market), market
+
+
+def bench_optimization(folder, backend, H_block):
+    # One dispatch LP of a STEP MW slice against fresh prices and volumes
+    from run4_RES_iterations import select_backend, new_ladder_state, load_market_volumes, solve_increment
+
+    df, market = initial_prices(folder)
+    solve_log = []
+    optimize = select_backend(backend, solver="highs", solve_log=solve_log)
+    state = new_ladder_state(df, load_market_volumes(market))
+    start = time.perf_counter()
+    increment = solve_increment(optimize, state, STEP, 0.0, BESS_DURATION, H_block)
+    return {"wall_s": time.perf_counter() - start, "solve_s": sum(entry["wall_time"] for entry in solve_log),
+            "lp_solves": len(solve_log), "objective": increment["Marginal_Total_Revenue"]}
+
+
+def bench_update_prices(folder, repeats=200):
+    from run3_updatePrices import update_prices
+
+    df, _ = initial_prices(folder)
+    rng = np.random.default_rng(0)
+    dispatch = [rng.uniform(0, STEP, len(df)) for _ in range(6)]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        update_prices(df, *dispatch, *COEFFICIENTS_BESS.values(), STEP)
+    wall_time = time.perf_counter() - start
+    return {"wall_s": wall_time, "per_call_ms": 1000 * wall_time / repeats, "calls": repeats}
+
+
+def bench_ladder(folder, backend, H_block, steps):
+    # A full capacity ladder of `steps` increments; at zero cost the marginal net revenue stays positive,
+    # so the ladder never stops early and always takes `steps` solves
+    from run4_RES_iterations import run_iterations
+
+    df, market = initial_prices(folder)
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        _, results = run_iterations(df, steps * STEP, STEP, output_dir, BESS_DURATION, H_block, 0.0, 0.0, 0.0,
+                                    COEFFICIENTS_BESS, backend=backend, solver="highs", excel_export=False,
+                                    return_results=True, market=market, checkpoint=False)
+        wall_time = time.perf_counter() - start
+    iterations = results.read("iterations")
+    return {"wall_s": wall_time, "solve_s": float(iterations["Solve_Time_s"].sum()),
+            "lp_solves": int(iterations["LP_Solves"].iloc[-1]),
+            "cumulative_revenue": float(iterations["Cumulative_Total_Revenue"].iloc[-1])}
+
+
+BENCHMARKS = {"bess_optimization": bench_optimization, "update_prices": bench_update_prices, "run_iterations": bench_ladder}
+
+
+def _measure(name, kwargs):
+    # Runs in a fresh worker process; its high-water RSS belongs to this benchmark alone
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = BENCHMARKS[name](**kwargs)
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        metrics["peak_rss_mb"] = peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    except ImportError:
+        metrics["peak_rss_mb"] = None
+    return metrics
+
+
+def run_isolated(name, kwargs):
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_measure, (name, kwargs))
+
+
+def plan(hours, h_blocks, ladders, backends):
+    # (benchmark, identifying fields) for every benchmark of the suite
+    jobs = []
+    for T in hours:
+        for backend in backends:
+            for H_block in h_blocks:
+                jobs.append(("bess_optimization", {"backend": backend, "hours": T, "H_block": H_block}))
+        jobs.append(("update_prices", {"hours": T}))
+        for backend in backends:
+            for steps in ladders:
+                jobs.append(("run_iterations", {"backend": backend, "hours": T, "H_block": h_blocks[0], "steps": steps}))
+    return jobs
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit or None, "python": platform.python_version(), "machine": platform.node(),
+            "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run_suite(jobs, data_dir, seed, out_path):
+    env = environment()
+    records = []
+    for name, fields in jobs:
+        folder = market_folder(data_dir, fields["hours"], seed)
+        kwargs = {key: value for key, value in fields.items() if key != "hours"}
+        metrics = run_isolated(name, dict(kwargs, folder=folder))
+        record = {"benchmark": name, **fields, "seed": seed, **metrics, **env}
+        records.append(record)
+        with open(out_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        label = " ".join(f"{key}={value}" for key, value in fields.items())
+        print(f"{name:<18} {label:<45} {metrics['wall_s']:8.3f} s  peak RSS {metrics['peak_rss_mb'] or 0:7.1f} MB"
+              + (f"  {metrics['lp_solves']} LP" if "lp_solves" in metrics else ""))
+    return records
+
+
+def benchmark_key(record):
+    return tuple(record.get(field) for field in KEY_FIELDS)
+
+
+def compare(records, baseline_path, threshold):
+    # Wall time ratio against the latest matching record of the baseline file; returns the regressions
+    with open(baseline_path) as f:
+        baseline = {benchmark_key(record): record for record in map(json.loads, filter(str.strip, f))}
+    regressions = []
+    print(f"\nAgainst {baseline_path} (slowdown threshold x{threshold}):")
+    for record in records:
+        before = baseline.get(benchmark_key(record))
+        if before is None:
+            continue
+        ratio = record["wall_s"] / before["wall_s"] if before["wall_s"] else float("inf")
+        flag = "SLOWER" if ratio > threshold else ""
+        print(f"  {' '.join(str(v) for v in benchmark_key(record) if v is not None):<50} "
+              f"{before['wall_s']:8.3f} s -> {record['wall_s']:8.3f} s  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(record)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BESS optimization benchmarks on synthetic market years")
+    parser.add_argument("--hours", type=int, nargs="+", default=HOURS)
+    parser.add_argument("--h-blocks", type=int, nargs="+", default=H_BLOCKS)
+    parser.add_argument("--ladders", type=int, nargs="+", default=LADDERS, help="ladder lengths (capacity steps)")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, help="run_iterations backends (pyomo uses HiGHS)")
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="168 and 720 hours, H_block 4, one 5-step ladder")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "synthetic_data"), help="where the synthetic workbooks are kept")
+    parser.add_argument("--out", default="benchmark_results.jsonl", help="JSON lines file the records are appended to")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare the wall times with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="wall time ratio that counts as a slowdown")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.hours, args.h_blocks, args.ladders = [168, 720], [4], [5]
+    jobs = [job for job in plan(args.hours, args.h_blocks, args.ladders, args.backends) if job[0] in args.benchmarks]
+    records = run_suite(jobs, args.data_dir, args.seed, args.out)
+    if args.compare and compare(records, args.compare, args.threshold):
+        sys.exit(1)
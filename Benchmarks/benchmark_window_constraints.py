@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import io
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Main_Scripts"))
+from bess_matrix_lp import assemble_bess_lp, solve_bess_lp
+
+# Compares the explicit rolling H_block aFRR windows (O(T*H_block) nonzeros) with the running-sum
+# form (O(T) nonzeros) on every backend that builds the windows:
+#   - matrix: build time, build memory, constraint nonzeros, solve time and objective
+#   - pyomo (HiGHS): build and solve time of bess_optimization; rule-by-rule construction is where the
+#     explicit form's O(T*H_block) terms cost the most
+#   - persistent: the cold build + solve, and a warm re-solve with moved prices as in a capacity ladder
+# Build memory is only traced for matrix (tracemalloc slows Pyomo's construction several times over).
+
+H_BLOCKS = [4, 8, 16, 24]
+WINDOW_FORMS = ["explicit", "running_sum"]
+BACKENDS = ["matrix", "pyomo", "persistent"]
+
+
+def synthetic_inputs(T, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(T)
+    P_DA_t = 60 + 30 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 15, T)
+    P_imb_t_sur = P_DA_t - 20 + rng.normal(0, 30, T)
+    P_imb_t_short = P_DA_t + 20 + rng.normal(0, 30, T)
+    P_aFRR_up = rng.gamma(2, 10, T)
+    P_aFRR_down = rng.gamma(2, 12, T)
+    caps = (np.full(T, 350.0), np.full(T, 350.0), rng.uniform(50, 400, T), rng.uniform(50, 400, T))
+    return (P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up, P_aFRR_down) + caps
+
+
+def optimization_arguments(inputs, capacity, BESS_duration, H_block, first_run=True, SoC_previous=None):
+    # bess_optimization's arguments from synthetic_inputs (whose volumes are in assemble_bess_lp order), nothing used yet
+    prices, (aFRR_up, aFRR_down, imb_shortage, imb_surplus) = inputs[:5], inputs[5:]
+    unused = np.zeros(len(prices[0]))
+    return (*prices, aFRR_up, aFRR_down, imb_surplus, imb_shortage, capacity, 0.0, BESS_duration, first_run,
+            SoC_previous, unused, unused, unused, unused, H_block)
+
+
+def timed_call(optimize, arguments, **kwargs):
+    # (build seconds, solve seconds, objective) of one bess_optimization-style call; build is everything but the solve
+    solve_log = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        outputs = optimize(*arguments, solve_log=solve_log, arrays=True, **kwargs)
+    total = time.perf_counter() - start
+    solve_time = sum(entry["wall_time"] for entry in solve_log)
+    return total - solve_time, solve_time, outputs
+
+
+def benchmark_pyomo(inputs, capacity, BESS_duration, H_block, window_form):
+    from run2_BESS_optimization import bess_optimization
+    build_time, solve_time, outputs = timed_call(bess_optimization, optimization_arguments(inputs, capacity, BESS_duration, H_block),
+                                                 window_form=window_form, solver="highs")
+    return {"build_s": build_time, "solve_s": solve_time, "objective": outputs[9]}
+
+
+def benchmark_persistent(inputs, capacity, BESS_duration, H_block, window_form):
+    from persistent_lp import PersistentBESSModel
+    model = PersistentBESSModel(window_form=window_form)
+    build_time, solve_time, outputs = timed_call(model.optimize, optimization_arguments(inputs, capacity, BESS_duration, H_block))
+    # The next ladder step: prices moved by the added capacity, starting from the last SoC
+    moved = tuple(price * 0.98 for price in inputs[:5]) + inputs[5:]
+    _, warm_solve_time, _ = timed_call(model.optimize, optimization_arguments(moved, capacity, BESS_duration, H_block,
+                                                                              first_run=False, SoC_previous=outputs[-1]))
+    return {"build_s": build_time, "solve_s": solve_time, "warm_solve_s": warm_solve_time, "objective": outputs[9]}
+
+
+def benchmark(T=8784, capacity=100, BESS_duration=4, seed=0, backends=BACKENDS):
+    inputs = synthetic_inputs(T, seed)
+    SoC_init = 0.9 * capacity * BESS_duration / 2
+    rows = []
+
+    for H_block in H_BLOCKS:
+        for window_form in WINDOW_FORMS:
+            for backend in backends:
+                if backend == "matrix":
+                    continue
+                row = {"pyomo": benchmark_pyomo, "persistent": benchmark_persistent}[backend](
+                    inputs, capacity, BESS_duration, H_block, window_form)
+                rows.append({"backend": backend, "H_block": H_block, "window_form": window_form, "hours": T, **row})
+                print(f"H_block={H_block:>2} {window_form:<11} {backend:<10} build={row['build_s']:6.2f}s "
+                      f"solve={row['solve_s']:6.2f}s" + (f" warm={row['warm_solve_s']:6.2f}s" if "warm_solve_s" in row else "")
+                      + f" objective={row['objective']:.2f}")
+            if "matrix" not in backends:
+                continue
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            lp = assemble_bess_lp(*inputs, capacity, BESS_duration, SoC_init, H_block, window_form=window_form)
+            build_time = time.perf_counter() - start
+            build_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            x = solve_bess_lp(lp)
+            solve_time = time.perf_counter() - start
+
+            rows.append({
+                "backend": "matrix",
+                "H_block": H_block,
+                "window_form": window_form,
+                "hours": T,
+                "columns": lp["A_ub"].shape[1],
+                "rows": lp["A_ub"].shape[0] + lp["A_eq"].shape[0],
+                "nonzeros": lp["A_ub"].nnz + lp["A_eq"].nnz,
+                "build_s": build_time,
+                "build_peak_MB": build_peak / 1e6,
+                "solve_s": solve_time,
+                "objective": float(lp["c"] @ x),
+            })
+            print(f"H_block={H_block:>2} {window_form:<11} matrix     nnz={rows[-1]['nonzeros']:>8} "
+                  f"build={build_time:6.2f}s ({rows[-1]['build_peak_MB']:7.1f} MB) solve={solve_time:6.2f}s "
+                  f"objective={rows[-1]['objective']:.2f}")
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Explicit vs running-sum aFRR window constraints per backend")
+    parser.add_argument("hours", type=int, nargs="?", default=8784)
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    args = parser.parse_args()
+    results = benchmark(args.hours, backends=args.backends)
+    with open("benchmark_window_constraints.json", "w") as f:
+        json.dump(results, f, indent=2)
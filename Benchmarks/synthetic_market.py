@@ -0,0 +1,114 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Seeded synthetic market year in the layout of input_excels/: the same workbooks, sheets and columns, so
+# market_data.build_market_dataset and the whole pipeline run on it unchanged. The series are shaped after the
+# 2024 data (mean / spread / shape of each series), not fitted to it:
+#   - DA price: daily double peak, weekend dip, winter premium, AR(1) noise, midday solar dips into negative
+#     prices in summer (about 5% of hours) and rare scarcity spikes
+#   - imbalance prices: DA plus heavy-tailed (Student-t, 1.8 degrees of freedom) deviations, clipped at +-1500 €/MWh
+#   - aFRR reserve prices: one lognormal price per day; reserve volumes fixed at 350 MW as in 2024
+#   - settled imbalance volumes: persistent (AR(1)) lognormal series around 550 MWh
+# Timestamps are a plain hourly range, i.e. local standard time all year.
+
+# Mean DA price per hour of the day in 2024 (€/MWh)
+DA_DAILY_PROFILE = np.array([72.3, 68.8, 66.2, 64.8, 67.0, 77.1, 87.8, 90.5, 84.3, 72.3, 60.7, 51.1,
+                             44.1, 42.9, 49.7, 63.4, 83.9, 107.6, 122.6, 122.0, 103.9, 91.0, 83.0, 77.8])
+AFRR_VOLUME_MW = 350.0
+
+
+def ar1(rng, n, phi, sigma):
+    # Stationary AR(1) noise with marginal standard deviation sigma
+    shocks = rng.normal(0, sigma * np.sqrt(1 - phi ** 2), n)
+    out = np.empty(n)
+    out[0] = rng.normal(0, sigma)
+    for t in range(1, n):
+        out[t] = phi * out[t - 1] + shocks[t]
+    return out
+
+
+def synthetic_market(hours=8784, seed=0, start="2024-01-01"):
+    # DataFrame with one column per market series (the names of market_data.SOURCES) and a Time column
+    rng = np.random.default_rng(seed)
+    time = pd.date_range(start, periods=hours, freq="h")
+    hour = time.hour.values
+    day_of_year = time.dayofyear.values
+    weekend = time.dayofweek.values >= 5
+    summer = 0.5 * (1 - np.cos(2 * np.pi * (day_of_year - 15) / 366))  # 0 mid-January, 1 mid-July
+
+    da = DA_DAILY_PROFILE[hour] * (1 + 0.15 * (1 - summer)) * np.where(weekend, 0.85, 1.0)
+    da += ar1(rng, hours, 0.9, 28)
+    solar = np.clip(np.cos(2 * np.pi * (hour - 13) / 24), 0, None) ** 3 * summer
+    da -= solar * rng.gamma(2.0, 55.0, hours) * (rng.random(hours) < 0.5)
+    spikes = rng.random(hours) < 0.004
+    da[spikes] += rng.pareto(2.0, spikes.sum()) * 150 + 100
+    da = np.clip(da, -200, 1000)
+
+    deviation = lambda scale: np.clip(rng.standard_t(1.8, hours) * scale, -1500, 1500)
+    imb_surplus = np.clip(da + 15 + deviation(30), -1500, 2500)
+    imb_shortage = np.clip(da - 6 + deviation(30), -1500, 2500)
+
+    days = (np.arange(hours) // 24)
+    lognormal_daily = lambda mean, std: np.exp(rng.normal(np.log(mean ** 2 / np.sqrt(mean ** 2 + std ** 2)),
+                                                          np.sqrt(np.log(1 + std ** 2 / mean ** 2)), days[-1] + 1))[days]
+    afrr_up_price = lognormal_daily(33.0, 15.0)
+    afrr_down_price = lognormal_daily(21.0, 21.0)
+
+    volume = lambda mean: mean * np.exp(ar1(rng, hours, 0.8, 0.45) - 0.45 ** 2 / 2)
+
+    return pd.DataFrame({
+        "Time": time,
+        "DAM_Price": da.round(2),
+        "Imbalance_Surplus_Price": imb_surplus.round(4),
+        "Imbalance_Shortage_Price": imb_shortage.round(4),
+        "aFRR_Up_Price_reserve": afrr_up_price.round(2),
+        "aFRR_Down_Price_reserve": afrr_down_price.round(2),
+        "aFRR_Up_Volume": np.full(hours, AFRR_VOLUME_MW),
+        "aFRR_Down_Volume": np.full(hours, AFRR_VOLUME_MW),
+        "Imbalance_Surplus_Volume": volume(570.0).round(3),
+        "Imbalance_Shortage_Volume": volume(555.0).round(3),
+    })
+
+
+def afrr_workbook(market, direction):
+    price = market[f"aFRR_{direction}_Price_reserve"]
+    return pd.DataFrame({
+        "Timestamp": market["Time"],
+        "Day": market["Time"].dt.dayofyear,
+        "Volume Reserve (MW)": market[f"aFRR_{direction}_Volume"],
+        "Price (€/MW/ISP=15minutes)": (price / 4).round(4),
+        "Direction": direction,
+        "Daily price (€/MW)": (price * 24).round(2),
+        "Hourly price Reserve (€/MW)": price,
+    })
+
+
+def write_market_workbooks(folder, hours=8784, seed=0, start="2024-01-01"):
+    # Writes the six input workbooks of input_excels/ to `folder`; returns the generated series
+    market = synthetic_market(hours, seed, start)
+    os.makedirs(folder, exist_ok=True)
+    path = lambda name: os.path.join(folder, name)
+
+    afrr_workbook(market, "Up").to_excel(path("aFRR_hourly_prices_Up.xlsx"), sheet_name="Sheet1", index=False)
+    afrr_workbook(market, "Down").to_excel(path("aFRR_hourly_prices_Down.xlsx"), sheet_name="Sheet1", index=False)
+    pd.DataFrame({"Date": market["Time"], "Price": market["DAM_Price"]}).to_excel(
+        path("py_2024_DAM_prices_hourly.xlsx"), sheet_name="Sheet1", index=False)
+    pd.DataFrame({"Date": market["Time"], "Price": market["Imbalance_Surplus_Price"]}).to_excel(
+        path("py_2024_imbalance_prices_hourly_surplus.xlsx"), sheet_name="Sheet1", index=False)
+    pd.DataFrame({"Time": market["Time"], "Price": market["Imbalance_Shortage_Price"]}).to_excel(
+        path("py_2024_imbalance_prices_hourly_shortage.xlsx"), sheet_name="Sheet2", index=False)
+    pd.DataFrame({"Time": market["Time"], "Surplus (MWh)": market["Imbalance_Surplus_Volume"],
+                  "Shortage (MWh)": market["Imbalance_Shortage_Volume"]}).to_excel(
+        path("settled_imbalance_volumes.xlsx"), sheet_name="MWh", index=False)
+    return market
+
+
+if __name__ == "__main__":
+    # python synthetic_market.py <folder> [hours] [seed]
+    folder = sys.argv[1] if len(sys.argv) > 1 else "synthetic_market"
+    hours = int(sys.argv[2]) if len(sys.argv) > 2 else 8784
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    market = write_market_workbooks(folder, hours, seed)
+    print(market.drop(columns="Time").describe().T.round(2).to_string())
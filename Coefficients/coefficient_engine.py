@@ -0,0 +1,100 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from excel_cache import read_excel_cached, file_digest, cache_dir_for
+
+# Every price-impact regression of the Coefficients modules: (sheet, dependent variable, regressors, reported coefficient).
+# All of them are OLS with a constant on the sheet's numeric rows (a row with any non-numeric cell is dropped).
+REGRESSIONS = {
+    "bess_DA": ("DA_hourly", "Electricity_Price_DA (€/MWh)",
+                ['Renewable_Share (%)', 'Renewable_energy (MWh)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "Demand (MWh)"),
+    "bess_imb_short": ("Imb_short_hourly", "Electricity_Price_Imb_Short (€/MWh)",
+                       ['Renewable_Share (%)', 'Renewable_energy (MWh)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "Demand (MWh)"),
+    "bess_imb_surplus": ("Imb_surpl_hourly", "Electricity_Price_Imb_Sur (€/MWh)",
+                         ['Renewable_Share (%)', 'Renewable_energy (MWh)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "Demand (MWh)"),
+    "bess_aFRR_up": ("aFRR_up_monthly", "Electricity_Price_aFRR_up_contracted (€/MWh)",
+                     ['BESS_Capacity (MWh)', 'Renewable_Share (%)', 'Renewable_energy (MWh)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "BESS_Capacity (MWh)"),
+    "bess_aFRR_down": ("aFRR_down_monthly", "Electricity_Price_aFRR_down_contracted (€/MWh)",
+                       ['BESS_Capacity (MWh)', 'Renewable_Share (%)', 'Renewable_energy (MWh)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "BESS_Capacity (MWh)"),
+    "res_DA": ("DA_hourly", "Electricity_Price_DA (€/MWh)",
+               ['Renewable_energy (MWh)', 'Renewable_Share (%)', 'Demand (MWh)', 'Coal_Prices (€/MWh)'], "Renewable_Share (%)"),
+    "res_imb_short": ("Imb_short_hourly", "Electricity_Price_Imb_Short (€/MWh)",
+                      ['Renewable_energy (MWh)', 'Renewable_Share (%)', 'Demand (MWh)', 'Coal_Prices (€/MWh)'], "Renewable_Share (%)"),
+    "res_imb_surplus": ("Imb_surpl_hourly", "Electricity_Price_Imb_Sur (€/MWh)",
+                        ['Renewable_energy (MWh)', 'Renewable_Share (%)', 'Demand (MWh)', 'Coal_Prices (€/MWh)'], "Renewable_Share (%)"),
+    "res_aFRR_up": ("aFRR_up_monthly", "Electricity_Price_aFRR_up_contracted (€/MWh)",
+                    ['BESS_Capacity (MWh)', 'Renewable_energy (MWh)', 'Renewable_Share (%)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "Renewable_Share (%)"),
+    "res_aFRR_down": ("aFRR_down_monthly", "Electricity_Price_aFRR_down_contracted (€/MWh)",
+                      ['BESS_Capacity (MWh)', 'Renewable_energy (MWh)', 'Renewable_Share (%)', 'Demand (MWh)', 'Gas_Prices (€/MWh)', 'Coal_Prices (€/MWh)'], "Renewable_Share (%)"),
+}
+
+# Bump when REGRESSIONS or the fitting changes so cached fits are recomputed
+ENGINE_VERSION = 1
+
+_fits = {}
+
+
+def fit_sheet(df, regressions):
+    # All regressions on one sheet from a single pass over the data: the columns are centred and scaled once,
+    # their cross-product matrix is formed once, and each fit solves its own small block of it
+    names = list(dict.fromkeys(column for _, y, X, _ in regressions.values() for column in [y] + X))
+    data = df[names].to_numpy(dtype=np.float64)
+    n = len(data)
+    mean = data.mean(axis=0)
+    scale = data.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (data - mean) / scale
+    gram = Z.T @ Z
+    position = {name: i for i, name in enumerate(names)}
+
+    fits = {}
+    for key, (_, y, X, _) in regressions.items():
+        ix = [position[name] for name in X]
+        iy = position[y]
+        G = gram[np.ix_(ix, ix)]
+        g = gram[ix, iy]
+        G_inv = np.linalg.pinv(G)
+        b = G_inv @ g
+        sse = max(gram[iy, iy] - g @ b, 0.0) * scale[iy] ** 2
+        sigma2 = sse / (n - len(X) - 1)
+
+        slopes = b * scale[iy] / scale[ix]
+        cov = sigma2 * G_inv / np.outer(scale[ix], scale[ix])
+        xbar = mean[ix]
+        params = {"const": mean[iy] - slopes @ xbar, **dict(zip(X, slopes))}
+        bse = {"const": np.sqrt(sigma2 / n + xbar @ cov @ xbar), **dict(zip(X, np.sqrt(np.diag(cov))))}
+        fits[key] = {"params": {k: float(v) for k, v in params.items()},
+                     "bse": {k: float(v) for k, v in bse.items()}, "nobs": n}
+    return fits
+
+
+def fit_all(file_path, cache_dir=None):
+    # Params and standard errors of every regression, memoized per process and cached on disk by workbook hash
+    digest = file_digest(file_path)
+    if digest in _fits:
+        return _fits[digest]
+
+    cache_dir = cache_dir or cache_dir_for(file_path)
+    path = os.path.join(cache_dir, f"coefficients-v{ENGINE_VERSION}-{digest[:16]}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            _fits[digest] = json.load(f)
+        return _fits[digest]
+
+    fits = {}
+    for sheet in dict.fromkeys(spec[0] for spec in REGRESSIONS.values()):
+        df = read_excel_cached(file_path, sheet_name=sheet, cache_dir=cache_dir).apply(pd.to_numeric, errors='coerce').dropna()
+        fits.update(fit_sheet(df, {key: spec for key, spec in REGRESSIONS.items() if spec[0] == sheet}))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fits, f, indent=1)
+    _fits[digest] = fits
+    return fits
+
+
+def coefficient(file_path, key):
+    # The coefficient a Coefficients module reports, or None if its regressor is missing
+    return fit_all(file_path)[key]["params"].get(REGRESSIONS[key][3], None)
@@ -0,0 +1,256 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from math import sqrt
+import time
+
+from instrumentation import laps
+
+# Order of the variable blocks in the stacked decision vector (each block has one entry per hour)
+VARIABLES = ["e_DA_t_plus", "e_DA_t_minus", "e_imb_plus", "e_imb_minus", "e_aFRR_up", "e_aFRR_down", "SoC"]
+DA_PLUS, DA_MINUS, IMB_PLUS, IMB_MINUS, AFRR_UP, AFRR_DOWN, SOC = range(len(VARIABLES))
+
+# Tolerance of keep_larger's comparison of the two sides of an hour: relative, and absolute (MW) below 1 MW
+KEEP_LARGER_TOLERANCE = 1e-9
+
+
+def _window_rows(T, H_block):
+    # Row/column pairs of the rolling H_block sums: row t covers hours t .. t+H_block-1 for t < T - H_block
+    n_rows = max(T - H_block, 0)
+    rows = np.repeat(np.arange(n_rows), H_block)
+    cols = rows + np.tile(np.arange(H_block), n_rows)
+    return n_rows, rows, cols
+
+
+def bess_lp_coefficients(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                         cap_aFRR_up, cap_aFRR_down, cap_imb_shortage, cap_imb_surplus,
+                         capacity, BESS_duration, SoC_init):
+
+    # Objective and variable bounds: the only parts of the LP that change between capacity increments
+    T = len(P_DA_t)
+    N = len(VARIABLES) * T
+    SoC_min = 0.1 * capacity * BESS_duration
+    SoC_max = 0.9 * capacity * BESS_duration
+    hours = np.arange(T)
+
+    def col(block, t):
+        return block * T + t
+
+    # Objective (revenue per variable, maximized)
+    revenue = np.zeros((3, N))  # rows: DA, Imbalance, aFRR reserve
+    revenue[0, col(DA_PLUS, hours)] = P_DA_t
+    revenue[0, col(DA_MINUS, hours)] = -np.asarray(P_DA_t)
+    revenue[1, col(IMB_PLUS, hours)] = P_imb_t_short
+    revenue[1, col(IMB_MINUS, hours)] = -np.asarray(P_imb_t_sur)
+    revenue[2, col(AFRR_UP, hours)] = P_aFRR_up_reserve
+    revenue[2, col(AFRR_DOWN, hours)] = P_aFRR_down_reserve
+
+    # Variable bounds: non-negativity, SoC limits and the remaining market volumes
+    lb = np.zeros(N)
+    ub = np.full(N, np.inf)
+    ub[col(AFRR_UP, hours)] = cap_aFRR_up
+    ub[col(AFRR_DOWN, hours)] = cap_aFRR_down
+    ub[col(IMB_PLUS, hours)] = cap_imb_shortage
+    ub[col(IMB_MINUS, hours)] = cap_imb_surplus
+    lb[col(SOC, hours)] = SoC_min
+    ub[col(SOC, hours)] = SoC_max
+    if SoC_init is not None:
+        lb[col(SOC, 0)] = SoC_init
+        ub[col(SOC, 0)] = SoC_init
+
+    return {"T": T, "c": revenue.sum(axis=0), "revenue": revenue, "lb": lb, "ub": ub}
+
+
+def bess_lp_constraints(T, capacity, BESS_duration, H_block, n=0.85, window_form="explicit"):
+
+    # window_form "running_sum" appends prefix and suffix running-sum blocks for aFRR down and up after the SoC block
+    if window_form not in ("explicit", "running_sum"):
+        raise ValueError(f"Unknown window_form '{window_form}', expected 'explicit' or 'running_sum'")
+    n_aux = 4 * T if window_form == "running_sum" else 0
+    N = len(VARIABLES) * T + n_aux
+    SoC_min = 0.1 * capacity * BESS_duration
+    SoC_max = 0.9 * capacity * BESS_duration
+    Pd_max = capacity
+    Pc_max = capacity
+    hours = np.arange(T)
+
+    def col(block, t):
+        return block * T + t
+
+    # SoC recursion: SoC[t+1] - SoC[t] - sqrt(n) * charging + discharging / sqrt(n) == 0
+    t = hours[:-1]
+    rows = np.tile(t, 6)
+    cols = np.concatenate([col(SOC, t + 1), col(SOC, t), col(DA_MINUS, t), col(IMB_MINUS, t), col(DA_PLUS, t), col(IMB_PLUS, t)])
+    vals = np.repeat([1.0, -1.0, -sqrt(n), -sqrt(n), 1 / sqrt(n), 1 / sqrt(n)], len(t))
+    eq_blocks = [sp.csr_matrix((vals, (rows, cols)), shape=(len(t), N))]
+
+    # Inequalities, stacked block by block
+    blocks = []
+    rhs = []
+
+    # Rolling H_block windows: SoC[t] + sqrt(n) * sum(aFRR down) <= SoC_max and SoC[t] - sqrt(n) * sum(aFRR up) >= SoC_min
+    n_win, w_rows, w_cols = _window_rows(T, H_block)
+    win = np.arange(n_win)
+    for k, (block, sign, bound) in enumerate(((AFRR_DOWN, 1.0, SoC_max), (AFRR_UP, -1.0, -SoC_min))):
+        if n_aux:
+            # Running sums restart every H_block hours, so they stay bounded by H_block * capacity:
+            # prefix P[t] = x[t] + P[t-1] and suffix S[t] = x[t] + S[t+1] within each block.
+            # A window starting at a block boundary is P[t+H_block-1], any other is S[t] + P[t+H_block-1].
+            prefix = len(VARIABLES) * T + 2 * k * T
+            suffix = prefix + T
+            links_prev = hours[hours % H_block != 0]
+            links_next = hours[((hours + 1) % H_block != 0) & (hours + 1 < T)]
+            eq_blocks.append(sp.csr_matrix(
+                (np.concatenate([np.ones(T), -np.ones(len(links_prev)), -np.ones(T)]),
+                 (np.concatenate([hours, links_prev, hours]),
+                  np.concatenate([prefix + hours, prefix + links_prev - 1, col(block, hours)]))),
+                shape=(T, N)))
+            eq_blocks.append(sp.csr_matrix(
+                (np.concatenate([np.ones(T), -np.ones(len(links_next)), -np.ones(T)]),
+                 (np.concatenate([hours, links_next, hours]),
+                  np.concatenate([suffix + hours, suffix + links_next + 1, col(block, hours)]))),
+                shape=(T, N)))
+            inside = win[win % H_block != 0]
+            rows = np.concatenate([win, win, inside])
+            cols = np.concatenate([col(SOC, win), prefix + win + H_block - 1, suffix + inside])
+            vals = np.concatenate([np.full(n_win, sign), np.full(n_win, sqrt(n)), np.full(len(inside), sqrt(n))])
+        else:
+            rows = np.concatenate([win, w_rows])
+            cols = np.concatenate([col(SOC, win), col(block, w_cols)])
+            vals = np.concatenate([np.full(n_win, sign), np.full(len(w_rows), sqrt(n))])
+        blocks.append(sp.csr_matrix((vals, (rows, cols)), shape=(n_win, N)))
+        rhs.append(np.full(n_win, bound))
+
+    # Hourly power limits: capacity sums and relaxed mutual exclusivity
+    for pair, limit in (((DA_PLUS, IMB_PLUS, AFRR_UP), Pd_max), ((DA_MINUS, IMB_MINUS, AFRR_DOWN), Pc_max),
+                        ((DA_PLUS, DA_MINUS), Pd_max), ((IMB_PLUS, IMB_MINUS), Pd_max), ((AFRR_UP, AFRR_DOWN), Pd_max)):
+        rows = np.tile(hours, len(pair))
+        cols = np.concatenate([col(block, hours) for block in pair])
+        blocks.append(sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(T, N)))
+        rhs.append(np.full(T, limit))
+
+    A_eq = sp.vstack(eq_blocks, format="csr")
+    return {"A_ub": sp.vstack(blocks, format="csr"), "b_ub": np.concatenate(rhs),
+            "A_eq": A_eq, "b_eq": np.zeros(A_eq.shape[0]), "n_aux": n_aux}
+
+
+def assemble_bess_lp(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                     cap_aFRR_up, cap_aFRR_down, cap_imb_shortage, cap_imb_surplus,
+                     capacity, BESS_duration, SoC_init, H_block, n=0.85, window_form="explicit"):
+
+    lp = bess_lp_coefficients(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                              cap_aFRR_up, cap_aFRR_down, cap_imb_shortage, cap_imb_surplus,
+                              capacity, BESS_duration, SoC_init)
+    constraints = bess_lp_constraints(lp["T"], capacity, BESS_duration, H_block, n, window_form)
+    lp.update(pad_auxiliary(lp, constraints["n_aux"]))
+    lp.update(constraints)
+    return lp
+
+
+def pad_auxiliary(lp, n_aux):
+    # Auxiliary columns (running sums) carry no revenue and are only bounded below by zero
+    return {
+        "c": np.concatenate([lp["c"], np.zeros(n_aux)]),
+        "revenue": np.hstack([lp["revenue"], np.zeros((lp["revenue"].shape[0], n_aux))]),
+        "lb": np.concatenate([lp["lb"], np.zeros(n_aux)]),
+        "ub": np.concatenate([lp["ub"], np.full(n_aux, np.inf)]),
+    }
+
+
+def bess_lp_inputs(P_DA_t, P_imb_t_sur, P_imb_t_short,
+                   P_aFRR_up_reserve, P_aFRR_down_reserve,
+                   aFRR_volume_up_reserve, aFRR_volume_down_reserve,
+                   imb_volume_surplus, imb_volume_shortage,
+                   imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up):
+
+    # Prices and remaining volume caps as float arrays, in the argument order of bess_lp_coefficients
+    as_array = lambda x: np.asarray(x, dtype=float)
+    return (
+        as_array(P_DA_t), as_array(P_imb_t_sur), as_array(P_imb_t_short),
+        as_array(P_aFRR_up_reserve), as_array(P_aFRR_down_reserve),
+        np.maximum(as_array(aFRR_volume_up_reserve) - as_array(aFRR_used_up), 0),
+        np.maximum(as_array(aFRR_volume_down_reserve) - as_array(aFRR_used_down), 0),
+        np.maximum(as_array(imb_volume_shortage) - as_array(imbalance_used_shortage), 0),
+        np.maximum(as_array(imb_volume_surplus) - as_array(imbalance_used_surplus), 0),
+    )
+
+
+def solve_bess_lp(lp, solve_log=None, verbose=True):
+    # linprog minimizes, so the revenue vector is negated
+    start = time.perf_counter()
+    res = linprog(-lp["c"], A_ub=lp["A_ub"], b_ub=lp["b_ub"], A_eq=lp["A_eq"], b_eq=lp["b_eq"],
+                  bounds=np.column_stack([lp["lb"], lp["ub"]]), method="highs")
+    wall_time = time.perf_counter() - start
+    if res.status != 0:
+        raise RuntimeError(f"BESS LP not solved to optimality: {res.message}")
+    if verbose:
+        print(f"Solved with scipy-highs: optimal in {wall_time:.2f} s")
+    if solve_log is not None:
+        solve_log.append({"solver": "scipy-highs", "termination": "optimal", "wall_time": wall_time})
+    return res.x
+
+
+def split_solution(lp, x):
+    T = lp["T"]
+    return {name: x[i * T:(i + 1) * T] for i, name in enumerate(VARIABLES)}
+
+
+def keep_larger(charging, discharging):
+    # Post-processing: allow only max(charging, discharging) in every hour. Equal sides (e.g. aFRR up and down both at
+    # half the capacity) keep discharging; "equal" allows for solver round-off, which otherwise picks the side
+    # differently per backend and sends the price updates apart
+    charging = np.asarray(charging, dtype=float)
+    discharging = np.asarray(discharging, dtype=float)
+    charge_wins = charging > discharging + KEEP_LARGER_TOLERANCE * np.maximum(1.0, np.abs(discharging))
+    return np.where(charge_wins, charging, 0.0), np.where(charge_wins, 0.0, discharging)
+
+
+def bess_optimization_matrix(P_DA_t, P_imb_t_sur, P_imb_t_short,
+                             P_aFRR_up_reserve, P_aFRR_down_reserve,
+                             aFRR_volume_up_reserve, aFRR_volume_down_reserve,
+                             imb_volume_surplus, imb_volume_shortage,
+                             capacity, annualized_cost_value, BESS_duration, first_run,
+                             SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block,
+                             n=0.85, window_form="explicit", solve_log=None, arrays=False):
+
+    # Same LP as run2_BESS_optimization.bess_optimization, assembled as sparse matrices
+    SoC_max = 0.9 * capacity * BESS_duration
+    SoC_init = SoC_max / 2 if first_run else SoC_previous
+
+    clock = laps()
+    inputs = bess_lp_inputs(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                            aFRR_volume_up_reserve, aFRR_volume_down_reserve, imb_volume_surplus, imb_volume_shortage,
+                            imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up)
+    lp = assemble_bess_lp(*inputs, capacity, BESS_duration, SoC_init, H_block, n, window_form)
+    clock.lap("model_build")
+    x = solve_bess_lp(lp, solve_log)
+    clock.lap("solver_call")
+
+    return bess_lp_outputs(lp, x, capacity, annualized_cost_value, arrays)
+
+
+def bess_lp_outputs(lp, x, capacity, annualized_cost_value, arrays=False):
+    # The bess_optimization result tuple; arrays=True keeps the six dispatch series as arrays instead of {capacity: list}
+    clock = laps()
+    values = split_solution(lp, x)
+    marginal_DA_revenue, marginal_Imbalance_revenue, marginal_aFRR_reserve_revenue = (lp["revenue"] @ x).tolist()
+    total_revenue = marginal_DA_revenue + marginal_Imbalance_revenue + marginal_aFRR_reserve_revenue
+    net_revenue = total_revenue - (capacity * annualized_cost_value)
+    clock.lap("value_extraction")
+
+    charging_DA_vals, discharging_DA_vals = keep_larger(values["e_DA_t_minus"], values["e_DA_t_plus"])
+    charging_imb_vals, discharging_imb_vals = keep_larger(values["e_imb_minus"], values["e_imb_plus"])
+    charging_aFRR_vals, discharging_aFRR_vals = keep_larger(values["e_aFRR_down"], values["e_aFRR_up"])
+
+    print(f"Total Objective Revenue: {total_revenue}")
+    print(f"Revenue from DA: {marginal_DA_revenue}")
+    print(f"Revenue from Imbalance: {marginal_Imbalance_revenue}")
+    print(f"Revenue from aFRR reserve: {marginal_aFRR_reserve_revenue}")
+
+    dispatch = (charging_DA_vals, discharging_DA_vals, charging_imb_vals, discharging_imb_vals, charging_aFRR_vals, discharging_aFRR_vals)
+    if not arrays:
+        dispatch = tuple({capacity: values.tolist()} for values in dispatch)
+    outputs = (*dispatch, marginal_DA_revenue, marginal_Imbalance_revenue, marginal_aFRR_reserve_revenue,
+               total_revenue, net_revenue, float(values["SoC"][-1]))
+    clock.lap("post_processing")
+    return outputs
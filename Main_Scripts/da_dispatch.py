@@ -0,0 +1,147 @@
+import time
+import numpy as np
+from math import sqrt
+
+from bess_matrix_lp import (bess_lp_inputs, bess_lp_coefficients, assemble_bess_lp, solve_bess_lp, bess_lp_outputs,
+                            VARIABLES)
+from instrumentation import laps
+
+# Day-ahead-only dispatch without an LP solver, for screening runs. With the imbalance and aFRR terms dropped, the
+# bess LP is a chain over the hours: the SoC moves by delta = sqrt(n) * charging - discharging / sqrt(n), and the best
+# DA revenue r_t(delta) of a move is piecewise linear and concave in delta (prices >= 0: charge or discharge only;
+# prices < 0: as much charging as the c + d <= capacity row allows, which is linear in delta). The value of the rest
+# of the year, V_t(SoC), is then concave piecewise linear as well, and the Bellman step
+#     V_t(s) = max_delta r_t(delta) + V_t+1(s + delta),   SoC_min <= s <= SoC_max
+# is a max-plus convolution: the pieces of both functions merged in order of decreasing slope. The dynamic program is
+# solved on these breakpoints, with no SoC grid, so it is exact: the revenue equals the DA-only LP's to floating
+# point (report_gap=True re-solves that LP and prints the difference; it stays below 1e-9 relative on synthetic
+# years with negative prices). Against the full LP with imbalance and aFRR, the DA-only dispatch is one feasible
+# point, so its revenue is a lower bound of the full LP's for the same slice and prices.
+# Like the LP, the last hour's dispatch has no SoC row after it and is bounded by the power limit only.
+
+
+def move(buy, sell, delta, capacity, n):
+    # (revenue, charging, discharging) of a SoC move delta when charging pays `buy` and discharging earns `sell` per MWh.
+    # Charging and discharging in the same hour only pays when sell * n > buy (e.g. negative DA prices), and then
+    # as much of both as the c + d <= capacity row allows
+    if sell * n <= buy:
+        charging, discharging = max(delta, 0.0) / sqrt(n), max(-delta, 0.0) * sqrt(n)
+    else:
+        charging, discharging = (capacity + sqrt(n) * delta) / (1 + n), (n * capacity - sqrt(n) * delta) / (1 + n)
+    return sell * discharging - buy * charging, charging, discharging
+
+
+def interpolate(xs, ys, x):
+    # Concave piecewise-linear function (breakpoints xs, values ys) at x within [xs[0], xs[-1]]
+    for k in range(1, len(xs)):
+        if x <= xs[k] or k == len(xs) - 1:
+            width = xs[k] - xs[k - 1]
+            return ys[k - 1] + (ys[k] - ys[k - 1]) * (x - xs[k - 1]) / width if width > 0 else ys[k]
+
+
+def bellman_step(xs, ys, buy, sell, capacity, SoC_min, SoC_max, n):
+    # V_t from V_t+1 (breakpoints xs, values ys): the pieces of r_t(-x) and V_t+1 merged by decreasing slope and cut
+    # to the SoC range. r_t(-x) starts at x = -sqrt(n) * capacity (full charge, revenue -buy * capacity)
+    if sell * n <= buy:
+        pieces = [(buy / sqrt(n), sqrt(n) * capacity), (sqrt(n) * sell, capacity / sqrt(n))]
+    else:
+        pieces = [(sqrt(n) * (buy + sell) / (1 + n), sqrt(n) * capacity + capacity / sqrt(n))]
+    pieces += [((ys[k + 1] - ys[k]) / (xs[k + 1] - xs[k]), xs[k + 1] - xs[k]) for k in range(len(xs) - 1)]
+    pieces.sort(key=lambda piece: -piece[0])
+
+    x, y = xs[0] - sqrt(n) * capacity, ys[0] - buy * capacity
+    new_xs, new_ys = [], []
+    for slope, length in pieces:
+        if x + length > SoC_min and not new_xs:
+            new_xs.append(SoC_min)
+            new_ys.append(y + slope * (SoC_min - x))
+        if x + length >= SoC_max:
+            new_xs.append(SoC_max)
+            new_ys.append(y + slope * (SoC_max - x))
+            break
+        x, y = x + length, y + slope * length
+        if new_xs:
+            new_xs.append(x)
+            new_ys.append(y)
+    return new_xs, new_ys
+
+
+def energy_dispatch(buy, sell, capacity, BESS_duration, SoC_init, n=0.85):
+    # Optimal arbitrage against hourly buy and sell prices: (charging, discharging, SoC) arrays.
+    # V_t has a handful of breakpoints, so both passes work on plain floats
+    buy = np.asarray(buy, dtype=float).tolist()
+    sell = np.asarray(sell, dtype=float).tolist()
+    T = len(buy)
+    SoC_min = 0.1 * capacity * BESS_duration
+    SoC_max = 0.9 * capacity * BESS_duration
+
+    # Backward pass: V_t+1 for every hour, V_T-1 = 0 (the final SoC is free)
+    values = [None] * T
+    xs, ys = [SoC_min, SoC_max], [0.0, 0.0]
+    for t in range(T - 2, -1, -1):
+        values[t + 1] = (xs, ys)
+        xs, ys = bellman_step(xs, ys, buy[t], sell[t], capacity, SoC_min, SoC_max, n)
+
+    # Forward pass: the optimal move lies on a breakpoint of V_t+1 or of r_t, within the SoC range and power limits
+    charging, discharging, SoC = [0.0] * T, [0.0] * T, [SoC_init] * T
+    for t in range(T - 1):
+        xs, ys = values[t + 1]
+        s = SoC[t]
+        low, high = max(SoC_min, s - capacity / sqrt(n)), min(SoC_max, s + sqrt(n) * capacity)
+        candidates = [(x, y) for x, y in zip(xs, ys) if low < x < high]
+        candidates += [(x, interpolate(xs, ys, x)) for x in (low, min(max(s, low), high), high)]
+        best = max(candidates, key=lambda candidate: move(buy[t], sell[t], candidate[0] - s, capacity, n)[0] + candidate[1])[0]
+        _, charging[t], discharging[t] = move(buy[t], sell[t], best - s, capacity, n)
+        SoC[t + 1] = best
+    if max(sell[-1], -buy[-1]) > 0:
+        discharging[-1], charging[-1] = (capacity, 0.0) if sell[-1] >= -buy[-1] else (0.0, capacity)
+    return np.array(charging), np.array(discharging), np.array(SoC)
+
+
+def da_dispatch(P_DA_t, capacity, BESS_duration, SoC_init, n=0.85):
+    # Optimal DA-only dispatch: {VARIABLES name: hourly array} with the imbalance and aFRR blocks at zero
+    solution = {name: np.zeros(len(P_DA_t)) for name in VARIABLES}
+    solution["e_DA_t_minus"], solution["e_DA_t_plus"], solution["SoC"] = energy_dispatch(P_DA_t, P_DA_t, capacity,
+                                                                                         BESS_duration, SoC_init, n)
+    return solution
+
+
+def bess_optimization_da(P_DA_t, P_imb_t_sur, P_imb_t_short,
+                         P_aFRR_up_reserve, P_aFRR_down_reserve,
+                         aFRR_volume_up_reserve, aFRR_volume_down_reserve,
+                         imb_volume_surplus, imb_volume_shortage,
+                         capacity, annualized_cost_value, BESS_duration, first_run,
+                         SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block,
+                         n=0.85, window_form="explicit", report_gap=False, solve_log=None, arrays=False):
+
+    # Same signature and result tuple as bess_optimization; only the DA market is traded (imbalance and aFRR revenue 0)
+    start = time.perf_counter()
+    clock = laps()
+    SoC_max = 0.9 * capacity * BESS_duration
+    SoC_init = SoC_max / 2 if first_run else SoC_previous
+
+    inputs = bess_lp_inputs(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                            aFRR_volume_up_reserve, aFRR_volume_down_reserve, imb_volume_surplus, imb_volume_shortage,
+                            imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up)
+    clock.lap("model_build")
+    solution = da_dispatch(inputs[0], capacity, BESS_duration, SoC_init, n)
+    clock.lap("solver_call")
+
+    lp = bess_lp_coefficients(*inputs, capacity, BESS_duration, SoC_init)
+    x = np.concatenate([solution[name] for name in VARIABLES])
+    wall_time = time.perf_counter() - start
+    info = {"solver": "da-dp", "termination": "optimal", "wall_time": wall_time}
+
+    if report_gap:
+        # The same DA-only problem as an LP: every imbalance and aFRR volume cap at zero
+        no_volume = np.zeros(len(inputs[0]))
+        reference = assemble_bess_lp(*inputs[:5], *[no_volume] * 4, capacity, BESS_duration, SoC_init, H_block, n, window_form)
+        best = float(reference["c"] @ solve_bess_lp(reference, verbose=False))
+        info["gap"] = (best - float(lp["c"] @ x)) / abs(best) if best else 0.0
+        print(f"DA-only dispatch in {wall_time:.3f} s, gap {100 * info['gap']:.2e}% vs the DA-only LP")
+    else:
+        print(f"DA-only dispatch in {wall_time:.3f} s")
+    if solve_log is not None:
+        solve_log.append(info)
+
+    return bess_lp_outputs(lp, x, capacity, annualized_cost_value, arrays)
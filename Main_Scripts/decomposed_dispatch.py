@@ -0,0 +1,151 @@
+import time
+import atexit
+import numpy as np
+from math import sqrt
+from concurrent.futures import ProcessPoolExecutor
+
+from bess_matrix_lp import (bess_lp_inputs, bess_lp_coefficients, assemble_bess_lp, solve_bess_lp, split_solution,
+                            bess_lp_outputs, VARIABLES, SOC)
+from instrumentation import laps
+
+
+# One process pool per worker count, started on first use and kept for the process's lifetime, so a ladder pays the
+# worker start-up once instead of twice per step
+_pools = {}
+
+
+def _pool(processes):
+    if processes not in _pools:
+        _pools[processes] = ProcessPoolExecutor(max_workers=processes)
+    return _pools[processes]
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+
+def _solve_window(inputs, capacity, BESS_duration, H_block, n, window_form, SoC_start, end_index, SoC_end):
+    # One sub-horizon LP; SoC_start=None leaves the first SoC free, end_index pins SoC[end_index] to SoC_end.
+    # A pinned end the window cannot reach from its start is freed again; the caller re-joins the SoC chain
+    lp = assemble_bess_lp(*inputs, capacity, BESS_duration, SoC_start, H_block, n, window_form)
+    if end_index is None:
+        x = solve_bess_lp(lp, verbose=False)
+    else:
+        column = SOC * lp["T"] + end_index
+        bounds = lp["lb"][column], lp["ub"][column]
+        lp["lb"][column] = lp["ub"][column] = SoC_end
+        try:
+            x = solve_bess_lp(lp, verbose=False)
+        except RuntimeError:
+            lp["lb"][column], lp["ub"][column] = bounds
+            x = solve_bess_lp(lp, verbose=False)
+    return {name: values.copy() for name, values in split_solution(lp, x).items()}
+
+
+def _run(jobs, processes, executor=None):
+    if executor is None and processes == 1:
+        return [_solve_window(*job) for job in jobs]
+    return list((executor or _pool(processes)).map(_solve_window, *zip(*jobs)))
+
+
+def repair_aFRR_windows(values, SoC_min, SoC_max, H_block, n, tol=1e-6):
+    # Window sums that straddle two sub-horizons can exceed the SoC headroom, because each side was
+    # optimized against the other's lookahead. aFRR reserve does not enter the SoC recursion, so
+    # trimming it (latest hour first) restores feasibility without touching any other constraint.
+    T = len(values["SoC"])
+    for name, headroom in (("e_aFRR_down", SoC_max - values["SoC"]), ("e_aFRR_up", values["SoC"] - SoC_min)):
+        x = values[name]
+        for t in range(T - H_block):
+            excess = sqrt(n) * x[t:t + H_block].sum() - headroom[t]
+            tau = t + H_block - 1
+            while excess > tol and tau >= t:
+                cut = min(x[tau], excess / sqrt(n))
+                x[tau] -= cut
+                excess -= cut * sqrt(n)
+                tau -= 1
+    return values
+
+
+def bess_optimization_decomposed(P_DA_t, P_imb_t_sur, P_imb_t_short,
+                                 P_aFRR_up_reserve, P_aFRR_down_reserve,
+                                 aFRR_volume_up_reserve, aFRR_volume_down_reserve,
+                                 imb_volume_surplus, imb_volume_shortage,
+                                 capacity, annualized_cost_value, BESS_duration, first_run,
+                                 SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block,
+                                 n=0.85, window_form="explicit", window=168, overlap=24, processes=None, executor=None,
+                                 report_gap=False, solve_log=None, arrays=False):
+
+    # Rolling-horizon version of bess_optimization: the year is cut into windows (a week by default),
+    # each solved with `overlap` hours of lookahead, in a process pool. Boundaries are reconciled in two passes:
+    #   1. every window is solved with a free starting SoC; its SoC at the next window's first hour becomes that window's SoC target
+    #   2. every window is re-solved with its start and end SoC pinned to the targets, so the SoC chain joins exactly;
+    #      a window that cannot reach its end target is solved with a free end, and the windows after it are re-solved
+    #      in order from the SoC actually reached
+    # A final repair pass trims aFRR reserve on windows that straddle a boundary. Returns the same tuple as bess_optimization.
+    # The windows run in a process pool kept across calls (or in `executor`, if given); processes=1 solves them in turn.
+    start = time.perf_counter()
+    clock = laps()
+    SoC_min = 0.1 * capacity * BESS_duration
+    SoC_max = 0.9 * capacity * BESS_duration
+    SoC_init = SoC_max / 2 if first_run else SoC_previous
+
+    inputs = bess_lp_inputs(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                            aFRR_volume_up_reserve, aFRR_volume_down_reserve, imb_volume_surplus, imb_volume_shortage,
+                            imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up)
+    T = len(inputs[0])
+    starts = list(range(0, T, window))
+    ends = starts[1:] + [T]
+    sliced = lambda a, b: tuple(arr[a:b] for arr in inputs)
+    common = (capacity, BESS_duration, H_block, n, window_form)
+    clock.lap("model_build")
+
+    # Pass 1: SoC targets at every window boundary
+    jobs = [(sliced(s, min(e + overlap, T)),) + common + (SoC_init if k == 0 else None, None, None)
+            for k, (s, e) in enumerate(zip(starts, ends))]
+    first_pass = _run(jobs, processes, executor)
+    targets = [SoC_init] + [first_pass[k]["SoC"][e - s] for k, (s, e) in enumerate(zip(starts[:-1], ends[:-1]))]
+
+    # Pass 2: pinned start and end SoC; H_block hours of lookahead keep the boundary windows constrained
+    jobs = []
+    for k, (s, e) in enumerate(zip(starts, ends)):
+        last = k == len(starts) - 1
+        jobs.append((sliced(s, min(e + max(H_block, 1), T)),) + common
+                    + (targets[k], None if last else e - s, None if last else targets[k + 1]))
+    second_pass = _run(jobs, processes, executor)
+
+    # Re-join the SoC chain behind any window whose end target was freed
+    rejoined = 0
+    for k in range(len(starts) - 1):
+        reached = second_pass[k]["SoC"][ends[k] - starts[k]]
+        if abs(reached - targets[k + 1]) > 1e-6 * max(SoC_max, 1.0):
+            targets[k + 1] = reached
+            second_pass[k + 1] = _solve_window(*jobs[k + 1][:6], reached, *jobs[k + 1][7:])
+            rejoined += 1
+    clock.lap("solver_call")  # windows are built and solved together in the pool
+
+    values = {name: np.concatenate([sol[name][:e - s] for sol, s, e in zip(second_pass, starts, ends)]) for name in VARIABLES}
+    values = repair_aFRR_windows(values, SoC_min, SoC_max, H_block, n)
+
+    lp = bess_lp_coefficients(*inputs, capacity, BESS_duration, SoC_init)
+    x = np.concatenate([values[name] for name in VARIABLES])
+    clock.lap("post_processing")
+    wall_time = time.perf_counter() - start
+    info = {"solver": "decomposed", "termination": "optimal", "wall_time": wall_time, "windows": len(starts),
+            "rejoined_windows": rejoined}
+    if rejoined:
+        print(f"Decomposed dispatch: {rejoined} window(s) re-solved after an unreachable SoC target")
+
+    if report_gap:
+        monolithic = assemble_bess_lp(*inputs, capacity, BESS_duration, SoC_init, H_block, n, window_form)
+        best = float(monolithic["c"] @ solve_bess_lp(monolithic, verbose=False))
+        info["gap"] = (best - float(lp["c"] @ x)) / abs(best) if best else 0.0
+        print(f"Decomposed dispatch: {len(starts)} windows in {wall_time:.2f} s, optimality gap {100 * info['gap']:.4f}% vs monolithic")
+    else:
+        print(f"Decomposed dispatch: {len(starts)} windows in {wall_time:.2f} s")
+    if solve_log is not None:
+        solve_log.append(info)
+
+    return bess_lp_outputs(lp, x, capacity, annualized_cost_value, arrays)
@@ -0,0 +1,74 @@
+import os
+import re
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Binary copies of the input workbooks live in {workbook folder}/.excel_cache unless BESS_CACHE_DIR is set.
+# An entry is named {workbook}-{sheet}-{content}-{options}.npz, with hashes of the workbook bytes and of the read
+# options, so an edited workbook simply misses the cache. On the next write the entries of its previous content are
+# removed; entries of the same content read with other options (usecols, header, ...) are kept.
+CACHE_DIR_ENV = "BESS_CACHE_DIR"
+ENTRY_SUFFIX = re.compile(r"([0-9a-f]{16})(-[0-9a-f]{8})?\.npz")  # without options hash: the earlier naming
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir_for(path):
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.dirname(os.path.abspath(path)), ".excel_cache")
+
+
+def _save(frame, path):
+    # Columns are stored by position next to an array of the headers, so any header type round-trips;
+    # numeric and datetime columns are plain arrays, mixed-type object columns are pickled
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, columns=np.array(list(frame.columns), dtype=object),
+                     **{f"c{i}": frame.iloc[:, i].to_numpy() for i in range(frame.shape[1])})
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _load(path):
+    with np.load(path, allow_pickle=True) as data:  # only ever reads entries written by _save
+        columns = list(data["columns"])
+        return pd.DataFrame({i: data[f"c{i}"] for i in range(len(columns))}).set_axis(columns, axis=1)
+
+
+def read_excel_cached(path, sheet_name=0, cache_dir=None, **kwargs):
+    # Drop-in for pd.read_excel(path, sheet_name, **kwargs) for a single sheet
+    cache_dir = cache_dir or cache_dir_for(path)
+    content = file_digest(path)[:16]
+    options = hashlib.sha256(f"{sheet_name!r}|{sorted(kwargs.items())!r}".encode()).hexdigest()[:8]
+    prefix = f"{os.path.splitext(os.path.basename(path))[0]}-{sheet_name}-"
+    entry = os.path.join(cache_dir, f"{prefix}{content}-{options}.npz")
+
+    if os.path.exists(entry):
+        try:
+            return _load(entry)
+        except Exception as exc:  # unreadable entry: rebuild it below
+            print(f"Ignoring unreadable cache entry {entry}: {exc}")
+
+    frame = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for candidate in glob.glob(os.path.join(cache_dir, f"{glob.escape(prefix)}*")):
+            # Only this sheet's entries (another sheet's name may start with this one's) of other workbook content,
+            # and entries named before the options got their own hash
+            match = ENTRY_SUFFIX.fullmatch(os.path.basename(candidate)[len(prefix):])
+            if match and (match.group(1) != content or match.group(2) is None):
+                os.remove(candidate)
+        _save(frame, entry)
+    except OSError as exc:  # e.g. a read-only folder; serve uncached
+        print(f"Could not cache {os.path.basename(path)} [{sheet_name}]: {exc}")
+    return frame
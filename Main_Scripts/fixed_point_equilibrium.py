@@ -0,0 +1,110 @@
+import numpy as np
+from scipy.optimize import minimize
+
+from run3_updatePrices import update_prices
+from bess_matrix_lp import assemble_bess_lp, solve_bess_lp, split_solution
+
+# Competitive equilibrium of an installed fleet as a fixed point of dispatch and price updates: the fleet dispatch x
+# moves the prices through update_prices, p(x), and at the equilibrium x is an optimal dispatch of the whole fleet
+# (the bess LP of a battery of the fleet's capacity) against p(x). The response is the LP solution itself, without
+# the keep-the-larger-side post-processing, so the fleet LP stays the sum of its slices' LPs and the fixed point is
+# the equilibrium price_impact_equilibrium solves for directly. LP dispatch is bang-bang, so the plain iteration
+# x <- LP(p(x)) oscillates between extremes and never settles; every iteration therefore moves x only part of the
+# way towards the new response:
+#   - acceleration="damped": by the step that maximizes the area under the price curves along that direction
+#     (exact, the prices are linear in x), i.e. Frank-Wolfe on the equilibrium's potential
+#   - acceleration="anderson": Anderson-style mixing of the last `memory` responses with x, with the weights that
+#     maximize the same potential; weights are kept on the simplex so the mixed dispatch stays feasible
+# The iteration stops when the largest hourly price change between iterates is below `tolerance` (€/MWh or €/MW)
+# and the remaining revenue gain of a full response is below `gap_tolerance` of the fleet revenue.
+# Unlike run_iterations, earlier capacity is not frozen at the prices it saw when it was added.
+
+PRICE_SERIES = ["Extrapolated_DAM_Price", "Extrapolated_Imbalance_Surplus_Price", "Extrapolated_Imbalance_Shortage_Price",
+                "Extrapolated_aFRR_Up_Price_reserve", "Extrapolated_aFRR_Down_Price_reserve"]
+
+# Fleet dispatch variables in the argument order of update_prices (charging / discharging of DA, Imbalance, aFRR)
+FLEET_VARIABLES = ["e_DA_t_minus", "e_DA_t_plus", "e_imb_minus", "e_imb_plus", "e_aFRR_down", "e_aFRR_up"]
+
+
+def implied_prices(df, x, coefficients_bess):
+    # p(x): the undisturbed prices of df moved by the fleet dispatch x (six rows in FLEET_VARIABLES order)
+    prices = df[PRICE_SERIES].copy()
+    update_prices(prices, *x,
+                  coefficients_bess["Day-Ahead Market"], coefficients_bess["Imbalance Shortage"], coefficients_bess["Imbalance Surplus"],
+                  coefficients_bess["aFRR Up Contracted"], coefficients_bess["aFRR Down Contracted"], None)
+    return prices.values.T
+
+
+def revenue(prices, y):
+    # Revenue of dispatch y at prices (PRICE_SERIES rows)
+    DA, surplus, shortage, up, down = prices
+    charging_DA, discharging_DA, charging_imb, discharging_imb, charging_aFRR, discharging_aFRR = y
+    return (DA @ (discharging_DA - charging_DA) + shortage @ discharging_imb - surplus @ charging_imb
+            + up @ discharging_aFRR + down @ charging_aFRR)
+
+
+def mixing_weights(df, atoms, coefficients_bess):
+    # Convex weights over the atoms (the current dispatch first) that maximize the potential of their mix. The
+    # potential is quadratic in the weights: its gradient at x is revenue(p(x), .), its curvature the price change
+    # a dispatch causes, so both come from revenue() and implied_prices()
+    zero = np.zeros_like(atoms[0])
+    base = implied_prices(df, zero, coefficients_bess)
+    impact = [implied_prices(df, atom, coefficients_bess) - base for atom in atoms]
+    linear = np.array([revenue(base, atom) for atom in atoms])
+    curvature = np.array([[revenue(impact[i], atoms[j]) for j in range(len(atoms))] for i in range(len(atoms))])
+    curvature = (curvature + curvature.T) / 2
+    potential = lambda w: -(linear @ w + 0.5 * w @ curvature @ w)
+    gradient = lambda w: -(linear + curvature @ w)
+    w0 = np.zeros(len(atoms))
+    w0[0] = 1.0
+    result = minimize(potential, w0, jac=gradient, method="SLSQP", bounds=[(0, 1)] * len(atoms),
+                      constraints=[{"type": "eq", "fun": lambda w: w.sum() - 1, "jac": lambda w: np.ones_like(w)}])
+    weights = np.clip(result.x, 0, None)
+    return weights / weights.sum()
+
+
+def fleet_response(prices, market_volumes, capacity, BESS_duration, H_block, window_form, solve_log):
+    # Optimal dispatch of the whole fleet (starting at 50% SoC, full market volumes) against fixed prices
+    lp = assemble_bess_lp(*prices[[0, 1, 2, 3, 4]], market_volumes["aFRR_up"], market_volumes["aFRR_down"],
+                          market_volumes["imb_shortage"], market_volumes["imb_surplus"],
+                          capacity, BESS_duration, 0.45 * capacity * BESS_duration, H_block, window_form=window_form)
+    values = split_solution(lp, solve_bess_lp(lp, solve_log, verbose=False))
+    return np.array([values[name] for name in FLEET_VARIABLES])
+
+
+def fleet_fixed_point(df, market_volumes, capacity, coefficients_bess, BESS_duration, H_block, window_form="explicit",
+                      solve_log=None, tolerance=0.5, gap_tolerance=1e-3, max_iterations=30, acceleration="anderson", memory=5):
+    # Returns (fleet dispatch {variable: hourly array}, {"Fleet_Iterations", "Fleet_Price_Change", "Fleet_Gap",
+    # "Fleet_Converged"}); without convergence within max_iterations the last iterate is returned.
+    if acceleration not in ("anderson", "damped"):
+        raise ValueError(f"Unknown acceleration '{acceleration}', expected 'anderson' or 'damped'")
+    x = None
+    responses = []
+    prices = df[PRICE_SERIES].values.T.astype(float)
+    price_change = relative_gap = np.inf
+    for iteration in range(1, max_iterations + 1):
+        response = fleet_response(prices, market_volumes, capacity, BESS_duration, H_block, window_form, solve_log)
+        if x is None:
+            x = response
+        else:
+            # Duality gap of the potential: what a full switch to the response would still earn at the current prices
+            relative_gap = (revenue(prices, response) - revenue(prices, x)) / max(abs(revenue(prices, x)), 1e-9)
+            atoms = [x, response] + (responses[-(memory - 1):] if acceleration == "anderson" and memory > 1 else [])
+            weights = mixing_weights(df, atoms, coefficients_bess)
+            x = sum(weight * atom for weight, atom in zip(weights, atoms))
+        responses.append(response)
+
+        new_prices = implied_prices(df, x, coefficients_bess)
+        price_change = float(np.max(np.abs(new_prices - prices)))
+        prices = new_prices
+        print(f" Fleet fixed point {capacity}MW, iteration {iteration}: largest price change {price_change:.3f}, "
+              f"relative gap {relative_gap:.2e}")
+        if price_change <= tolerance and relative_gap <= gap_tolerance:
+            break
+
+    converged = price_change <= tolerance and relative_gap <= gap_tolerance
+    if not converged:
+        print(f" Fleet fixed point {capacity}MW did not converge in {max_iterations} iterations")
+    fleet = dict(zip(FLEET_VARIABLES, x))
+    return fleet, {"Fleet_Iterations": iteration, "Fleet_Price_Change": price_change, "Fleet_Gap": float(relative_gap),
+                   "Fleet_Converged": bool(converged)}
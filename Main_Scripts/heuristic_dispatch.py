@@ -0,0 +1,100 @@
+import time
+import numpy as np
+from math import sqrt
+
+from bess_matrix_lp import bess_lp_inputs, bess_lp_coefficients, bess_lp_outputs, VARIABLES
+from da_dispatch import energy_dispatch
+
+# Rule-based dispatch for screening, without an LP solver, in three passes:
+#   - energy: every hour gets one buying and one selling price for a full-power move (the better imbalance price for
+#     the volume that is left and DA for the rest, plus the aFRR reserve price the move displaces on that side), and
+#     da_dispatch.energy_dispatch schedules the SoC against them exactly
+#   - the energy goes to the imbalance market first where its price beats DA, up to the remaining volume
+#   - the power left in every hour is offered as aFRR reserve, the better-paid direction first, up to the remaining
+#     volume and to what the SoC headroom of the rolling H_block windows still allows, filled in time order
+# The dispatch satisfies every constraint of the bess LP, so its revenue is a lower bound of the LP's for the same
+# slice, prices and volumes (80-86% of it on synthetic years, mostly short on aFRR).
+
+
+def window_room(x, headroom, H_block, n):
+    # What every window t .. t+H_block-1 (t < T - H_block) can still take next to x: sqrt(n) * sum(x) <= headroom[t]
+    n_windows = max(len(x) - H_block, 0)
+    return headroom[:n_windows] / sqrt(n) - np.convolve(x, np.ones(H_block), "valid")[:n_windows]
+
+
+def window_fill(wanted, room, H_block):
+    # As much of `wanted` as the windows' room allows, hour by hour (an hour belongs to windows hour-H_block+1 .. hour)
+    taken = np.zeros(len(wanted))
+    room = room.tolist()
+    for hour in np.flatnonzero(wanted > 0).tolist():
+        first = max(0, hour - H_block + 1)
+        amount = min([wanted[hour]] + room[first:hour + 1])
+        if amount > 0:
+            taken[hour] = amount
+            room[first:hour + 1] = [r - amount for r in room[first:hour + 1]]
+    return taken
+
+
+def heuristic_dispatch(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                       cap_aFRR_up, cap_aFRR_down, cap_imb_shortage, cap_imb_surplus,
+                       capacity, BESS_duration, SoC_init, H_block, n=0.85):
+    # {VARIABLES name: hourly array}; inputs as returned by bess_lp_inputs
+    T = len(P_DA_t)
+    SoC_min = 0.1 * capacity * BESS_duration
+    SoC_max = 0.9 * capacity * BESS_duration
+
+    # Average price of a full-power move: the better imbalance price for the volume that is left, DA for the rest,
+    # less the aFRR reserve price the move displaces on the same side
+    share = lambda volume: np.minimum(volume, capacity) / capacity
+    short, surplus = share(cap_imb_shortage) * (P_imb_t_short > P_DA_t), share(cap_imb_surplus) * (P_imb_t_sur < P_DA_t)
+    sell = short * P_imb_t_short + (1 - short) * P_DA_t - share(cap_aFRR_up) * np.maximum(P_aFRR_up_reserve, 0)
+    buy = surplus * P_imb_t_sur + (1 - surplus) * P_DA_t + share(cap_aFRR_down) * np.maximum(P_aFRR_down_reserve, 0)
+    charging, discharging, SoC = energy_dispatch(buy, sell, capacity, BESS_duration, SoC_init, n)
+    charging[-1] = discharging[-1] = 0.0  # the last hour is left to aFRR
+
+    solution = {name: np.zeros(T) for name in VARIABLES}
+    solution["SoC"] = SoC
+    solution["e_imb_plus"] = np.where(P_imb_t_short > P_DA_t, np.minimum(discharging, cap_imb_shortage), 0.0)
+    solution["e_DA_t_plus"] = discharging - solution["e_imb_plus"]
+    solution["e_imb_minus"] = np.where(P_imb_t_sur < P_DA_t, np.minimum(charging, cap_imb_surplus), 0.0)
+    solution["e_DA_t_minus"] = charging - solution["e_imb_minus"]
+
+    # aFRR: the better-paid direction first, then the other one with the rest of the up + down <= capacity row
+    up_first = P_aFRR_up_reserve >= P_aFRR_down_reserve
+    power_left = np.full(T, float(capacity))
+    for name, price, cap, room, headroom, first in (
+            ("e_aFRR_up", P_aFRR_up_reserve, cap_aFRR_up, capacity - discharging, SoC - SoC_min, up_first),
+            ("e_aFRR_down", P_aFRR_down_reserve, cap_aFRR_down, capacity - charging, SoC_max - SoC, ~up_first),
+            ("e_aFRR_down", P_aFRR_down_reserve, cap_aFRR_down, capacity - charging, SoC_max - SoC, up_first),
+            ("e_aFRR_up", P_aFRR_up_reserve, cap_aFRR_up, capacity - discharging, SoC - SoC_min, ~up_first)):
+        wanted = np.where(first & (price > 0), np.minimum.reduce([room - solution[name], cap - solution[name], power_left]), 0.0)
+        solution[name] += window_fill(np.maximum(wanted, 0), window_room(solution[name], headroom, H_block, n), H_block)
+        power_left = capacity - solution["e_aFRR_up"] - solution["e_aFRR_down"]
+    return solution
+
+
+def bess_optimization_heuristic(P_DA_t, P_imb_t_sur, P_imb_t_short,
+                                P_aFRR_up_reserve, P_aFRR_down_reserve,
+                                aFRR_volume_up_reserve, aFRR_volume_down_reserve,
+                                imb_volume_surplus, imb_volume_shortage,
+                                capacity, annualized_cost_value, BESS_duration, first_run,
+                                SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block,
+                                n=0.85, solve_log=None, arrays=False):
+
+    # Same signature and result tuple as bess_optimization
+    start = time.perf_counter()
+    SoC_max = 0.9 * capacity * BESS_duration
+    SoC_init = SoC_max / 2 if first_run else SoC_previous
+
+    inputs = bess_lp_inputs(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                            aFRR_volume_up_reserve, aFRR_volume_down_reserve, imb_volume_surplus, imb_volume_shortage,
+                            imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up)
+    solution = heuristic_dispatch(*inputs, capacity, BESS_duration, SoC_init, H_block, n)
+    lp = bess_lp_coefficients(*inputs, capacity, BESS_duration, SoC_init)
+    x = np.concatenate([solution[name] for name in VARIABLES])
+    wall_time = time.perf_counter() - start
+    print(f"Heuristic dispatch in {wall_time:.3f} s")
+    if solve_log is not None:
+        solve_log.append({"solver": "heuristic", "termination": "heuristic", "wall_time": wall_time})
+
+    return bess_lp_outputs(lp, x, capacity, annualized_cost_value, arrays)
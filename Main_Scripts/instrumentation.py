@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import time
+import contextlib
+
+try:
+    import resource  # Unix only; peak RSS is not reported elsewhere
+except ImportError:
+    resource = None
+
+# Opt-in timing of the phases of each iteration (input_load, model_build, solver_call, value_extraction,
+# post_processing, reporting, update_prices, result_io). Nothing is measured until start() is called in the process;
+# until then phase() and laps() cost one check. Every phase is written as a JSON line:
+#   {"case", "iteration", "phase", "wall_s", "rss_mb", "peak_rss_mb", "peak_growth_mb"}
+# where peak_rss_mb is the process high-water mark after the phase and peak_growth_mb how much the phase raised it.
+
+_recorder = None
+
+
+def _rss_mb():
+    # Current resident set size (Linux); None where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, KiB on Linux
+
+
+class PhaseRecorder:
+
+    def __init__(self, path, **context):
+        self.path = path
+        self.context = dict(context, iteration=None)
+        self.file = open(path, "w")
+
+    def record(self, name, wall_time, peak_before):
+        peak = _peak_rss_mb()
+        row = {**self.context, "phase": name, "wall_s": wall_time, "rss_mb": _rss_mb(), "peak_rss_mb": peak,
+               "peak_growth_mb": None if peak is None else peak - peak_before}
+        self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def start(path, **context):
+    # Records every following phase of this process to `path` (JSON lines), tagged with `context` (e.g. case=idx)
+    global _recorder
+    stop()
+    _recorder = PhaseRecorder(path, **context)
+
+
+def stop():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def set_context(**fields):
+    # e.g. set_context(iteration=total_capacity) at the start of each ladder step
+    if _recorder is not None:
+        _recorder.context.update(fields)
+
+
+@contextlib.contextmanager
+def phase(name):
+    if _recorder is None:
+        yield
+        return
+    start_time, peak_before = time.perf_counter(), _peak_rss_mb()
+    try:
+        yield
+    finally:
+        _recorder.record(name, time.perf_counter() - start_time, peak_before)
+
+
+class Laps:
+    # Consecutive phases of one function body without re-indenting it: lap(name) closes the phase that
+    # started at the previous lap (or at laps())
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        if _recorder is not None:
+            self.start_time, self.peak_before = time.perf_counter(), _peak_rss_mb()
+
+    def lap(self, name):
+        if _recorder is not None:
+            _recorder.record(name, time.perf_counter() - self.start_time, self.peak_before)
+            self.reset()
+
+
+def laps():
+    return Laps()
+
+
+def read_phases(paths):
+    import pandas as pd  # only the summary needs pandas; the backends import this module in pool workers too
+
+    rows = []
+    for path in paths:
+        if os.path.exists(path):
+            with open(path) as f:
+                rows.extend(json.loads(line) for line in f if line.strip())
+    return pd.DataFrame(rows)
+
+
+def summarize(paths):
+    # One row per phase over the given JSON-lines files: calls, total and mean wall time, share of the measured
+    # time and the highest process peak RSS seen after it
+    phases = read_phases(paths)
+    if phases.empty:
+        return phases
+    summary = phases.groupby("phase", sort=False).agg(calls=("wall_s", "size"), total_s=("wall_s", "sum"),
+                                                      mean_ms=("wall_s", "mean"), peak_rss_mb=("peak_rss_mb", "max"),
+                                                      peak_growth_mb=("peak_growth_mb", "sum"))
+    summary["mean_ms"] *= 1000
+    summary.insert(2, "share_%", 100 * summary["total_s"] / summary["total_s"].sum())
+    return summary.sort_values("total_s", ascending=False)
@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import calendar
+import numpy as np
+import pandas as pd
+
+from excel_cache import read_excel_cached, file_digest, cache_dir_for
+
+# One hourly, timestamp-aligned float64 dataset of every market series, built once from the input workbooks
+# and stored as a (series x hours) .npy array that processes attach to read-only through a memory map.
+
+MARKET_TZ = "Europe/Amsterdam"
+
+# Dataset column: (workbook, sheet, timestamp column, value column); the first one is the reference clock
+SOURCES = {
+    "DAM_Price": ("py_2024_DAM_prices_hourly.xlsx", "Sheet1", "Date", "Price"),
+    "Imbalance_Surplus_Price": ("py_2024_imbalance_prices_hourly_surplus.xlsx", "Sheet1", "Date", "Price"),
+    "Imbalance_Shortage_Price": ("py_2024_imbalance_prices_hourly_shortage.xlsx", "Sheet2", "Time", "Price"),
+    "aFRR_Up_Price_reserve": ("aFRR_hourly_prices_Up.xlsx", "Sheet1", "Timestamp", "Hourly price Reserve (€/MW)"),
+    "aFRR_Down_Price_reserve": ("aFRR_hourly_prices_Down.xlsx", "Sheet1", "Timestamp", "Hourly price Reserve (€/MW)"),
+    "aFRR_Up_Volume": ("aFRR_hourly_prices_Up.xlsx", "Sheet1", "Timestamp", "Volume Reserve (MW)"),
+    "aFRR_Down_Volume": ("aFRR_hourly_prices_Down.xlsx", "Sheet1", "Timestamp", "Volume Reserve (MW)"),
+    "Imbalance_Surplus_Volume": ("settled_imbalance_volumes.xlsx", "MWh", "Time", "Surplus (MWh)"),
+    "Imbalance_Shortage_Volume": ("settled_imbalance_volumes.xlsx", "MWh", "Time", "Shortage (MWh)"),
+}
+
+# Bump when the build logic changes so existing datasets are rebuilt
+DATASET_VERSION = 1
+
+
+def standard_offset(year, tz=MARKET_TZ):
+    return pd.Timestamp(year, 1, 1).tz_localize(tz).utcoffset()
+
+
+def to_utc(stamps, tz=MARKET_TZ):
+    # Workbook timestamps are naive. A series that skips the spring-forward hour is on the local wall clock
+    # (its repeated autumn hour, if present, is disambiguated by order; if absent, the stamp is read as summer time).
+    # Any other series is taken to be on local standard time all year, as a plain hourly range is.
+    stamps = pd.DatetimeIndex(pd.to_datetime(stamps))
+    if (stamps.to_series().diff() == pd.Timedelta("2h")).any():
+        ambiguous = "infer" if stamps.duplicated().any() else np.ones(len(stamps), dtype=bool)
+        return stamps.tz_localize(tz, ambiguous=ambiguous, nonexistent="raise").tz_convert("UTC"), "local"
+    return (stamps - standard_offset(stamps[0].year, tz)).tz_localize("UTC"), "standard"
+
+
+def validate_hourly(name, utc, index, max_fill, issues):
+    # Records duplicates, hours outside the reference span and gaps; gaps longer than max_fill hours are fatal
+    duplicated = utc.duplicated()
+    if duplicated.any():
+        issues.append(f"{name}: {duplicated.sum()} duplicated hour(s), first kept: {list(utc[duplicated][:3].astype(str))}")
+    outside = ~utc.isin(index)
+    if outside.any():
+        issues.append(f"{name}: {outside.sum()} hour(s) outside the reference span dropped: {list(utc[outside][:3].astype(str))}")
+    missing = ~index.isin(utc)
+    if missing.any():
+        runs = np.diff(np.flatnonzero(np.diff(np.concatenate([[0], missing.astype(int), [0]]))))[::2]
+        issues.append(f"{name}: {missing.sum()} missing hour(s) filled from the previous hour: {list(index[missing][:3].astype(str))}")
+        if runs.max() > max_fill:
+            raise ValueError(f"{name}: gap of {runs.max()} hours exceeds max_fill={max_fill}")
+
+
+def check_year(index, tz, issues):
+    # A calendar year is 8784 hours in a leap year (2024) and 8760 otherwise, whatever the DST shifts
+    first = index[0].tz_convert(tz)
+    year = first.year
+    expected = (366 if calendar.isleap(year) else 365) * 24
+    if len(index) != expected:
+        issues.append(f"dataset covers {len(index)} of the {expected} hours of {year}")
+
+
+def build_market_dataset(folder=".", cache_dir=None, align="timestamp", tz=MARKET_TZ, max_fill=1):
+    # Returns the path of the .npy dataset for the workbooks in `folder`, building it if needed.
+    # align="timestamp" converts every series to UTC and aligns them on the reference clock;
+    # align="position" pairs rows by position, as the scripts did before
+    paths = {os.path.join(folder, workbook) for workbook, _, _, _ in SOURCES.values()}
+    cache_dir = cache_dir or cache_dir_for(os.path.join(folder, "x"))
+    key = hashlib.sha256(json.dumps([DATASET_VERSION, align, tz, max_fill,
+                                     sorted((os.path.basename(p), file_digest(p)) for p in paths)]).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"market_data-{key}.npy")
+    if os.path.exists(path) and os.path.exists(path[:-4] + ".json"):
+        return path
+
+    issues = []
+    columns = {}
+    index = None
+    for name, (workbook, sheet, time_column, value_column) in SOURCES.items():
+        frame = read_excel_cached(os.path.join(folder, workbook), sheet_name=sheet, cache_dir=cache_dir)
+        values = pd.to_numeric(frame[value_column], errors="coerce").astype(np.float64)
+        if values.isna().any():
+            issues.append(f"{name}: {values.isna().sum()} non-numeric value(s) filled from the previous hour")
+
+        if align == "position":
+            if index is None:
+                index = pd.RangeIndex(len(values))
+            if len(values) != len(index):
+                raise ValueError(f"{name}: {len(values)} rows, expected {len(index)} for positional alignment")
+            columns[name] = values.ffill().values
+            continue
+
+        utc, clock = to_utc(frame[time_column], tz)
+        if index is None:
+            index = pd.date_range(utc.min(), utc.max(), freq="h")
+            reference_clock = clock
+        validate_hourly(f"{name} ({workbook}, {clock} time)", utc, index, max_fill, issues)
+        series = pd.Series(values.values, index=utc)
+        columns[name] = series[~utc.duplicated()].reindex(index).ffill().values
+
+    if align == "timestamp":
+        check_year(index, tz, issues)
+    for issue in issues:
+        print(f"Market data: {issue}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = {
+        "columns": list(columns),
+        "align": align,
+        "tz": tz,
+        "start": str(index[0]) if align == "timestamp" else None,
+        "clock": reference_clock if align == "timestamp" else None,
+        "hours": len(index),
+        "issues": issues,
+    }
+    tmp = path[:-4] + ".tmp.npy"
+    np.save(tmp, np.vstack([columns[name] for name in meta["columns"]]))
+    with open(path[:-4] + ".json", "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+    return path
+
+
+class MarketData:
+    # Read-only view of a built dataset. The array is memory-mapped, so every process that attaches the same
+    # file shares the pages; pickling sends only the path, so pool workers attach instead of copying.
+
+    def __init__(self, path):
+        self.path = path
+        with open(path[:-4] + ".json") as f:
+            self.meta = json.load(f)
+        self.values = np.load(path, mmap_mode="r")
+        self.columns = self.meta["columns"]
+        self.issues = self.meta["issues"]
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __len__(self):
+        return self.meta["hours"]
+
+    def __getitem__(self, name):
+        return self.values[self.columns.index(name)]
+
+    @property
+    def index(self):
+        if self.meta["start"] is None:
+            return pd.RangeIndex(len(self))
+        return pd.date_range(self.meta["start"], periods=len(self), freq="h")
+
+    @property
+    def dates(self):
+        # Naive timestamps on the reference workbook's clock (wall clock: repeated autumn hour, skipped spring hour)
+        index = self.index
+        if self.meta["clock"] == "local":
+            return index.tz_convert(self.meta["tz"]).tz_localize(None)
+        if self.meta["clock"] == "standard":
+            return (index + standard_offset(index[0].tz_convert(self.meta["tz"]).year, self.meta["tz"])).tz_localize(None)
+        return index
+
+    def frame(self):
+        return pd.DataFrame({name: self[name] for name in self.columns}, index=self.index, copy=False)
+
+
+def load_market_data(folder=".", **kwargs):
+    return MarketData(build_market_dataset(folder, **kwargs))
@@ -0,0 +1,104 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from bess_matrix_lp import (bess_lp_inputs, bess_lp_coefficients, bess_lp_constraints, bess_lp_outputs, pad_auxiliary,
+                            AFRR_UP, AFRR_DOWN, IMB_PLUS, IMB_MINUS, SOC)
+from instrumentation import laps
+
+
+class PersistentBESSModel:
+    # Keeps one HiGHS model alive across the capacity increments of a case. Between steps only the
+    # prices (objective), the remaining market volumes (column bounds) and the initial SoC change,
+    # so the constraint matrix is built once and every later solve restarts simplex from the
+    # previous optimal basis. optimize() takes the arguments of bess_optimization and returns the same tuple.
+    # The bess LP is degenerate, so a warm start may in principle stop at another optimal vertex than a cold solve
+    # (same revenue, different dispatch, hence different price updates); on the synthetic 500-hour ladder the
+    # persistent, matrix and pyomo backends give the same revenue at every step and the same saturation point.
+
+    def __init__(self, threads=None, window_form="explicit"):
+        self.threads = threads
+        self.window_form = window_form
+        self.highs = None
+        self.structure = None
+        self.solves = 0
+
+    def _build(self, lp, constraints):
+        import highspy
+
+        A = sp.vstack([constraints["A_eq"], constraints["A_ub"]], format="csc")
+        lp = dict(lp, **pad_auxiliary(lp, constraints["n_aux"]))
+
+        model = highspy.HighsLp()
+        model.num_col_ = A.shape[1]
+        model.num_row_ = A.shape[0]
+        model.sense_ = highspy.ObjSense.kMaximize
+        model.col_cost_ = lp["c"]
+        model.col_lower_ = lp["lb"]
+        model.col_upper_ = lp["ub"]
+        model.row_lower_ = np.concatenate([constraints["b_eq"], np.full(len(constraints["b_ub"]), -np.inf)])
+        model.row_upper_ = np.concatenate([constraints["b_eq"], constraints["b_ub"]])
+        model.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        model.a_matrix_.start_ = A.indptr
+        model.a_matrix_.index_ = A.indices
+        model.a_matrix_.value_ = A.data
+
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", False)
+        self.highs.setOptionValue("solver", "simplex")
+        if self.threads is not None:
+            self.highs.setOptionValue("threads", int(self.threads))
+        self.highs.passModel(model)
+
+    def _update(self, lp):
+        # Push only the coefficients and bounds that can change between increments; HiGHS keeps the basis
+        T = lp["T"]
+        cols = np.arange(len(lp["c"]), dtype=np.int32)
+        self.highs.changeColsCost(len(cols), cols, lp["c"])
+
+        changed = np.concatenate([block * T + np.arange(T) for block in (AFRR_UP, AFRR_DOWN, IMB_PLUS, IMB_MINUS)]
+                                 + [[SOC * T]]).astype(np.int32)
+        self.highs.changeColsBounds(len(changed), changed, lp["lb"][changed], lp["ub"][changed])
+
+    def optimize(self, P_DA_t, P_imb_t_sur, P_imb_t_short,
+                 P_aFRR_up_reserve, P_aFRR_down_reserve,
+                 aFRR_volume_up_reserve, aFRR_volume_down_reserve,
+                 imb_volume_surplus, imb_volume_shortage,
+                 capacity, annualized_cost_value, BESS_duration, first_run,
+                 SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block,
+                 n=0.85, solve_log=None, arrays=False):
+        import highspy
+
+        clock = laps()
+        SoC_max = 0.9 * capacity * BESS_duration
+        SoC_init = SoC_max / 2 if first_run else SoC_previous
+
+        inputs = bess_lp_inputs(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                                aFRR_volume_up_reserve, aFRR_volume_down_reserve, imb_volume_surplus, imb_volume_shortage,
+                                imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up)
+        lp = bess_lp_coefficients(*inputs, capacity, BESS_duration, SoC_init)
+
+        # The constraint matrix only depends on these; any change forces a rebuild
+        structure = (lp["T"], capacity, BESS_duration, H_block, n)
+        if self.highs is None or structure != self.structure:
+            self._build(lp, bess_lp_constraints(lp["T"], capacity, BESS_duration, H_block, n, self.window_form))
+            self.structure = structure
+        else:
+            self._update(lp)
+        clock.lap("model_build")
+
+        start = time.perf_counter()
+        self.highs.run()
+        wall_time = time.perf_counter() - start
+        status = self.highs.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError(f"Persistent BESS LP not solved to optimality: {self.highs.modelStatusToString(status)}")
+        self.solves += 1
+        print(f"Solved with highs (persistent, warm start {self.solves > 1}): optimal in {wall_time:.2f} s")
+        if solve_log is not None:
+            solve_log.append({"solver": "highs-persistent", "termination": "optimal", "wall_time": wall_time})
+
+        clock.lap("solver_call")
+
+        x = np.asarray(self.highs.getSolution().col_value)[:len(lp["c"])]
+        return bess_lp_outputs(lp, x, capacity, annualized_cost_value, arrays)
@@ -0,0 +1,103 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from bess_matrix_lp import (assemble_bess_lp, solve_bess_lp, split_solution, VARIABLES,
+                            DA_PLUS, DA_MINUS, IMB_PLUS, IMB_MINUS, AFRR_UP, AFRR_DOWN)
+from instrumentation import laps
+
+# Fleet dispatch with endogenous prices. run3_updatePrices moves every price linearly with the fleet's dispatch x,
+# so slices that each dispatch against the prices left by the others settle where the whole fleet maximizes the
+# area under its price curves: for every dispatch variable and hour
+#     F(x) = c x + 1/2 g x^2,
+# with c the revenue per MWh at the undisturbed prices (the LP objective) and g the revenue change per MWh of the
+# fleet's own dispatch, subject to the constraints of one battery of the fleet's total capacity (identical slices
+# add up to one battery). With the expected signs of the coefficients (prices fall where the fleet sells and rise
+# where it buys) every g <= 0, the objective is concave and this is a convex QP, solved once per capacity instead of
+# a ladder of LPs.
+# HiGHS' QP solver does not converge on this degenerate model beyond a few hundred hours, so F is written exactly as
+# its piecewise-linear interpolant over `segments` equal pieces of each variable's range and solved as an LP: piece s
+# earns the slope c + g (s + 1/2) w, and concavity fills the pieces in order. DA is priced on net purchases, which
+# the separate charging and discharging terms match whenever the fleet does not do both in the same hour.
+
+# Revenue change per MWh of own dispatch, from the bess price-impact coefficients (run3_updatePrices signs)
+IMPACT = {
+    DA_PLUS: lambda coefficients: -coefficients["Day-Ahead Market"],  # selling lowers the price
+    DA_MINUS: lambda coefficients: -coefficients["Day-Ahead Market"],  # buying raises what is paid
+    IMB_PLUS: lambda coefficients: coefficients["Imbalance Shortage"],
+    IMB_MINUS: lambda coefficients: -coefficients["Imbalance Surplus"],
+    AFRR_UP: lambda coefficients: coefficients["aFRR Up Contracted"],
+    AFRR_DOWN: lambda coefficients: coefficients["aFRR Down Contracted"],
+}
+
+
+def impact_slopes(coefficients_bess):
+    # {variable block: g}; a positive g (the price moving in the fleet's favour) has no equilibrium
+    slopes = {block: float(impact(coefficients_bess)) for block, impact in IMPACT.items()}
+    for block, g in slopes.items():
+        if g > 0:
+            raise ValueError(f"Price impact on {VARIABLES[block]} moves the price in the fleet's favour ({g:+g} per MWh), "
+                             f"the equilibrium problem is not concave")
+    return slopes
+
+
+def add_segments(lp, capacity, slopes, segments):
+    # Replaces the revenue of every price-impacted variable by `segments` bounded pieces linked to it
+    T = lp["T"]
+    hours = np.arange(T)
+    n_cols = len(lp["c"])
+    c, lb, ub = lp["c"].copy(), [lp["lb"]], [lp["ub"]]
+    costs, link_rows, link_cols, link_vals = [c], [], [], []
+    n_links = 0
+    for block, g in slopes.items():
+        if g == 0:
+            continue
+        cols = block * T + hours
+        width = np.minimum(lp["ub"][cols], capacity) / segments  # power rows bound every dispatch variable
+        pieces = np.arange(segments) + 0.5
+        costs.append((c[cols][:, None] + g * pieces[None, :] * width[:, None]).ravel())
+        lb.append(np.zeros(T * segments))
+        ub.append(np.repeat(width, segments))
+        c[cols] = 0.0
+        # x[t] - sum_s piece[t, s] == 0
+        pieces_of = np.arange(T * segments)
+        link_rows += [n_links + hours, n_links + pieces_of // segments]
+        link_cols += [cols, n_cols + pieces_of]
+        link_vals += [np.ones(T), -np.ones(T * segments)]
+        n_cols += T * segments
+        n_links += T
+
+    links = sp.csr_matrix((np.concatenate(link_vals), (np.concatenate(link_rows), np.concatenate(link_cols))),
+                          shape=(n_links, n_cols))
+    widen = lambda A: sp.hstack([A, sp.csr_matrix((A.shape[0], n_cols - A.shape[1]))], format="csr")
+    return dict(lp, c=np.concatenate(costs), lb=np.concatenate(lb), ub=np.concatenate(ub),
+                A_ub=widen(lp["A_ub"]), A_eq=sp.vstack([widen(lp["A_eq"]), links], format="csr"),
+                b_eq=np.concatenate([lp["b_eq"], np.zeros(n_links)]))
+
+
+def fleet_equilibrium(P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
+                      aFRR_volume_up_reserve, aFRR_volume_down_reserve, imb_volume_surplus, imb_volume_shortage,
+                      capacity, coefficients_bess, BESS_duration, H_block, n=0.85, window_form="explicit",
+                      segments=10, solve_log=None):
+    # Equilibrium dispatch of a fleet of `capacity` MW starting at 50% SoC, against the undisturbed prices and the
+    # full market volumes; returns {variable: hourly array} for the VARIABLES of bess_matrix_lp
+    clock = laps()
+    slopes = impact_slopes(coefficients_bess)
+    as_array = lambda x: np.asarray(x, dtype=float)
+    lp = assemble_bess_lp(as_array(P_DA_t), as_array(P_imb_t_sur), as_array(P_imb_t_short),
+                          as_array(P_aFRR_up_reserve), as_array(P_aFRR_down_reserve),
+                          as_array(aFRR_volume_up_reserve), as_array(aFRR_volume_down_reserve),
+                          as_array(imb_volume_shortage), as_array(imb_volume_surplus),
+                          capacity, BESS_duration, 0.45 * capacity * BESS_duration, H_block, n, window_form)
+    n_cols = len(lp["c"])
+    lp = add_segments(lp, capacity, slopes, segments)
+    clock.lap("model_build")
+
+    start = time.perf_counter()
+    x = solve_bess_lp(lp, verbose=False)
+    wall_time = time.perf_counter() - start
+    print(f"Solved fleet equilibrium ({capacity} MW, {segments} pieces) with scipy-highs: optimal in {wall_time:.2f} s")
+    if solve_log is not None:
+        solve_log.append({"solver": "scipy-highs-equilibrium", "termination": "optimal", "wall_time": wall_time})
+    clock.lap("solver_call")
+    return split_solution(lp, x[:n_cols])
@@ -0,0 +1,219 @@
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+
+# On-disk layout: {root}/{table}/case={case}/capacity={MW}.{ext}, one file per table, case and capacity increment.
+# Appending an iteration writes only that iteration's file, so the cost per step does not grow with the run.
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "npz": ".npz"}
+
+# Excel refuses sheets longer than this (header row included)
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def default_format():
+    # Parquet when pyarrow is installed, plain NumPy archives otherwise
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "npz"
+
+
+def _write(frame, path, fmt):
+    tmp = path + ".tmp"
+    if fmt == "npz":
+        with open(tmp, "wb") as f:
+            # Text columns are stored as fixed-width unicode so the archive loads without pickle
+            np.savez(f, **{column: frame[column].values.astype(str) if frame[column].dtype == object else frame[column].values
+                           for column in frame.columns})
+    else:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, tmp)
+        else:
+            import pyarrow.feather as feather
+            feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)  # a crash mid-write never leaves a truncated partition behind
+
+
+def _read(path, fmt):
+    if fmt == "npz":
+        with np.load(path) as data:
+            return pd.DataFrame({column: data[column] for column in data.files})
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path).to_pandas()
+    import pyarrow.feather as feather
+    return feather.read_table(path).to_pandas()
+
+
+def _capacity(path):
+    value = float(os.path.splitext(os.path.basename(path))[0].split("=", 1)[1])
+    return int(value) if value.is_integer() else value
+
+
+class ResultsStore:
+    # Columnar, append-only store for the per-iteration outputs of run_iterations:
+    #   hourly     - dispatch and prices of every increment (one row per hour)
+    #   iterations - the revenue_debug row of every increment
+    #   prices     - the price table after every increment (capacity 0 holds the initial extrapolated prices)
+
+    def __init__(self, root, case, fmt=None):
+        fmt = fmt or default_format()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown store format '{fmt}', expected one of {sorted(FORMATS)}")
+        self.root = root
+        self.case = case
+        self.fmt = fmt
+
+    def _partition(self, table):
+        return os.path.join(self.root, table, f"case={self.case}")
+
+    def clear(self):
+        # Drop every partition of this case, e.g. before a fresh run into the same root
+        for folder in glob.glob(os.path.join(self.root, "*", f"case={self.case}")):
+            shutil.rmtree(folder)
+
+    def append(self, table, capacity, frame):
+        if not isinstance(frame, pd.DataFrame):
+            frame = pd.DataFrame(frame)
+        folder = self._partition(table)
+        os.makedirs(folder, exist_ok=True)
+        _write(frame, os.path.join(folder, f"capacity={capacity}{FORMATS[self.fmt]}"), self.fmt)
+
+    def capacities(self, table):
+        paths = glob.glob(os.path.join(self._partition(table), f"capacity=*{FORMATS[self.fmt]}"))
+        return sorted(_capacity(path) for path in paths)
+
+    def read(self, table, capacity=None):
+        # One capacity partition, or all of them in increasing capacity order with a Total_Capacity column
+        folder = self._partition(table)
+        if capacity is not None:
+            return _read(os.path.join(folder, f"capacity={capacity}{FORMATS[self.fmt]}"), self.fmt)
+        frames = []
+        for cap in self.capacities(table):
+            frame = _read(os.path.join(folder, f"capacity={cap}{FORMATS[self.fmt]}"), self.fmt)
+            if "Total_Capacity" not in frame.columns:
+                frame.insert(0, "Total_Capacity", cap)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def write_excel(frame, path):
+    # Excel export with the sheet split in row-limit sized parts when the frame does not fit in one;
+    # read_excel (and the Post_Processing readers) put the parts back together
+    rows = EXCEL_MAX_ROWS - 1
+    if len(frame) <= rows:
+        frame.to_excel(path, index=False)
+        return
+    print(f"{os.path.basename(path)}: {len(frame)} rows exceed the Excel limit, split over {-(-len(frame) // rows)} sheets")
+    with pd.ExcelWriter(path) as writer:
+        for part, start in enumerate(range(0, len(frame), rows), start=1):
+            frame.iloc[start:start + rows].to_excel(writer, sheet_name=f"Sheet{part}", index=False)
+
+
+def read_excel(path, **kwargs):
+    # A workbook written by write_excel as one frame: every sheet, in order
+    return pd.concat(pd.read_excel(path, sheet_name=None, **kwargs).values(), ignore_index=True)
+
+
+def _value_dtype(value):
+    # dtype a column needs to hold value; None for a missing value
+    if value is None:
+        return None
+    dtype = np.asarray(value).dtype
+    return np.dtype(object) if dtype.kind in "OUS" else dtype
+
+
+def _merged_dtype(dtype, value_dtype):
+    # dtype of a column that holds both, as pandas infers it from a list of dicts: missing values turn int columns
+    # into float (NaN) and bool columns into object (None), mixed numbers widen, anything else becomes object
+    if value_dtype is None:
+        return np.dtype(float) if dtype.kind in "iu" else np.dtype(object) if dtype.kind == "b" else dtype
+    if dtype == value_dtype:
+        return dtype
+    if dtype.kind in "iuf" and value_dtype.kind in "iuf":
+        return np.result_type(dtype, value_dtype)
+    return np.dtype(object)
+
+
+def _blank(shape, dtype):
+    # Slots not written yet read back as missing (NaN, as pandas fills absent keys); int and bool columns only exist
+    # while every row has a value
+    if dtype.kind in "fO":
+        return np.full(shape, np.nan, dtype=dtype)
+    return np.zeros(shape, dtype=dtype)
+
+
+class ResultAccumulator:
+    # In-memory counterpart of the store: one preallocated (steps x hours) array per hourly column and one
+    # (steps,) array per per-iteration column, filled in place. Nothing is repeated per hour and nothing is
+    # recopied per step; DataFrames are only built by read(). Arrays grow by doubling if max_steps is exceeded.
+    # read() gives what pd.DataFrame(list of row dicts) would: a column that first appears at a later step, or is
+    # missing from a row, reads back as NaN there; a None value stays None in object columns.
+
+    def __init__(self, max_steps, hours):
+        self.max_steps = max(int(max_steps), 1)
+        self.hours = hours
+        self.steps = 0
+        self.hourly = {}
+        self.iterations = {}
+
+    def _retyped(self, values, dtype):
+        # values with their rows so far in dtype; the rest blank
+        retyped = _blank(values.shape, dtype)
+        retyped[:self.steps] = values[:self.steps]
+        return retyped
+
+    def _set(self, columns, name, value, shape, missing=False):
+        # Writes value to row self.steps of the column (missing: the row has no such key), creating or widening the
+        # column as needed
+        value_dtype = None if missing else _value_dtype(value)
+        if name not in columns:
+            dtype = value_dtype or np.dtype(float)
+            # Earlier rows have no value
+            columns[name] = _blank(shape, _merged_dtype(dtype, None) if self.steps else dtype)
+        dtype = _merged_dtype(columns[name].dtype, value_dtype)
+        if dtype != columns[name].dtype:
+            columns[name] = self._retyped(columns[name], dtype)
+        if not missing and (value is not None or dtype.kind == "O"):
+            columns[name][self.steps] = value
+
+    def _grow(self):
+        self.max_steps *= 2
+        for columns in (self.hourly, self.iterations):
+            for name, values in columns.items():
+                grown = _blank((self.max_steps,) + values.shape[1:], values.dtype)
+                grown[:self.steps] = values[:self.steps]
+                columns[name] = grown
+
+    def append(self, capacity, hourly, iteration):
+        if self.steps == self.max_steps:
+            self._grow()
+        row = dict(iteration)
+        row.setdefault("Total_Capacity", capacity)
+        for columns, values, shape in ((self.hourly, hourly, (self.max_steps, self.hours)),
+                                       (self.iterations, row, (self.max_steps,))):
+            for name, value in values.items():
+                self._set(columns, name, value, shape)
+            for name in [name for name in columns if name not in values]:
+                self._set(columns, name, None, shape, missing=True)
+        self.steps += 1
+
+    def read(self, table):
+        # DataFrame view in the store's layout: hourly rows with Total_Capacity, or one row per iteration
+        n = self.steps
+        if table == "iterations":
+            return pd.DataFrame({name: values[:n] for name, values in self.iterations.items()})
+        if table == "hourly":
+            if not n:
+                return pd.DataFrame()
+            columns = {"Total_Capacity": np.repeat(self.iterations["Total_Capacity"][:n], self.hours),
+                       "Time": np.tile(np.arange(1, self.hours + 1), n)}
+            columns.update({name: values[:n].ravel() for name, values in self.hourly.items()})
+            return pd.DataFrame(columns)
+        raise ValueError(f"ResultAccumulator holds no '{table}' table")
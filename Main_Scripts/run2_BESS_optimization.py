@@ -1,5 +1,7 @@
 from pyomo.environ import *
-from pyomo.opt import SolverFactory
+from solver_backend import solve_model
+from instrumentation import laps
+from bess_matrix_lp import keep_larger
 import numpy as np
 from math import sqrt
 
@@ -8,12 +10,20 @@ def bess_optimization(P_DA_t, P_imb_t_sur, P_imb_t_short,
                       aFRR_volume_up_reserve, aFRR_volume_down_reserve, 
                       imb_volume_surplus, imb_volume_shortage,
                       capacity, annualized_cost_value, BESS_duration, first_run, 
-                      SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block):
+                      SoC_previous, imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block,
+                      n=0.85, window_form="explicit", solver="gurobi", solver_options=None, solve_log=None, arrays=False,
+                      exclusivity="relaxed", warm_start=True):  # n: round-trip efficiency, applied as sqrt(n) on charging and discharging
+    # exclusivity "relaxed" solves the LP and zeroes the smaller of charging/discharging afterwards;
+    # "exact" re-solves it as a MILP with one binary per market and hour (see add_exclusivity_binaries), so the dispatch
+    # matches the SoC trajectory. solver_options "mip_gap" / "time_limit" bound the MILP; warm_start starts it from
+    # the relaxed LP rounded to the larger side of every hour
+    if exclusivity not in ("relaxed", "exact"):
+        raise ValueError(f"Unknown exclusivity '{exclusivity}', expected 'relaxed' or 'exact'")
 
+    clock = laps()
     model = ConcreteModel()
 
     T = range(len(P_DA_t))
-    n = 0.85  # Charging efficiency
     SoC_min = 0.1 * capacity * BESS_duration  # Minimum SoC
     SoC_max = 0.9 * capacity * BESS_duration # Max SoC (4-hour battery)
     Pd_max = capacity
@@ -59,14 +69,40 @@ def bess_optimization(P_DA_t, P_imb_t_sur, P_imb_t_short,
     model.soc_constraints = Constraint(T, rule=soc_rule)
 
     # Adjusted SoC constraints for every 4-hour interval - limit the SoC variation over rolling 4-hour periods when the battery participates in aFRR services
+    # "explicit" sums the H_block aFRR variables of every window (O(T*H_block) nonzeros);
+    # "running_sum" builds each window from prefix/suffix sums that restart every H_block hours (O(T) nonzeros),
+    # fewer nonzeros for long H_block but a slower solve, so "explicit" is the default
+    if window_form == "running_sum":
+        starts_block = lambda t: t % H_block == 0
+        ends_block = lambda t: (t + 1) % H_block == 0 or t == len(T) - 1
+        model.prefix_aFRR_up = Var(T, domain=NonNegativeReals)
+        model.prefix_aFRR_down = Var(T, domain=NonNegativeReals)
+        model.suffix_aFRR_up = Var(T, domain=NonNegativeReals)
+        model.suffix_aFRR_down = Var(T, domain=NonNegativeReals)
+        model.prefix_aFRR_up_def = Constraint(T, rule=lambda model, t: model.prefix_aFRR_up[t] == model.e_aFRR_up[t] + (0 if starts_block(t) else model.prefix_aFRR_up[t-1]))
+        model.prefix_aFRR_down_def = Constraint(T, rule=lambda model, t: model.prefix_aFRR_down[t] == model.e_aFRR_down[t] + (0 if starts_block(t) else model.prefix_aFRR_down[t-1]))
+        model.suffix_aFRR_up_def = Constraint(T, rule=lambda model, t: model.suffix_aFRR_up[t] == model.e_aFRR_up[t] + (0 if ends_block(t) else model.suffix_aFRR_up[t+1]))
+        model.suffix_aFRR_down_def = Constraint(T, rule=lambda model, t: model.suffix_aFRR_down[t] == model.e_aFRR_down[t] + (0 if ends_block(t) else model.suffix_aFRR_down[t+1]))
+
+        def window_sum(e_aFRR, t):
+            up = e_aFRR is model.e_aFRR_up
+            prefix = model.prefix_aFRR_up if up else model.prefix_aFRR_down
+            suffix = model.suffix_aFRR_up if up else model.suffix_aFRR_down
+            return prefix[t + H_block - 1] + (0 if starts_block(t) else suffix[t])
+    elif window_form == "explicit":
+        def window_sum(e_aFRR, t):
+            return sum(e_aFRR[tau] for tau in range(t, min(t+H_block, len(T))))
+    else:
+        raise ValueError(f"Unknown window_form '{window_form}', expected 'explicit' or 'running_sum'")
+
     def soc_max_rule(model, t):
         if t < len(T) - H_block:
-            return model.SoC[t] + sqrt(n) * sum(model.e_aFRR_down[tau] for tau in range(t, min(t+H_block, len(T)))) <= SoC_max
+            return model.SoC[t] + sqrt(n) * window_sum(model.e_aFRR_down, t) <= SoC_max
         return Constraint.Skip
 
     def soc_min_rule(model, t):
         if t < len(T) - H_block:
-            return model.SoC[t] - sqrt(n) * sum(model.e_aFRR_up[tau] for tau in range(t, min(t+H_block, len(T)))) >= SoC_min
+            return model.SoC[t] - sqrt(n) * window_sum(model.e_aFRR_up, t) >= SoC_min
         return Constraint.Skip
 
     model.SoC_max = Constraint(T, rule=soc_max_rule)
@@ -89,75 +125,139 @@ def bess_optimization(P_DA_t, P_imb_t_sur, P_imb_t_short,
     model.settled_imb_short = Constraint(T, rule=lambda model, t: model.e_imb_plus[t] <= max(imb_volume_shortage[t] - imbalance_used_shortage[t], 0)) # Volume in MWh
     model.settled_imb_sur = Constraint(T, rule=lambda model, t: model.e_imb_minus[t] <= max(imb_volume_surplus[t] - imbalance_used_surplus[t], 0)) # Volume in MWh
 
-    # Solve model
-    opt = SolverFactory('gurobi')
-    opt.solve(model, tee=False)
-
-    # Extract SoC values
-    SoC_values = [model.SoC[t].value for t in T]
-
-    # Extract raw values
-    e_DA_minus = [model.e_DA_t_minus[t].value for t in T]
-    e_DA_plus = [model.e_DA_t_plus[t].value for t in T]
-    e_imb_minus = [model.e_imb_minus[t].value for t in T]
-    e_imb_plus = [model.e_imb_plus[t].value for t in T]
-    e_aFRR_down = [model.e_aFRR_down[t].value for t in T]
-    e_aFRR_up = [model.e_aFRR_up[t].value for t in T]
-
-    # Apply post-processing: allow only max(charging, discharging)
-    charging_DA_vals = []
-    discharging_DA_vals = []
-    for c, d in zip(e_DA_minus, e_DA_plus):
-        if c > d:
-            charging_DA_vals.append(c)
-            discharging_DA_vals.append(0)
-        else:
-            charging_DA_vals.append(0)
-            discharging_DA_vals.append(d)
-
-    charging_imb_vals = []
-    discharging_imb_vals = []
-    for c, d in zip(e_imb_minus, e_imb_plus):
-        if c > d:
-            charging_imb_vals.append(c)
-            discharging_imb_vals.append(0)
-        else:
-            charging_imb_vals.append(0)
-            discharging_imb_vals.append(d)
-
-    charging_aFRR_vals = []
-    discharging_aFRR_vals = []
-    for c, d in zip(e_aFRR_down, e_aFRR_up):
-        if c > d:
-            charging_aFRR_vals.append(c)
-            discharging_aFRR_vals.append(0)
-        else:
-            charging_aFRR_vals.append(0)
-            discharging_aFRR_vals.append(d)
-
-    # Final outputs
-    charging_DA = {capacity: charging_DA_vals}
-    discharging_DA = {capacity: discharging_DA_vals}
-    charging_imb = {capacity: charging_imb_vals}
-    discharging_imb = {capacity: discharging_imb_vals}
-    charging_aFRR = {capacity: charging_aFRR_vals}
-    discharging_aFRR = {capacity: discharging_aFRR_vals}
-
-    SoC_final = SoC_values[-1]
+    clock.lap("model_build")
+
+    # Solve model (falls back to HiGHS/CBC when the requested solver is unavailable, raises unless a solution is loaded)
+    solve_info = solve_model(model, solver, solver_options)
+    if solve_log is not None:
+        solve_log.append(solve_info)
+    clock.lap("solver_call")
+
+    # Extract the solution in bulk: one pass over each variable's components into a float array
+    extract = lambda var: np.fromiter((var[t].value for t in T), dtype=float, count=len(T))
+    price = lambda series: np.asarray(series, dtype=float)
+    revenue = lambda: float(price(P_DA_t) @ (extract(model.e_DA_t_plus) - extract(model.e_DA_t_minus))
+                            + price(P_imb_t_short) @ extract(model.e_imb_plus) - price(P_imb_t_sur) @ extract(model.e_imb_minus)
+                            + price(P_aFRR_up_reserve) @ extract(model.e_aFRR_up) + price(P_aFRR_down_reserve) @ extract(model.e_aFRR_down))
+
+    if exclusivity == "exact":
+        available = {
+            "imb_plus": np.minimum(Pd_max, np.maximum(np.asarray(imb_volume_shortage) - imbalance_used_shortage, 0)),
+            "imb_minus": np.minimum(Pc_max, np.maximum(np.asarray(imb_volume_surplus) - imbalance_used_surplus, 0)),
+            "aFRR_up": np.minimum(Pd_max, np.maximum(np.asarray(aFRR_volume_up_reserve) - aFRR_used_up, 0)),
+            "aFRR_down": np.minimum(Pc_max, np.maximum(np.asarray(aFRR_volume_down_reserve) - aFRR_used_down, 0)),
+        }
+        solve_info = solve_exact(model, T, Pd_max, Pc_max, available, extract, revenue, solver, solver_options,
+                                 warm_start, solve_info, solve_log)
+        clock.lap("solver_call")
+
+    SoC_values = extract(model.SoC)
+    e_DA_minus = extract(model.e_DA_t_minus)
+    e_DA_plus = extract(model.e_DA_t_plus)
+    e_imb_minus = extract(model.e_imb_minus)
+    e_imb_plus = extract(model.e_imb_plus)
+    e_aFRR_down = extract(model.e_aFRR_down)
+    e_aFRR_up = extract(model.e_aFRR_up)
+    clock.lap("value_extraction")
+
+    # Apply post-processing: allow only max(charging, discharging) in every hour
+    charging_DA_vals, discharging_DA_vals = keep_larger(e_DA_minus, e_DA_plus)
+    charging_imb_vals, discharging_imb_vals = keep_larger(e_imb_minus, e_imb_plus)
+    charging_aFRR_vals, discharging_aFRR_vals = keep_larger(e_aFRR_down, e_aFRR_up)
+
+    # Final outputs: arrays=True returns the six dispatch arrays as they are, otherwise as {capacity: list}
+    dispatch = (charging_DA_vals, discharging_DA_vals, charging_imb_vals, discharging_imb_vals, charging_aFRR_vals, discharging_aFRR_vals)
+    if not arrays:
+        dispatch = tuple({capacity: values.tolist()} for values in dispatch)
+
+    SoC_final = float(SoC_values[-1])
+    clock.lap("post_processing")
     
-    objective_value = model.objective()
-    marginal_DA_revenue = revenue_DA()
-    marginal_Imbalance_revenue = revenue_Imbalance()
-    marginal_aFRR_reserve_revenue = revenue_aFRR_reserve()
+    # Revenue terms from the extracted arrays (the same sums as the objective's expressions, without walking them)
+    marginal_DA_revenue = float(price(P_DA_t) @ (e_DA_plus - e_DA_minus))
+    marginal_Imbalance_revenue = float(price(P_imb_t_short) @ e_imb_plus - price(P_imb_t_sur) @ e_imb_minus)
+    marginal_aFRR_reserve_revenue = float(price(P_aFRR_up_reserve) @ e_aFRR_up + price(P_aFRR_down_reserve) @ e_aFRR_down)
+    objective_value = marginal_DA_revenue + marginal_Imbalance_revenue + marginal_aFRR_reserve_revenue
     total_revenue = objective_value
     net_revenue = total_revenue - (capacity * annualized_cost_value)
 
     print(f"Total Objective Revenue: {objective_value}")
-    print(f"Revenue from DA: {value(revenue_DA)}")
-    print(f"Revenue from Imbalance: {value(revenue_Imbalance)}")
-    print(f"Revenue from aFRR reserve: {value(revenue_aFRR_reserve)}")
+    print(f"Revenue from DA: {marginal_DA_revenue}")
+    print(f"Revenue from Imbalance: {marginal_Imbalance_revenue}")
+    print(f"Revenue from aFRR reserve: {marginal_aFRR_reserve_revenue}")
+    clock.lap("reporting")
 
 
-    return (charging_DA, discharging_DA, charging_imb, discharging_imb, charging_aFRR, discharging_aFRR, 
+    return (*dispatch,
         marginal_DA_revenue, marginal_Imbalance_revenue, marginal_aFRR_reserve_revenue, 
         total_revenue, net_revenue, SoC_final)
+
+
+def add_exclusivity_binaries(model, T, Pd_max, Pc_max, available):
+    # One binary per market and hour picks the side (1: discharging / aFRR up, 0: charging / aFRR down). Each big-M is
+    # the most that side can take in that hour (power, or the remaining market volume if smaller), which keeps the
+    # MILP relaxation close to the LP
+    model.side_DA = Var(T, domain=Binary)
+    model.side_imb = Var(T, domain=Binary)
+    model.side_aFRR = Var(T, domain=Binary)
+    model.exact_DA_plus = Constraint(T, rule=lambda model, t: model.e_DA_t_plus[t] <= Pd_max * model.side_DA[t])
+    model.exact_DA_minus = Constraint(T, rule=lambda model, t: model.e_DA_t_minus[t] <= Pc_max * (1 - model.side_DA[t]))
+    model.exact_imb_plus = Constraint(T, rule=lambda model, t: model.e_imb_plus[t] <= available["imb_plus"][t] * model.side_imb[t])
+    model.exact_imb_minus = Constraint(T, rule=lambda model, t: model.e_imb_minus[t] <= available["imb_minus"][t] * (1 - model.side_imb[t]))
+    model.exact_aFRR_up = Constraint(T, rule=lambda model, t: model.e_aFRR_up[t] <= available["aFRR_up"][t] * model.side_aFRR[t])
+    model.exact_aFRR_down = Constraint(T, rule=lambda model, t: model.e_aFRR_down[t] <= available["aFRR_down"][t] * (1 - model.side_aFRR[t]))
+    return {"DA": (model.side_DA, model.e_DA_t_plus, model.e_DA_t_minus),
+            "imb": (model.side_imb, model.e_imb_plus, model.e_imb_minus),
+            "aFRR": (model.side_aFRR, model.e_aFRR_up, model.e_aFRR_down)}
+
+
+def solve_exact(model, T, Pd_max, Pc_max, available, extract, revenue, solver, solver_options, warm_start, lp_info,
+                solve_log):
+    # Called with the relaxed LP solved and loaded (lp_info: its solve info). Records what the relaxed mode would have
+    # reported, adds the binaries and solves the MILP; the returned solve info carries an "exclusivity" report comparing
+    # both. The rounded and MILP solves are logged with "problem" set, so they are not counted as LP solves
+    lp_revenue = revenue()
+    sides = add_exclusivity_binaries(model, T, Pd_max, Pc_max, available)
+    lp_dispatch = {market: (extract(plus), extract(minus)) for market, (_, plus, minus) in sides.items()}
+    overlap_hours = sum(int(np.sum(np.minimum(plus, minus) > 1e-6)) for plus, minus in lp_dispatch.values())
+
+    rounded_revenue = None
+    if warm_start:
+        # Rounding the LP to the larger side of every hour and re-solving the LP with the sides fixed gives a feasible
+        # incumbent (zero dispatch always fits), whose values stay on the variables as the MILP start
+        for market, (side, _, _) in sides.items():
+            plus, minus = lp_dispatch[market]
+            for t in T:
+                side[t].fix(1 if plus[t] >= minus[t] else 0)
+        rounded_info = dict(solve_model(model, solver, solver_options), problem="rounded")
+        if solve_log is not None:
+            solve_log.append(rounded_info)
+        rounded_revenue = revenue()
+        for side, _, _ in sides.values():
+            side.unfix()
+
+    mip_info = dict(solve_model(model, solver, solver_options, warmstart=warm_start), problem="milp")
+    if solve_log is not None:
+        solve_log.append(mip_info)
+    mip_revenue = revenue()
+    bound = mip_info["bounds"][1]  # maximization: the upper bound
+    bound = float(bound) if bound is not None and np.isfinite(bound) else None
+    lp_time, mip_time = lp_info["wall_time"], mip_info["wall_time"]
+
+    mip_info["exclusivity"] = {
+        "LP_Revenue": lp_revenue,
+        "LP_Overlap_Hours": overlap_hours,
+        "Rounded_LP_Revenue": rounded_revenue,
+        "MIP_Revenue": mip_revenue,
+        "MIP_Bound": bound,
+        "MIP_Gap": (bound - mip_revenue) / max(abs(mip_revenue), 1e-9) if bound is not None else None,
+        "Revenue_Difference": mip_revenue - lp_revenue,
+        "LP_Time_s": lp_time,
+        "MIP_Time_s": mip_time,
+        "Runtime_Ratio": mip_time / lp_time if lp_time and mip_time is not None else None,
+    }
+    seconds = lambda wall_time: "n/a" if wall_time is None else f"{wall_time:.2f} s"
+    print(f"Exact exclusivity: MILP revenue {mip_revenue:.2f} vs relaxed LP {lp_revenue:.2f} "
+          f"({mip_revenue - lp_revenue:+.2f}, {overlap_hours} market-hours with simultaneous charge/discharge in the LP), "
+          f"{seconds(mip_time)} vs {seconds(lp_time)}")
+    return mip_info
@@ -1,204 +1,819 @@
-from run2_BESS_optimization import bess_optimization
 from run3_updatePrices import update_prices
+from results_store import ResultsStore, ResultAccumulator, write_excel
+from market_data import load_market_data
+from scenario_cache import scenario_key
+from instrumentation import phase, set_context
 
 import numpy as np
 import pandas as pd
 import os
-import numpy_financial as npf
+import pickle
+from functools import partial
+
+DISPATCH_COLUMNS = ["Charging_DA", "Discharging_DA", "Charging_Imb", "Discharging_Imb", "Charging_aFRR", "Discharging_aFRR"]
+PRICE_COLUMNS = ["DAM_Price", "Imbalance_Price_Surplus", "Imbalance_Price_Shortage", "aFRR_Up_Price_reserve", "aFRR_Down_Price_reserve"]
+FINAL_RESULTS_COLUMNS = (["Total_Capacity", "Time"] + DISPATCH_COLUMNS
+                         + ["Marginal_DA_Revenue", "Marginal_Imbalance_Revenue", "Marginal_aFRR_Reserve_Revenue",
+                            "Marginal_Total_Revenue", "Marginal_Net_Revenue", "Cumulative_Total_Revenue", "Cumulative_Net_Revenue"]
+                         + PRICE_COLUMNS + ["Marginal_CAPEX_Cost", "Marginal_OPEX_Cost"])
+
+def select_backend(backend, window_form="explicit", solver="gurobi", solver_options=None, backend_options=None, solve_log=None):
+    # "pyomo" builds the model rule by rule, "matrix" assembles the same LP as sparse matrices,
+    # "persistent" builds it once per case and warm-starts every later increment,
+    # "decomposed" solves overlapping weekly windows in a process pool (backend_options: window, overlap, processes, report_gap)
+    # "da_only" trades the DA market alone with an exact dynamic program, no LP solver (backend_options: report_gap);
+    # for screening runs: its revenue is a lower bound of the full LP's
+    # window_form "running_sum" writes the rolling H_block aFRR windows with block running sums (O(T) nonzeros);
+    # "explicit" stays the recommended default: in Benchmarks/benchmark_window_constraints.py running_sum solves
+    # slower on the pyomo, matrix and cold persistent paths at every H_block, it only makes the matrix smaller
+    # solver/solver_options only apply to the Pyomo backend; the others always use HiGHS
+    # Pyomo backend_options: exclusivity ("relaxed" / "exact" MILP), warm_start (MILP start from the rounded LP)
+    # Backends are imported on first use, so importing this module does not load Pyomo or SciPy.
+    # Every backend is bound with arrays=True: the dispatch comes back as NumPy arrays, not {capacity: list}
+    if backend == "persistent":
+        from persistent_lp import PersistentBESSModel
+        return partial(PersistentBESSModel(threads=(solver_options or {}).get("threads"), window_form=window_form).optimize,
+                       solve_log=solve_log, arrays=True)
+    if backend == "decomposed":
+        from decomposed_dispatch import bess_optimization_decomposed
+        return partial(bess_optimization_decomposed, window_form=window_form, solve_log=solve_log, arrays=True,
+                       **(backend_options or {}))
+    if backend == "da_only":
+        from da_dispatch import bess_optimization_da
+        return partial(bess_optimization_da, window_form=window_form, solve_log=solve_log, arrays=True,
+                       **(backend_options or {}))
+    if backend == "matrix":
+        from bess_matrix_lp import bess_optimization_matrix
+        return partial(bess_optimization_matrix, window_form=window_form, solve_log=solve_log, arrays=True)
+    if backend == "pyomo":
+        from run2_BESS_optimization import bess_optimization
+        return partial(bess_optimization, window_form=window_form, solver=solver,
+                       solver_options=solver_options, solve_log=solve_log, arrays=True, **(backend_options or {}))
+    raise ValueError(f"Unknown backend '{backend}'")
+
+
+def load_market_volumes(market=None):
+    # Remaining aFRR (MW) and settled imbalance (MWh) volumes, depleted in place as capacity is added,
+    # so these are private copies of the shared read-only market dataset
+    market = load_market_data() if market is None else market
+    return {
+        "aFRR_up": np.array(market["aFRR_Up_Volume"]),
+        "aFRR_down": np.array(market["aFRR_Down_Volume"]),
+        "imb_surplus": np.array(market["Imbalance_Surplus_Volume"]),
+        "imb_shortage": np.array(market["Imbalance_Shortage_Volume"]),
+    }
+
+
+def new_ladder_state(df, volumes):
+    # Everything that carries over from one capacity increment to the next
+    T = len(df)
+    return {
+        "df": df,
+        "volumes": volumes,
+        "imbalance_used_surplus": np.zeros(T),
+        "imbalance_used_shortage": np.zeros(T),
+        "aFRR_used_down": np.zeros(T),
+        "aFRR_used_up": np.zeros(T),
+        "first_run": True,
+        "SoC_previous": None,
+        "SoC_capacity": None,
+    }
+
+
+def solve_increment(optimize, state, capacity_step, annualized_cost_value, BESS_duration, H_block):
+    # Dispatch one capacity slice against the current prices and volumes; the state is not modified
+    df = state["df"]
+    volumes = state["volumes"]
+    SoC_previous = state["SoC_previous"]
+    if SoC_previous is not None and state["SoC_capacity"] != capacity_step:
+        SoC_previous = SoC_previous * capacity_step / state["SoC_capacity"]  # same fill level for a differently sized slice
+
+    prices = {
+        "DAM_Price": df["Extrapolated_DAM_Price"],
+        "Imbalance_Price_Surplus": df["Extrapolated_Imbalance_Surplus_Price"],
+        "Imbalance_Price_Shortage": df["Extrapolated_Imbalance_Shortage_Price"],
+        "aFRR_Up_Price_reserve": df["Extrapolated_aFRR_Up_Price_reserve"],
+        "aFRR_Down_Price_reserve": df["Extrapolated_aFRR_Down_Price_reserve"],
+    }
+    outputs = optimize(
+        *prices.values(),
+        volumes["aFRR_up"], volumes["aFRR_down"], volumes["imb_surplus"], volumes["imb_shortage"],
+        capacity_step, annualized_cost_value, BESS_duration, state["first_run"], SoC_previous,
+        state["imbalance_used_surplus"], state["imbalance_used_shortage"], state["aFRR_used_down"], state["aFRR_used_up"], H_block
+    )
+
+    increment = {"capacity_step": capacity_step, "prices": {name: series.values for name, series in prices.items()}}
+    for name, value in zip(DISPATCH_COLUMNS, outputs[:6]):
+        increment[name] = value if isinstance(value, np.ndarray) else np.array(value[capacity_step])  # arrays or {capacity: list}
+    for name, value in zip(["Marginal_DA_Revenue", "Marginal_Imbalance_Revenue", "Marginal_aFRR_Reserve_Revenue",
+                            "Marginal_Total_Revenue", "Marginal_Net_Revenue", "SoC_final"], outputs[6:]):
+        increment[name] = value
+    return increment
+
+
+def apply_increment(state, increment, coefficients_bess):
+    # Commit a solved slice: carry the SoC, deplete the market volumes and update the prices
+    capacity_step = increment["capacity_step"]
+    volumes = state["volumes"]
+
+    # After the first iteration, update the flag so it's False for future iterations
+    state["first_run"] = False
+    state["SoC_previous"] = increment["SoC_final"]
+    state["SoC_capacity"] = capacity_step
+
+    # Extract the **actual** imbalance and AFRR participation
+    state["imbalance_used_shortage"][:] = increment["Discharging_Imb"]  # Energy discharged into the surplus market
+    state["imbalance_used_surplus"][:] = increment["Charging_Imb"]  # Energy charged from the shortage market
+    state["aFRR_used_down"][:] = increment["Charging_aFRR"]  # Energy charged from the aFRR
+    state["aFRR_used_up"][:] = increment["Discharging_aFRR"]  # Energy discharged into the aFRR
+
+    # Reduce imbalance/aFRR volumes for the next iteration based on actual BESS participation
+    volumes["imb_surplus"][:] = np.maximum(volumes["imb_surplus"] - state["imbalance_used_surplus"], 0)
+    volumes["imb_shortage"][:] = np.maximum(volumes["imb_shortage"] - state["imbalance_used_shortage"], 0)
+    volumes["aFRR_up"][:] = np.maximum(volumes["aFRR_up"] - state["aFRR_used_up"], 0)
+    volumes["aFRR_down"][:] = np.maximum(volumes["aFRR_down"] - state["aFRR_used_down"], 0)
+
+    # Update prices
+    update_prices(state["df"], increment["Charging_DA"], increment["Discharging_DA"], increment["Charging_Imb"], increment["Discharging_Imb"],
+                  increment["Charging_aFRR"], increment["Discharging_aFRR"],
+                  coefficients_bess["Day-Ahead Market"], coefficients_bess["Imbalance Shortage"], coefficients_bess["Imbalance Surplus"],
+                  coefficients_bess["aFRR Up Contracted"], coefficients_bess["aFRR Down Contracted"], capacity_step)
+
+
+def sync_historical_prices(df):
+    df["Historical_DAM_Price"] = df["Extrapolated_DAM_Price"]
+    df["Historical_Imbalance_Surplus_Price"] = df["Extrapolated_Imbalance_Surplus_Price"]
+    df["Historical_Imbalance_Shortage_Price"] = df["Extrapolated_Imbalance_Shortage_Price"]
+    df["Historical_aFRR_Up_Price_reserve"] = df["Extrapolated_aFRR_Up_Price_reserve"]
+    df["Historical_aFRR_Down_Price_reserve"] = df["Extrapolated_aFRR_Down_Price_reserve"]
+
+
+def interpolate_saturation(revenue_debug, per_mw=False):
+    # Linear interpolation of the first positive -> non-positive crossing of marginal net revenue
+    # (per MW of slice when the steps differ in size); None if there is no crossing
+    net = lambda row: row["Marginal_Net_Revenue"] / row["Step_Size"] if per_mw else row["Marginal_Net_Revenue"]
+    for i in range(1, len(revenue_debug)):
+        prev = revenue_debug[i - 1]
+        curr = revenue_debug[i]
+        if net(prev) > 0 and net(curr) <= 0:
+            cap1, rev1 = prev["Total_Capacity"], net(prev)
+            cap2, rev2 = curr["Total_Capacity"], net(curr)
+            # Linear interpolation
+            return cap1 + (0 - rev1) * (cap2 - cap1) / (rev2 - rev1)
+    return None
+
+
+def accumulate_totals(totals, increment):
+    # Cumulative revenues over all committed slices
+    names = ["DA_Revenue", "Imbalance_Revenue", "aFRR_Reserve_Revenue", "Total_Revenue", "Net_Revenue"]
+    if totals is None:
+        return {f"Cumulative_{name}": 0 for name in names}
+    return {f"Cumulative_{name}": totals[f"Cumulative_{name}"] + increment[f"Marginal_{name}"] for name in names}
+
+
+def lp_solves(solve_log):
+    # LP solves of the log; the exact exclusivity mode's rounded-start and MILP solves carry "problem" and count apart
+    return sum(1 for info in solve_log if "problem" not in info)
+
+
+def mip_solves(solve_log):
+    return len(solve_log) - lp_solves(solve_log)
+
+
+def revenue_debug_row(increment, total_capacity, totals, annualized_CAPEX_component, annualized_OPEX_component, solve_log):
+    capacity_step = increment["capacity_step"]
+    return {
+        "Step_Size": capacity_step,
+        "Total_Capacity": total_capacity,
+        "Marginal_DA_Revenue": increment["Marginal_DA_Revenue"],
+        "Marginal_Imbalance_Revenue": increment["Marginal_Imbalance_Revenue"],
+        "Marginal_aFRR_Reserve_Revenue": increment["Marginal_aFRR_Reserve_Revenue"],
+        "Marginal_Total_Revenue": increment["Marginal_Total_Revenue"],
+        "Marginal_Net_Revenue": increment["Marginal_Net_Revenue"],
+        "Marginal_CAPEX_Cost": annualized_CAPEX_component * capacity_step,
+        "Marginal_OPEX_Cost": annualized_OPEX_component * capacity_step,
+        **totals,
+        "Solver": solve_log[-1]["solver"],
+        "Solve_Time_s": solve_log[-1]["wall_time"],
+        "LP_Solves": lp_solves(solve_log),
+        "MIP_Solves": mip_solves(solve_log),  # exact exclusivity: rounded starts and MILPs
+        **solve_log[-1].get("exclusivity", {}),  # exact exclusivity mode: MILP against relaxed LP, per step
+    }
+
+
+def exclusivity_summary(revenue_debug):
+    # Revenue and runtime of the exact MILP steps against their relaxed LPs, over the whole ladder
+    steps = [row for row in revenue_debug if "MIP_Revenue" in row]
+    if not steps:
+        return
+    lp_revenue = sum(row["LP_Revenue"] for row in steps)
+    mip_revenue = sum(row["MIP_Revenue"] for row in steps)
+    lp_time = sum(row["LP_Time_s"] for row in steps)
+    mip_time = sum(row["MIP_Time_s"] for row in steps)
+    gaps = [row["MIP_Gap"] for row in steps if row["MIP_Gap"] is not None]
+    print(f" Exact exclusivity over {len(steps)} steps: MILP revenue {mip_revenue:,.0f} vs relaxed LP {lp_revenue:,.0f} "
+          f"({100 * (mip_revenue - lp_revenue) / abs(lp_revenue) if lp_revenue else 0:+.3f}%), "
+          f"{sum(row['LP_Overlap_Hours'] for row in steps)} simultaneous market-hours in the LPs, "
+          f"solve time {mip_time:.1f} s vs {lp_time:.1f} s (x{mip_time / lp_time if lp_time else float('nan'):.1f})"
+          + (f", largest MIP gap {100 * max(gaps):.3f}%" if gaps else ""))
+
+
+def hourly_results(increment):
+    # Hourly dispatch and the prices it was dispatched against
+    hours = len(increment["Charging_DA"])
+    return {
+        "Time": np.arange(1, hours + 1),
+        **{name: increment[name] for name in DISPATCH_COLUMNS},
+        **increment["prices"],
+    }
+
+
+def final_results(results):
+    # final_results1 layout: hourly rows with the per-iteration revenues repeated over the hours of each increment,
+    # from a ResultsStore or a ResultAccumulator
+    return final_results_frame(results.read("hourly"), results.read("iterations"))
+
+
+def final_results_frame(hourly, iterations):
+    if hourly.empty:
+        return pd.DataFrame(columns=FINAL_RESULTS_COLUMNS)
+    return hourly.merge(iterations, on="Total_Capacity", how="left")[FINAL_RESULTS_COLUMNS]
+
+
+def store_increment(store, results, increment, debug_row, df):
+    total_capacity = debug_row["Total_Capacity"]
+    hourly = hourly_results(increment)
+    store.append("hourly", total_capacity, hourly)
+    del hourly["Time"]  # the accumulator derives the hour index itself
+    results.append(total_capacity, hourly, debug_row)
+    store.append("iterations", total_capacity, [debug_row])
+    store.append("prices", total_capacity, df)
+
+
+def save_checkpoint(path, loop):
+    # Written next to the final file and swapped in, so a crash mid-write keeps the previous checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(loop, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path, key):
+    # The saved loop state, or None if there is none or it was written for different inputs
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        loop = pickle.load(f)
+    if loop["key"] != key:
+        print(f" Ignoring {path}: it belongs to a run with different inputs")
+        return None
+    return loop
+
+
+def restore_results(store, results, revenue_debug):
+    # Refill the in-memory results of the completed steps from the store partitions they were appended to
+    for row in revenue_debug:
+        hourly = store.read("hourly", row["Total_Capacity"])
+        results.append(row["Total_Capacity"], {name: hourly[name].values for name in hourly.columns if name != "Time"}, row)
+
+
+def export_excel(store, output_dir, prices=False, results=None):
+    # Optional end-of-run export to the workbooks the plotting scripts read, from the in-memory results when
+    # given (no read-back) or else from the store; prices=True also writes updated_prices_capacity_{N}.xlsx
+    results = results or store
+    export_workbooks(store.read("prices", 0), results, output_dir)
+    if prices:
+        for capacity in store.capacities("prices")[1:]:
+            write_excel(store.read("prices", capacity), os.path.join(output_dir, f"updated_prices_capacity_{capacity}.xlsx"))
+
+
+def export_workbooks(initial_prices, results, output_dir):
+    write_excel(initial_prices, os.path.join(output_dir, "initial_extrapolated_prices.xlsx"))
+    write_excel(results.read("iterations"), os.path.join(output_dir, "revenue_debug.xlsx"))
+    write_excel(final_results(results), os.path.join(output_dir, "final_results1.xlsx"))
+
 
 def run_iterations(df, max_capacity, step, output_dir,
                     BESS_duration, H_block, annualized_cost_value, annualized_CAPEX_component,
-                    annualized_OPEX_component, coefficients_bess):
-
-
-            coef_DAM = coefficients_bess["Day-Ahead Market"]
-            coef_imb_short = coefficients_bess["Imbalance Shortage"]
-            coef_imb_sur = coefficients_bess["Imbalance Surplus"]
-            coef_aFRR_up_reserve = coefficients_bess["aFRR Up Contracted"]
-            coef_aFRR_down_reserve = coefficients_bess["aFRR Down Contracted"]
-
-            results = pd.DataFrame()
-            revenue_debug = []
-            total_capacity = 0
-            total_DA_revenue = 0
-            total_Imbalance_revenue = 0
-            total_aFRR_reserve_revenue = 0
-            total_total_revenue = 0
-            total_net_revenue = 0
-            imbalance_used_surplus = np.zeros(len(df))
-            imbalance_used_shortage = np.zeros(len(df))
-            aFRR_used_down = np.zeros(len(df))
-            aFRR_used_up = np.zeros(len(df))
+                    annualized_OPEX_component, coefficients_bess, backend="pyomo", window_form="explicit",
+                    solver="gurobi", solver_options=None, backend_options=None,
+                    search="fixed", coarse_step=None, tolerance=None, band=1.0,
+                    store_dir=None, store_format=None, excel_export=True, return_results=False, market=None, cache=None,
+                    checkpoint=False, resume=False, equilibrium_options=None):
+
+
+            solve_log = []
 
+            # Every increment is appended to a columnar store under store_dir (default output_dir), partitioned by case
+            # and capacity; excel_export=True writes the usual workbooks once at the end, "all" adds the per-capacity prices
             os.makedirs(output_dir, exist_ok=True)
-            initial_prices_path = os.path.join(output_dir, "initial_extrapolated_prices.xlsx")
-            df.to_excel(initial_prices_path, index=False)
-
-            df["Historical_DAM_Price"] = df["Extrapolated_DAM_Price"]
-            df["Historical_Imbalance_Surplus_Price"] = df["Extrapolated_Imbalance_Surplus_Price"]
-            df["Historical_Imbalance_Shortage_Price"] = df["Extrapolated_Imbalance_Shortage_Price"]
-            df["Historical_aFRR_Up_Price_reserve"] = df["Extrapolated_aFRR_Up_Price_reserve"]
-            df["Historical_aFRR_Down_Price_reserve"] = df["Extrapolated_aFRR_Down_Price_reserve"]
-
-            # Load market volumes
-            volume_aFRR_up_reserve = pd.read_excel("aFRR_hourly_prices_Up.xlsx")["Volume Reserve (MW)"].values
-            volume_aFRR_down_reserve = pd.read_excel("aFRR_hourly_prices_Down.xlsx")["Volume Reserve (MW)"].values
-            volume_imb_surplus = pd.read_excel("settled_imbalance_volumes.xlsx", sheet_name="MWh")["Surplus (MWh)"].values
-            volume_imb_shortage = pd.read_excel("settled_imbalance_volumes.xlsx", sheet_name="MWh")["Shortage (MWh)"].values
-
-             # Load the implicit balance volume surplus and shortage
-            settled_imbalance_surplus = pd.read_excel("settled_imbalance_volumes.xlsx", sheet_name="MWh")  # Load imbalance volume surplus
-            settled_imbalance_shortage = pd.read_excel("settled_imbalance_volumes.xlsx", sheet_name="MWh")  # Load imbalance volume shortage
-            volume_imb_surplus = settled_imbalance_surplus["Surplus (MWh)"].values
-            volume_imb_shortage = settled_imbalance_shortage["Shortage (MWh)"].values
-
-            first_run_flag = True
-            SoC_previous = None
-
-            # Initialize holder variables
-            saturation_point = None
-            saturation_investment = None
-            saturation_net_revenue = None
-
-            while total_capacity + step <= max_capacity:
+            store = ResultsStore(store_dir or output_dir, os.path.basename(os.path.normpath(output_dir)), store_format)
+
+            # Every input that shapes the trajectory, hashed: names the cache entry and ties a checkpoint to its run
+            key = None
+            if cache is not None or checkpoint or resume:
+                market = load_market_data() if market is None else market
+                key = scenario_key(df=df, market=market, coefficients_bess=coefficients_bess, max_capacity=max_capacity,
+                                   step=step, BESS_duration=BESS_duration, H_block=H_block,
+                                   annualized_cost_value=annualized_cost_value, annualized_CAPEX_component=annualized_CAPEX_component,
+                                   annualized_OPEX_component=annualized_OPEX_component, backend=backend,
+                                   window_form=window_form, solver=solver,
+                                   solver_options={k: v for k, v in (solver_options or {}).items() if k != "threads"},
+                                   backend_options=backend_options, search=search, coarse_step=coarse_step,
+                                   tolerance=tolerance, band=band, equilibrium_options=equilibrium_options)
+
+            # cache (a ScenarioCache) answers a run whose inputs match a finished one from its stored trajectory:
+            # the workbooks and results are restored without solving; the store then only holds the initial prices
+            # and df is left as it was passed in. Entries hold no per-step prices, so excel_export="all" (which writes
+            # them) always solves, and only refreshes the entry
+            if cache is not None:
+                if excel_export == "all":
+                    hit = None
+                    cache.log.append({"key": key, "outcome": "bypass"})
+                else:
+                    hit = cache.get(key)
+                if hit is not None:
+                    saturation_point, cached = hit
+                    print(f" Scenario cache hit ({key}): saturation point {saturation_point} MW, no LP solved")
+                    store.clear()
+                    store.append("prices", 0, df)
+                    if excel_export:
+                        export_workbooks(df, cached, output_dir)
+                    return (saturation_point, cached) if return_results else saturation_point
+                saturation_point, results = run_iterations(df, max_capacity, step, output_dir, BESS_duration, H_block,
+                                                           annualized_cost_value, annualized_CAPEX_component,
+                                                           annualized_OPEX_component, coefficients_bess, backend, window_form,
+                                                           solver, solver_options, backend_options, search, coarse_step,
+                                                           tolerance, band, store_dir, store_format, excel_export,
+                                                           return_results=True, market=market,
+                                                           checkpoint=checkpoint, resume=resume,
+                                                           equilibrium_options=equilibrium_options)
+                cache.put(key, saturation_point, results)
+                return (saturation_point, results) if return_results else saturation_point
+
+            # Typed in-memory results, preallocated for the full ladder; return_results=True hands them back
+            # (as a ResultAccumulator, with .read("hourly") / .read("iterations") DataFrame views) with the saturation point
+            results = ResultAccumulator(max_capacity // step, len(df))
+            optimize = select_backend(backend, window_form, solver, solver_options, backend_options, solve_log)
+
+            # search="adaptive" replaces the fixed `step` march with coarse steps refined near the crossing (to `tolerance` MW)
+            if search == "adaptive":
+                store.clear()
+                return run_adaptive_search(optimize, solve_log, df, max_capacity, step, output_dir, BESS_duration, H_block,
+                                           annualized_cost_value, annualized_CAPEX_component, annualized_OPEX_component,
+                                           coefficients_bess, store, results, excel_export, return_results,
+                                           market, coarse_step, tolerance, band)
+
+            # search="two_tier" dispatches the early steps with the rule-based heuristic and hands over to the LP
+            # once the heuristic's marginal net revenue per MW is within `band` x the annualized cost per MW
+            if search == "two_tier":
+                store.clear()
+                return run_two_tier_search(optimize, solve_log, df, max_capacity, step, output_dir, BESS_duration, H_block,
+                                           annualized_cost_value, annualized_CAPEX_component, annualized_OPEX_component,
+                                           coefficients_bess, store, results, excel_export, return_results, market, band)
+
+            # search="equilibrium" evaluates independent fleet capacities with one price-impact equilibrium solve each,
+            # search="fixed_point" with an accelerated dispatch / update_prices iteration each (see run_equilibrium_search)
+            if search in ("equilibrium", "fixed_point"):
+                store.clear()
+                return run_equilibrium_search(optimize, solve_log, df, max_capacity, step, output_dir, BESS_duration, H_block,
+                                              annualized_cost_value, annualized_CAPEX_component, annualized_OPEX_component,
+                                              coefficients_bess, store, results, excel_export, return_results,
+                                              market, coarse_step, tolerance, window_form,
+                                              "fixed_point" if search == "fixed_point" else "potential", equilibrium_options)
+
+            # checkpoint=True saves the complete loop state to {output_dir}/checkpoint.pkl after every step (off by default:
+            # it pickles the growing prices and results every step); resume=True continues from it (if it belongs to the
+            # same inputs) with the same results as an uninterrupted run
+            checkpoint_path = os.path.join(output_dir, "checkpoint.pkl")
+            loop = load_checkpoint(checkpoint_path, key) if resume else None
+            if loop is not None:
+                state, totals, revenue_debug = loop["state"], loop["totals"], loop["revenue_debug"]
+                total_capacity, saturation_point = loop["total_capacity"], loop["saturation_point"]
+                finished = loop.get("finished", False)  # stopped after saturation before the run was interrupted
+                solve_log.extend(loop["solve_log"])
+                df = state["df"]
+                restore_results(store, results, revenue_debug)
+                print(f" Resuming from checkpoint at {total_capacity} MW ({len(revenue_debug)} step(s) done)")
+            else:
+                store.clear()
+                revenue_debug = []
+                total_capacity = 0
+                totals = accumulate_totals(None, None)
+
+                store.append("prices", 0, df)
+
+                sync_historical_prices(df)
+
+                # Load market volumes
+                with phase("input_load"):
+                    state = new_ladder_state(df, load_market_volumes(market))
+
+                # Initialize holder variables
+                saturation_point = None
+                finished = False
+
+            while not finished and total_capacity + step <= max_capacity:
                 total_capacity += step
+                set_context(iteration=total_capacity)
                 print(f"Iteration {total_capacity}MW")
 
-                # Extract current prices
-                P_DA_t = df["Extrapolated_DAM_Price"]
-                P_imb_t_sur = df["Extrapolated_Imbalance_Surplus_Price"]
-                P_imb_t_short = df["Extrapolated_Imbalance_Shortage_Price"]
-                P_aFRR_up_reserve = df["Extrapolated_aFRR_Up_Price_reserve"]
-                P_aFRR_down_reserve = df["Extrapolated_aFRR_Down_Price_reserve"]
-
-
-                # Run BESS optimization
-                charging_DA, discharging_DA, charging_imb, discharging_imb, charging_aFRR, discharging_aFRR, marginal_DA_revenue, marginal_Imbalance_revenue, marginal_aFRR_reserve_revenue, marginal_total_revenue, marginal_net_revenue, SoC_final = bess_optimization(
-                    P_DA_t, P_imb_t_sur, P_imb_t_short, P_aFRR_up_reserve, P_aFRR_down_reserve,
-                    volume_aFRR_up_reserve, volume_aFRR_down_reserve, volume_imb_surplus, volume_imb_shortage, 
-                    step, annualized_cost_value, BESS_duration, first_run_flag, SoC_previous, 
-                    imbalance_used_surplus, imbalance_used_shortage, aFRR_used_down, aFRR_used_up, H_block
-                )
-
-                # After the first iteration, update the flag so it's False for future iterations
-                first_run_flag = False
-                SoC_previous = SoC_final
-
-                # Extract the **actual** imbalance and AFRR participation
-                imbalance_used_shortage[:] = np.array(discharging_imb[step])  # Energy discharged into the surplus market
-                imbalance_used_surplus[:] = np.array(charging_imb[step])  # Energy charged from the shortage market
-                aFRR_used_down[:] = np.array(charging_aFRR[step])  # Energy charged from the aFRR
-                aFRR_used_up[:] = np.array(discharging_aFRR[step])  # Energy discharged into the aFRR
-
-                # Reduce imbalance/aFRR volumes for the next iteration based on actual BESS participation
-                volume_imb_surplus[:] = np.maximum(volume_imb_surplus - imbalance_used_surplus, 0)
-                volume_imb_shortage[:] = np.maximum(volume_imb_shortage - imbalance_used_shortage, 0)
-                volume_aFRR_up_reserve[:] = np.maximum(volume_aFRR_up_reserve - aFRR_used_up, 0)
-                volume_aFRR_down_reserve[:] = np.maximum(volume_aFRR_down_reserve - aFRR_used_down, 0)
-
-                total_DA_revenue += marginal_DA_revenue
-                total_Imbalance_revenue += marginal_Imbalance_revenue
-                total_aFRR_reserve_revenue += marginal_aFRR_reserve_revenue
-                total_total_revenue += marginal_total_revenue
-                total_net_revenue += marginal_net_revenue
-
-                # Store debug values in a list (to convert to a DataFrame later)
-                revenue_debug.append({
-                    "Step_Size": step,
-                    "Total_Capacity": total_capacity,
-                    "Marginal_DA_Revenue": marginal_DA_revenue,
-                    "Marginal_Imbalance_Revenue": marginal_Imbalance_revenue,
-                    "Marginal_aFRR_Reserve_Revenue": marginal_aFRR_reserve_revenue,
-                    "Marginal_Total_Revenue": marginal_total_revenue,
-                    "Marginal_Net_Revenue": marginal_net_revenue,
-                    "Marginal_CAPEX_Cost": annualized_CAPEX_component * step, 
-                    "Marginal_OPEX_Cost": annualized_OPEX_component * step,
-                    "Cumulative_DA_Revenue": total_DA_revenue,
-                    "Cumulative_Imbalance_Revenue": total_Imbalance_revenue,
-                    "Cumulative_aFRR_Reserve_Revenue": total_aFRR_reserve_revenue,
-                    "Cumulative_Total_Revenue": total_total_revenue,
-                    "Cumulative_Net_Revenue": total_net_revenue
-                })
-                
-                # Convert optimization results to arrays
-                charging_DA_vec = np.array(charging_DA[step])
-                discharging_DA_vec = np.array(discharging_DA[step])
-                charging_imb_vec = np.array(charging_imb[step])
-                discharging_imb_vec = np.array(discharging_imb[step])
-                charging_aFRR_vec = np.array(charging_aFRR[step])
-                discharging_aFRR_vec = np.array(discharging_aFRR[step])
-
-                # Update prices
-                update_prices(df, charging_DA_vec, discharging_DA_vec, charging_imb_vec, discharging_imb_vec, charging_aFRR_vec, discharging_aFRR_vec, 
-                            coef_DAM, coef_imb_short, coef_imb_sur, coef_aFRR_up_reserve, coef_aFRR_down_reserve, step)
-
-                # Save updated prices
-                filename = os.path.join(output_dir, f"updated_prices_capacity_{total_capacity}.xlsx")
-                df.to_excel(filename, index=False)
-                
-                # Append results
-                new_results = pd.DataFrame({
-                    "Total_Capacity": [total_capacity] * len(P_DA_t),
-                    "Time": np.arange(1, len(P_DA_t) + 1),
-                    "Charging_DA": charging_DA_vec,
-                    "Discharging_DA": discharging_DA_vec,
-                    "Charging_Imb": charging_imb_vec,
-                    "Discharging_Imb": discharging_imb_vec,
-                    "Charging_aFRR": charging_aFRR_vec,
-                    "Discharging_aFRR": discharging_aFRR_vec,
-                    "Marginal_DA_Revenue": [marginal_DA_revenue] * len(P_DA_t),
-                    "Marginal_Imbalance_Revenue": [marginal_Imbalance_revenue] * len(P_DA_t),
-                    "Marginal_aFRR_Reserve_Revenue": [marginal_aFRR_reserve_revenue] * len(P_DA_t),
-                    "Marginal_Total_Revenue": [marginal_total_revenue] * len(P_DA_t),
-                    "Marginal_Net_Revenue": [marginal_net_revenue] * len(P_DA_t),
-                    "Cumulative_Total_Revenue": [total_total_revenue] * len(P_DA_t),
-                    "Cumulative_Net_Revenue": [total_net_revenue] * len(P_DA_t),
-                    "DAM_Price": P_DA_t.values,
-                    "Imbalance_Price_Surplus": P_imb_t_sur.values,
-                    "Imbalance_Price_Shortage": P_imb_t_short.values,
-                    "aFRR_Up_Price_reserve": P_aFRR_up_reserve.values,
-                    "aFRR_Down_Price_reserve": P_aFRR_down_reserve.values,
-                    "Marginal_CAPEX_Cost": annualized_CAPEX_component * step, 
-                    "Marginal_OPEX_Cost": annualized_OPEX_component * step,
-                })
-
-                results = pd.concat([results, new_results], ignore_index=True)
-
-                # Save revenue debugging information to Excel
-                revenue_debug_df = pd.DataFrame(revenue_debug)
-                revenue_debug_path = os.path.join(output_dir, "revenue_debug.xlsx")
-                revenue_debug_df.to_excel(revenue_debug_path, index=False)
+                # Run BESS optimization and commit the slice (SoC carry-over, volume depletion, price update)
+                increment = solve_increment(optimize, state, step, annualized_cost_value, BESS_duration, H_block)
+                with phase("update_prices"):
+                    apply_increment(state, increment, coefficients_bess)
+                marginal_net_revenue = increment["Marginal_Net_Revenue"]
+
+                with phase("post_processing"):
+                    totals = accumulate_totals(totals, increment)
+
+                    # Store debug values in a list (to convert to a DataFrame later)
+                    revenue_debug.append(revenue_debug_row(increment, total_capacity, totals, annualized_CAPEX_component,
+                                                           annualized_OPEX_component, solve_log))
+
+                # Append the hourly results, the revenue row and the updated prices of this increment to the store
+                with phase("result_io"):
+                    store_increment(store, results, increment, revenue_debug[-1], df)
 
                 # Update historical prices
-                df["Historical_DAM_Price"] = df["Extrapolated_DAM_Price"]
-                df["Historical_Imbalance_Surplus_Price"] = df["Extrapolated_Imbalance_Surplus_Price"]
-                df["Historical_Imbalance_Shortage_Price"] = df["Extrapolated_Imbalance_Shortage_Price"]
-                df["Historical_aFRR_Up_Price_reserve"] = df["Extrapolated_aFRR_Up_Price_reserve"]
-                df["Historical_aFRR_Down_Price_reserve"] = df["Extrapolated_aFRR_Down_Price_reserve"]
+                sync_historical_prices(df)
 
                 if saturation_point is None and marginal_net_revenue <= 0:
                     saturation_point = total_capacity
                     print(f"\n Saturation point found at {saturation_point} MW")
 
-                if saturation_point is not None and total_capacity >= saturation_point + 400:
+                # The stop check comes before the checkpoint, so a resume after the last step does not solve another one
+                finished = saturation_point is not None and total_capacity >= saturation_point + 400
+                if finished:
                     print(f" Reached limit after saturation: {total_capacity} MW")
-                    break
-
-            for i in range(1, len(revenue_debug)):
-                prev = revenue_debug[i - 1]
-                curr = revenue_debug[i]
-                if prev["Marginal_Net_Revenue"] > 0 and curr["Marginal_Net_Revenue"] <= 0:
-                    cap1, rev1 = prev["Total_Capacity"], prev["Marginal_Net_Revenue"]
-                    cap2, rev2 = curr["Total_Capacity"], curr["Marginal_Net_Revenue"]
-                    # Linear interpolation
-                    saturation_point = cap1 + (0 - rev1) * (cap2 - cap1) / (rev2 - rev1)
-
-                    print(f"\n Financial saturation point (marginal net revenue = 0) reached at: {saturation_point:.2f} MW")
-                    break
-
-
-            final_results_path = os.path.join(output_dir, "final_results1.xlsx")
-            results.to_excel(final_results_path, index=False)
 
+                if checkpoint:
+                    with phase("result_io"):
+                        save_checkpoint(checkpoint_path, {"key": key, "state": state, "totals": totals, "revenue_debug": revenue_debug,
+                                                          "total_capacity": total_capacity, "saturation_point": saturation_point,
+                                                          "finished": finished, "solve_log": solve_log})
+
+            crossing = interpolate_saturation(revenue_debug)
+            if crossing is not None:
+                saturation_point = crossing
+                print(f"\n Financial saturation point (marginal net revenue = 0) reached at: {saturation_point:.2f} MW")
+            print(f" LP solves: {lp_solves(solve_log)}" + (f", MIP solves: {mip_solves(solve_log)}" if mip_solves(solve_log) else ""))
+            exclusivity_summary(revenue_debug)
+
+            set_context(iteration=None)
+            if excel_export:
+                with phase("result_io"):
+                    export_excel(store, output_dir, prices=excel_export == "all", results=results)
+
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)  # the run is complete
+
+            return (saturation_point, results) if return_results else saturation_point
+
+
+def run_adaptive_search(optimize, solve_log, df, max_capacity, step, output_dir, BESS_duration, H_block,
+                        annualized_cost_value, annualized_CAPEX_component, annualized_OPEX_component, coefficients_bess,
+                        store, results, excel_export=True, return_results=False, market=None,
+                        coarse_step=None, tolerance=None, band=1.0):
+
+    # Adaptive alternative to the fixed `step` march:
+    #   - while the marginal net revenue per MW is clearly positive (above `band` x the annualized cost per MW),
+    #     slices of up to `coarse_step` MW are added, sized to half the secant estimate of the distance to the crossing
+    #   - closer to the crossing the regular `step` is used, so the ladder near saturation matches the fixed march
+    #   - a slice that turns non-positive is rejected and retried at half the size until it is at most `tolerance` MW
+    # The search stops as soon as the crossing is bracketed. A coarse slice is dispatched as one battery, which
+    # depresses prices less than the same capacity added step by step, so keep coarse_step moderate (default 2 x step).
+    coarse_step = coarse_step or 2 * step
+    tolerance = tolerance or step
+    round_down = lambda mw, unit: max(unit, unit * int(mw // unit))
+
+    revenue_debug = []
+    total_capacity = 0
+    totals = accumulate_totals(None, None)
+    saturation_point = None
+
+    store.append("prices", 0, df)
+    sync_historical_prices(df)
+    with phase("input_load"):
+        state = new_ladder_state(df, load_market_volumes(market))
+
+    capacity_step = coarse_step
+    while total_capacity + tolerance <= max_capacity:
+        capacity_step = min(capacity_step, round_down(max_capacity - total_capacity, tolerance))
+        set_context(iteration=total_capacity + capacity_step)
+        print(f"Iteration {total_capacity + capacity_step}MW (step {capacity_step}MW)")
+        increment = solve_increment(optimize, state, capacity_step, annualized_cost_value, BESS_duration, H_block)
+        per_mw = increment["Marginal_Net_Revenue"] / capacity_step
+
+        if per_mw <= 0 and capacity_step > tolerance:
+            # Overshot the crossing: retry with the regular step, then bisect below it
+            capacity_step = step if capacity_step > step else round_down(capacity_step / 2, tolerance)
+            continue
+
+        with phase("update_prices"):
+            apply_increment(state, increment, coefficients_bess)
+        total_capacity += capacity_step
+        with phase("post_processing"):
+            totals = accumulate_totals(totals, increment)
+            revenue_debug.append(revenue_debug_row(increment, total_capacity, totals, annualized_CAPEX_component,
+                                                   annualized_OPEX_component, solve_log))
+        with phase("result_io"):
+            store_increment(store, results, increment, revenue_debug[-1], df)
+        sync_historical_prices(df)
+
+        if per_mw <= 0:
+            saturation_point = total_capacity
+            print(f"\n Saturation point bracketed at {saturation_point} MW")
+            break
+
+        capacity_step = step
+        if per_mw > band * annualized_cost_value:
+            capacity_step = coarse_step
+            if len(revenue_debug) >= 2:
+                # Secant estimate of the remaining distance to the crossing from the last two slices
+                prev, curr = revenue_debug[-2], revenue_debug[-1]
+                slope = (per_mw - prev["Marginal_Net_Revenue"] / prev["Step_Size"]) / (curr["Total_Capacity"] - prev["Total_Capacity"])
+                if slope < 0:
+                    capacity_step = min(coarse_step, round_down(-per_mw / slope / 2, step))
+
+    crossing = interpolate_saturation(revenue_debug, per_mw=True)
+    if crossing is not None:
+        saturation_point = crossing
+        print(f"\n Financial saturation point (marginal net revenue = 0) reached at: {saturation_point:.2f} MW")
+    print(f" LP solves: {lp_solves(solve_log)} (adaptive search)")
+    exclusivity_summary(revenue_debug)
+
+    set_context(iteration=None)
+    if excel_export:
+        with phase("result_io"):
+            export_excel(store, output_dir, prices=excel_export == "all", results=results)
+
+    return (saturation_point, results) if return_results else saturation_point
+
+
+def run_two_tier_search(optimize, solve_log, df, max_capacity, step, output_dir, BESS_duration, H_block,
+                        annualized_cost_value, annualized_CAPEX_component, annualized_OPEX_component, coefficients_bess,
+                        store, results, excel_export=True, return_results=False, market=None, band=1.0):
+
+    # The fixed `step` march in two tiers: steps are dispatched by heuristic_dispatch (no solver) while its marginal
+    # net revenue per MW is above `band` x the annualized cost per MW, and by the backend LP from the first step that
+    # is not. The heuristic's dispatch is feasible for the LP, so it never earns more than the LP on the same state and
+    # the hand-over comes early rather than late. The heuristic also dispatches less than the LP, so its steps lower
+    # the prices and deplete the volumes less and the LP tier starts from a richer market than the fixed march: the
+    # crossing comes later, by more the more heuristic steps there are (a smaller band).
+    # Every LP step is also dispatched by the heuristic: Heuristic_Net_Revenue and Heuristic_Error (heuristic - LP)
+    # are logged per step to tune `band`; the heuristic rows carry their estimate only.
+    from heuristic_dispatch import bess_optimization_heuristic
+    heuristic_log = []
+    heuristic = partial(bess_optimization_heuristic, solve_log=heuristic_log, arrays=True)
+
+    revenue_debug = []
+    total_capacity = 0
+    totals = accumulate_totals(None, None)
+    saturation_point = None
+    tier = "heuristic"
+
+    store.append("prices", 0, df)
+    sync_historical_prices(df)
+    with phase("input_load"):
+        state = new_ladder_state(df, load_market_volumes(market))
+
+    while total_capacity + step <= max_capacity:
+        total_capacity += step
+        set_context(iteration=total_capacity)
+        print(f"Iteration {total_capacity}MW ({tier})")
+        estimate = solve_increment(heuristic, state, step, annualized_cost_value, BESS_duration, H_block)
+        if tier == "heuristic" and estimate["Marginal_Net_Revenue"] / step <= band * annualized_cost_value:
+            tier = "lp"
+            print(f" Heuristic margin within the band at {total_capacity}MW, switching to the LP")
+        increment = estimate if tier == "heuristic" else solve_increment(optimize, state, step, annualized_cost_value,
+                                                                         BESS_duration, H_block)
+        with phase("update_prices"):
+            apply_increment(state, increment, coefficients_bess)
+        with phase("post_processing"):
+            totals = accumulate_totals(totals, increment)
+            row = revenue_debug_row(increment, total_capacity, totals, annualized_CAPEX_component, annualized_OPEX_component,
+                                    solve_log if tier == "lp" else heuristic_log)
+            row["LP_Solves"], row["MIP_Solves"] = lp_solves(solve_log), mip_solves(solve_log)
+            row["Tier"] = tier
+            row["Heuristic_Net_Revenue"] = estimate["Marginal_Net_Revenue"]
+            row["Heuristic_Error"] = estimate["Marginal_Net_Revenue"] - increment["Marginal_Net_Revenue"] if tier == "lp" else None
+            revenue_debug.append(row)
+        with phase("result_io"):
+            store_increment(store, results, increment, revenue_debug[-1], df)
+        sync_historical_prices(df)
+
+        if saturation_point is None and increment["Marginal_Net_Revenue"] <= 0:
+            saturation_point = total_capacity
+            print(f"\n Saturation point found at {saturation_point} MW")
+        if saturation_point is not None and total_capacity >= saturation_point + 400:
+            print(f" Reached limit after saturation: {total_capacity} MW")
+            break
+
+    crossing = interpolate_saturation(revenue_debug)
+    if crossing is not None:
+        saturation_point = crossing
+        print(f"\n Financial saturation point (marginal net revenue = 0) reached at: {saturation_point:.2f} MW")
+    errors = [row["Heuristic_Error"] for row in revenue_debug if row["Tier"] == "lp"]
+    print(f" LP solves: {lp_solves(solve_log)}, heuristic steps: {len(revenue_debug) - len(errors)} (two-tier search)")
+    if errors:
+        print(f" Heuristic error over the {len(errors)} LP steps: mean {np.mean(errors):+,.0f}, largest {min(errors):+,.0f} "
+              f"per {step}MW step (band: {band * annualized_cost_value * step:,.0f})")
+    exclusivity_summary(revenue_debug)
+
+    set_context(iteration=None)
+    if excel_export:
+        with phase("result_io"):
+            export_excel(store, output_dir, prices=excel_export == "all", results=results)
+
+    return (saturation_point, results) if return_results else saturation_point
+
+
+def equilibrium_state(df, market_volumes, fleet, coefficients_bess):
+    # What a new slice sees next to a fleet in equilibrium: the prices moved by the fleet's whole dispatch
+    # (run3_updatePrices) and the market volumes it leaves
+    prices = df.copy()
+    update_prices(prices, fleet["e_DA_t_minus"], fleet["e_DA_t_plus"], fleet["e_imb_minus"], fleet["e_imb_plus"],
+                  fleet["e_aFRR_down"], fleet["e_aFRR_up"],
+                  coefficients_bess["Day-Ahead Market"], coefficients_bess["Imbalance Shortage"], coefficients_bess["Imbalance Surplus"],
+                  coefficients_bess["aFRR Up Contracted"], coefficients_bess["aFRR Down Contracted"], None)
+    volumes = {
+        "aFRR_up": np.maximum(market_volumes["aFRR_up"] - fleet["e_aFRR_up"], 0),
+        "aFRR_down": np.maximum(market_volumes["aFRR_down"] - fleet["e_aFRR_down"], 0),
+        "imb_surplus": np.maximum(market_volumes["imb_surplus"] - fleet["e_imb_minus"], 0),
+        "imb_shortage": np.maximum(market_volumes["imb_shortage"] - fleet["e_imb_plus"], 0),
+    }
+    revenues = {
+        "DA_Revenue": prices["Extrapolated_DAM_Price"].values @ (fleet["e_DA_t_plus"] - fleet["e_DA_t_minus"]),
+        "Imbalance_Revenue": (prices["Extrapolated_Imbalance_Shortage_Price"].values @ fleet["e_imb_plus"]
+                              - prices["Extrapolated_Imbalance_Surplus_Price"].values @ fleet["e_imb_minus"]),
+        "aFRR_Reserve_Revenue": (prices["Extrapolated_aFRR_Up_Price_reserve"].values @ fleet["e_aFRR_up"]
+                                 + prices["Extrapolated_aFRR_Down_Price_reserve"].values @ fleet["e_aFRR_down"]),
+    }
+    return new_ladder_state(prices, volumes), revenues
+
+
+def run_equilibrium_search(optimize, solve_log, df, max_capacity, step, output_dir, BESS_duration, H_block,
+                           annualized_cost_value, annualized_CAPEX_component, annualized_OPEX_component, coefficients_bess,
+                           store, results, excel_export=True, return_results=False, market=None,
+                           coarse_step=None, tolerance=None, window_form="explicit", method="potential",
+                           equilibrium_options=None):
+
+    # Saturation search without the serial ladder: at a fleet capacity C the fleet dispatch and its prices come from
+    # one equilibrium solve, and the marginal slice is the usual `step` MW LP against those prices and the volumes
+    # the fleet leaves, so every row has the meaning of a ladder row at C + step. The capacities are
+    # independent: C is scanned every `coarse_step` MW (default 5 x step) until the marginal net revenue turns
+    # non-positive, then the bracket is bisected on the step grid down to `tolerance` MW (default step).
+    # Unlike the ladder, the fleet re-optimizes as a whole at every C instead of freezing earlier slices, and the volume
+    # caps are the market volumes minus the fleet's use; the rows differ from a ladder's by that much.
+    # method "potential" solves the equilibrium as one concave program (price_impact_equilibrium.fleet_equilibrium,
+    # equilibrium_options: segments); "fixed_point" iterates the fleet's LP and update_prices until the prices
+    # settle (fixed_point_equilibrium.fleet_fixed_point, equilibrium_options: tolerance, gap_tolerance, max_iterations,
+    # acceleration, memory) and adds the iteration count and final price residual to every row
+    if method == "fixed_point":
+        from fixed_point_equilibrium import fleet_fixed_point
+        solve_fleet = lambda fleet_capacity: fleet_fixed_point(df, market_volumes, fleet_capacity, coefficients_bess, BESS_duration,
+                                                               H_block, window_form=window_form, solve_log=solve_log,
+                                                               **(equilibrium_options or {}))
+    elif method == "potential":
+        from price_impact_equilibrium import fleet_equilibrium
+        solve_fleet = lambda fleet_capacity: (fleet_equilibrium(
+            df["Extrapolated_DAM_Price"], df["Extrapolated_Imbalance_Surplus_Price"], df["Extrapolated_Imbalance_Shortage_Price"],
+            df["Extrapolated_aFRR_Up_Price_reserve"], df["Extrapolated_aFRR_Down_Price_reserve"],
+            market_volumes["aFRR_up"], market_volumes["aFRR_down"], market_volumes["imb_surplus"], market_volumes["imb_shortage"],
+            fleet_capacity, coefficients_bess, BESS_duration, H_block, window_form=window_form, solve_log=solve_log,
+            **(equilibrium_options or {})), {})
+    else:
+        raise ValueError(f"Unknown equilibrium method '{method}', expected 'potential' or 'fixed_point'")
+
+    coarse_step = coarse_step or 5 * step
+    tolerance = tolerance or step
+    round_step = lambda mw: step * int(round(mw / step))
+
+    store.append("prices", 0, df)
+    sync_historical_prices(df)
+    with phase("input_load"):
+        market_volumes = load_market_volumes(market)
+    evaluated = {}  # fleet capacity -> (increment, revenue_debug row, prices)
+    fleet_solves = [0]
+
+    def evaluate(fleet_capacity):
+        total_capacity = fleet_capacity + step
+        set_context(iteration=total_capacity)
+        print(f"Iteration {total_capacity}MW (fleet equilibrium at {fleet_capacity}MW + {step}MW slice)")
+        fleet_info = {}
+        if fleet_capacity == 0:
+            state = new_ladder_state(df.copy(), {name: values.copy() for name, values in market_volumes.items()})
+            fleet_revenues = {"DA_Revenue": 0.0, "Imbalance_Revenue": 0.0, "aFRR_Reserve_Revenue": 0.0}
+        else:
+            solves_before = len(solve_log)
+            fleet, fleet_info = solve_fleet(fleet_capacity)
+            fleet_solves[0] += len(solve_log) - solves_before
+            with phase("update_prices"):
+                state, fleet_revenues = equilibrium_state(df, market_volumes, fleet, coefficients_bess)
+        increment = solve_increment(optimize, state, step, annualized_cost_value, BESS_duration, H_block)
+
+        # Cumulative columns: the fleet's revenue at the equilibrium prices plus the marginal slice
+        with phase("post_processing"):
+            fleet_revenues["Total_Revenue"] = sum(fleet_revenues.values())
+            fleet_revenues["Net_Revenue"] = fleet_revenues["Total_Revenue"] - annualized_cost_value * fleet_capacity
+            totals = {f"Cumulative_{name}": float(value + increment[f"Marginal_{name}"]) for name, value in fleet_revenues.items()}
+            row = revenue_debug_row(increment, total_capacity, totals, annualized_CAPEX_component, annualized_OPEX_component, solve_log)
+            row.update(fleet_info)
+        evaluated[fleet_capacity] = (increment, row, state["df"])
+        return increment["Marginal_Net_Revenue"]
+
+    # Scan, then bisect between the last positive (low) and first non-positive (high) fleet capacity
+    low = high = None
+    scan = list(range(0, max_capacity - step + 1, coarse_step))
+    if scan and scan[-1] != max_capacity - step:
+        scan.append(max_capacity - step)
+    for fleet_capacity in scan:
+        if evaluate(fleet_capacity) <= 0:
+            high = fleet_capacity
+            break
+        low = fleet_capacity
+    while low is not None and high is not None and high - low > tolerance:
+        middle = round_step((low + high) / 2)
+        if middle <= low or middle >= high:
+            break
+        if evaluate(middle) <= 0:
+            high = middle
+        else:
+            low = middle
+
+    revenue_debug = []
+    with phase("result_io"):
+        for fleet_capacity in sorted(evaluated):
+            increment, row, prices = evaluated[fleet_capacity]
+            revenue_debug.append(row)
+            store_increment(store, results, increment, row, prices)
+
+    saturation_point = None if high is None else high + step
+    crossing = interpolate_saturation(revenue_debug)
+    if crossing is not None:
+        saturation_point = crossing
+        print(f"\n Financial saturation point (marginal net revenue = 0) reached at: {saturation_point:.2f} MW")
+    print(f" Fleet equilibrium solves: {fleet_solves[0]}, slice LP solves: {len(solve_log) - fleet_solves[0]} "
+          f"(equilibrium search, {method})")
+
+    set_context(iteration=None)
+    if excel_export:
+        with phase("result_io"):
+            export_excel(store, output_dir, prices=excel_export == "all", results=results)
+
+    return (saturation_point, results) if return_results else saturation_point
+
+
+def derive_cost_case(results, trajectory_store, output_dir, annualized_cost_value, annualized_CAPEX_component,
+                     annualized_OPEX_component, store_format=None, excel_export=True):
+    # Dispatch, price updates and gross revenues of a fixed-step ladder do not depend on CAPEX/OPEX: the annualized
+    # cost is only subtracted after each solve. This re-prices a solved trajectory (the ResultAccumulator of
+    # run_iterations(..., return_results=True), run with the lowest cost so it reaches the latest stop) for another
+    # cost case: net revenues, saturation point and the fixed ladder's stopping rule (400 MW past saturation)
+    # are recomputed and the case's workbooks written, without solving anything.
+    # Hourly results and prices stay in the trajectory's store; the case's own store holds its iterations table.
+    iterations = results.read("iterations")
+    net = (iterations["Marginal_Total_Revenue"] - iterations["Step_Size"] * annualized_cost_value).values
+
+    keep = len(iterations)
+    saturated = np.flatnonzero(net <= 0)
+    if len(saturated):
+        saturation_capacity = iterations["Total_Capacity"].iloc[saturated[0]]
+        beyond = np.flatnonzero(iterations["Total_Capacity"].values >= saturation_capacity + 400)
+        if len(beyond):
+            keep = beyond[0] + 1
+
+    iterations = iterations.iloc[:keep].copy()
+    iterations["Marginal_Net_Revenue"] = net[:keep]
+    iterations["Marginal_CAPEX_Cost"] = annualized_CAPEX_component * iterations["Step_Size"]
+    iterations["Marginal_OPEX_Cost"] = annualized_OPEX_component * iterations["Step_Size"]
+    iterations["Cumulative_Net_Revenue"] = np.cumsum(net[:keep])
+
+    os.makedirs(output_dir, exist_ok=True)
+    store = ResultsStore(output_dir, os.path.basename(os.path.normpath(output_dir)), store_format)
+    store.clear()
+    for row in iterations.to_dict("records"):
+        store.append("iterations", row["Total_Capacity"], [row])
+
+    saturation_point = interpolate_saturation(iterations.to_dict("records"))
+    if saturation_point is None and len(saturated):
+        saturation_point = iterations["Total_Capacity"].iloc[saturated[0]].item()
+
+    if excel_export:
+        capacities = iterations["Total_Capacity"].tolist()
+        hourly = results.read("hourly")
+        write_excel(trajectory_store.read("prices", 0), os.path.join(output_dir, "initial_extrapolated_prices.xlsx"))
+        write_excel(iterations, os.path.join(output_dir, "revenue_debug.xlsx"))
+        write_excel(final_results_frame(hourly[hourly["Total_Capacity"].isin(capacities)], iterations),
+                    os.path.join(output_dir, "final_results1.xlsx"))
+        if excel_export == "all":
+            missing = sorted(set(capacities) - set(trajectory_store.capacities("prices")))
+            if missing:
+                raise ValueError(f"The trajectory store has no prices for {missing} MW: run the trajectory with "
+                                 f"excel_export='all' as well (cached trajectories keep only the initial prices)")
+            for capacity in capacities:
+                write_excel(trajectory_store.read("prices", capacity), os.path.join(output_dir, f"updated_prices_capacity_{capacity}.xlsx"))
+
+    return saturation_point
 
-            return saturation_point
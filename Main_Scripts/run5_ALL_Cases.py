@@ -1,115 +1,355 @@
 import os
-import numpy_financial as npf 
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
+import argparse
 import itertools
-from run1_extrapolation import load_initial_prices
-from run5_Plotting import plot_revenues, plot_aggregate_revenue_contributions
-from coef_DA import bess_coefficients_DA
-from coef_imb_short import bess_coefficients_imb_short
-from coef_imb_surplus import bess_coefficients_imb_surplus
-from coef_aFRR_up import bess_coefficients_aFRR_up
-from coef_aFRR_down import bess_coefficients_aFRR_down
-from res_coeff_DA import res_coefficients_DA
-from res_coeff_imb_short import res_coefficients_imb_short
-from res_coeff_imb_sur import res_coefficients_imb_surplus
-from res_coef_aFRR_up import res_coefficients_aFRR_up
-from res_coef_aFRR_down import res_coefficients_aFRR_down
-from RES_iterations import run_iterations
-
-def main():
-    total_demand_current = 125_000_000
-    growth_rate = 0.03
-    lifetime = 20
-    discount_rate = 0.06
-    BESS_duration = 4
-    H_block = 4
-
-    # Load static coefficients
-    coefficients_bess = {
-        "Day-Ahead Market": bess_coefficients_DA("bess_price_data.xlsx"),
-        "Imbalance Shortage": bess_coefficients_imb_short("bess_price_data.xlsx"),
-        "Imbalance Surplus": bess_coefficients_imb_surplus("bess_price_data.xlsx"),
-        "aFRR Up Contracted": bess_coefficients_aFRR_up("bess_price_data.xlsx"),
-        "aFRR Down Contracted": bess_coefficients_aFRR_down("bess_price_data.xlsx"),
-    }
+from functools import partial
 
-    coefficients_res = {
-        "Day-Ahead Market": res_coefficients_DA("bess_price_data.xlsx"),
-        "Imbalance Shortage": res_coefficients_imb_short("bess_price_data.xlsx"),
-        "Imbalance Surplus": res_coefficients_imb_surplus("bess_price_data.xlsx"),
-        "aFRR Up Contracted": res_coefficients_aFRR_up("bess_price_data.xlsx"),
-        "aFRR Down Contracted": res_coefficients_aFRR_down("bess_price_data.xlsx"),
-    }
+# Heavy libraries are imported inside the phase that needs them (fitting, solving, plotting),
+# so `--dry-run` and a bare import of this module stay fast.
 
-    # Define all combinations
-    RES_list = [0.7] # 3 cases of RES share
-    CAPEX_list = [500_000] # 2 cases of CAPEX 
-    OPEX_list = [30_000] # 3 cases of OPEX, current, with grid costs contract, without grid costs
+total_demand_current = 125_000_000
+growth_rate = 0.03
+lifetime = 20
+discount_rate = 0.06
+BESS_duration = 4
+H_block = 4
+max_capacity = 15000
+step = 100
 
-    full_grid = list(itertools.product(CAPEX_list, OPEX_list, RES_list))
+# Define all combinations
+RES_list = [0.7] # 3 cases of RES share
+CAPEX_list = [500_000] # 2 cases of CAPEX
+OPEX_list = [30_000] # 3 cases of OPEX, current, with grid costs contract, without grid costs
 
-    saturation_summary_rows = []
 
+def annualized_capex(CAPEX):
+    # CAPEX spread over the lifetime at the discount rate (capital recovery factor)
+    return (discount_rate * (1 + discount_rate) ** lifetime) / ((1 + discount_rate) ** lifetime - 1) * CAPEX
+
+
+def scenario_grid():
+    # One entry per case with everything derived from (CAPEX, OPEX, RES share); no data is read
+    full_grid = list(itertools.product(CAPEX_list, OPEX_list, RES_list))
+
+    cases = []
     for idx, (CAPEX, OPEX, RES_share) in enumerate(full_grid, start=1):
         t = {0.5: 0, 0.7: 6, 0.9: 16}[RES_share]  # map RES share to time horizon
-        output_dir = f"results_case_{idx:03d}"
 
-        annualized_CAPEX_component = (discount_rate * (1 + discount_rate) ** lifetime) / ((1 + discount_rate) ** lifetime - 1) * CAPEX
+        annualized_CAPEX_component = annualized_capex(CAPEX)
         annualized_OPEX_component = OPEX
-        annualized_cost_value = annualized_CAPEX_component + annualized_OPEX_component
 
         total_demand_future = total_demand_current * (1 + growth_rate) ** t
-        RES_current = total_demand_current * 0.5
-        RES_future = total_demand_future * RES_share
 
+        # Derive symbolic labels
+        res_symbol = {0.5: "A1", 0.7: "A2", 0.9: "A3"}[RES_share]
+        capex_symbol = {900_000: "B1", 700_000: "B2", 500_000: "B3"}[CAPEX]
+        opex_symbol = {130_000: "C1", 80_000: "C2", 30_000: "C3"}[OPEX]
+
+        cases.append({
+            "idx": idx,
+            "CAPEX": CAPEX,
+            "OPEX": OPEX,
+            "RES_share": RES_share,
+            "t": t,
+            "output_dir": f"results_case_{idx:03d}",
+            "combination": f"{res_symbol} - {capex_symbol} - {opex_symbol}",
+            "annualized_CAPEX_component": annualized_CAPEX_component,
+            "annualized_OPEX_component": annualized_OPEX_component,
+            "annualized_cost_value": annualized_CAPEX_component + annualized_OPEX_component,
+            "total_demand_future": total_demand_future,
+            "RES_current": total_demand_current * 0.5,
+            "RES_future": total_demand_future * RES_share,
+        })
+    return cases
+
+
+def print_plan(cases, workers=1, shared_trajectory=False):
+    # The ladder stops 400 MW past saturation, so max_capacity / step is an upper bound on LP solves per case
+    # (per RES level with a shared trajectory)
+    max_solves = max_capacity // step
+    print(f"{len(cases)} case(s) on {min(workers, len(cases))} worker(s), capacity ladder {step}-{max_capacity} MW in {step} MW steps")
+    for case in cases:
+        print(f"  Case {case['idx']:03d}  {case['combination']}  CAPEX={case['CAPEX']}  OPEX={case['OPEX']}  "
+              f"RES={case['RES_share']}  t={case['t']}  annualized cost={case['annualized_cost_value']:,.0f} €/MW  → {case['output_dir']}")
+    if shared_trajectory:
+        ladders = len(res_groups(cases))
+        print(f"Estimated LP solves: at most {max_solves} per RES level, {max_solves * ladders} in total "
+              f"({ladders} trajectory ladder(s), {len(cases) - ladders} case(s) re-priced without solving)")
+    else:
+        print(f"Estimated LP solves: at most {max_solves} per case, {max_solves * len(cases)} in total")
+
+
+def load_coefficients(file_path="bess_price_data.xlsx"):
+    # Fitting phase: all ten regressions come from one cached pass over the workbook
+    from coef_DA import bess_coefficients_DA
+    from coef_imb_short import bess_coefficients_imb_short
+    from coef_imb_surplus import bess_coefficients_imb_surplus
+    from coef_aFRR_up import bess_coefficients_aFRR_up
+    from coef_aFRR_down import bess_coefficients_aFRR_down
+    from res_coeff_DA import res_coefficients_DA
+    from res_coeff_imb_short import res_coefficients_imb_short
+    from res_coeff_imb_sur import res_coefficients_imb_surplus
+    from res_coef_aFRR_up import res_coefficients_aFRR_up
+    from res_coef_aFRR_down import res_coefficients_aFRR_down
+
+    coefficients_bess = {
+        "Day-Ahead Market": bess_coefficients_DA(file_path),
+        "Imbalance Shortage": bess_coefficients_imb_short(file_path),
+        "Imbalance Surplus": bess_coefficients_imb_surplus(file_path),
+        "aFRR Up Contracted": bess_coefficients_aFRR_up(file_path),
+        "aFRR Down Contracted": bess_coefficients_aFRR_down(file_path),
+    }
+
+    coefficients_res = {
+        "Day-Ahead Market": res_coefficients_DA(file_path),
+        "Imbalance Shortage": res_coefficients_imb_short(file_path),
+        "Imbalance Surplus": res_coefficients_imb_surplus(file_path),
+        "aFRR Up Contracted": res_coefficients_aFRR_up(file_path),
+        "aFRR Down Contracted": res_coefficients_aFRR_down(file_path),
+    }
+    return coefficients_bess, coefficients_res
+
+
+def plot_case(case):
+    from run6_Plotting import plot_revenues, plot_aggregate_revenue_contributions
+    from instrumentation import phase
+
+    results_path = os.path.join(case["output_dir"], "final_results1.xlsx")
+    label = f"Case {case['idx']:03d} — RES {int(case['RES_share']*100)}%"
+    with phase("plotting"):
+        plot_revenues(results_path, label)
+        plot_aggregate_revenue_contributions(results_path, label)
+
+
+def start_profile(case, profile):
+    # --profile: phase timings and RSS of this case as JSON lines in {output_dir}/phases.jsonl
+    import instrumentation
+
+    instrumentation.stop()
+    if profile:
+        os.makedirs(case["output_dir"], exist_ok=True)
+        instrumentation.start(os.path.join(case["output_dir"], "phases.jsonl"), case=case["idx"])
+
+
+def run_case(case, threads, coefficients_bess, coefficients_res, market=None, cache=None, checkpoint=False, resume=False,
+             profile=False):
+    # One case of the sweep: extrapolated prices, capacity ladder and plots, written to the case's output_dir.
+    # threads caps the solver's threads when cases run side by side (None: solver default).
+    # Returns {"saturation_point", "cache": "hit" | "miss" | "off"}; a cache hit restores the ladder without solving
+    from run1_extrapolation import load_initial_prices
+    from run4_RES_iterations import run_iterations
+    from instrumentation import phase
+
+    idx = case["idx"]
+    output_dir = case["output_dir"]
+    start_profile(case, profile)
+
+    with phase("input_load"):
         df = load_initial_prices(
-            RES_current, RES_future,
-            total_demand_current, total_demand_future,
+            case["RES_current"], case["RES_future"],
+            total_demand_current, case["total_demand_future"],
             coefficients_res["Day-Ahead Market"],
             coefficients_res["Imbalance Shortage"],
             coefficients_res["Imbalance Surplus"],
             coefficients_res["aFRR Up Contracted"],
-            coefficients_res["aFRR Down Contracted"]
+            coefficients_res["aFRR Down Contracted"],
+            market=market
         )
 
-        print(f"\n Running case {idx:03d} — CAPEX={CAPEX}, OPEX={OPEX}, RES={RES_share}, t={t} → {output_dir}")
-        saturation_point = run_iterations(
-            df=df,
-            max_capacity=15000,
-            step=100,
-            output_dir=output_dir,
-            BESS_duration=BESS_duration,
-            H_block=H_block,
-            annualized_cost_value=annualized_cost_value,
-            annualized_CAPEX_component=annualized_CAPEX_component,
-            annualized_OPEX_component=annualized_OPEX_component,
-            coefficients_bess=coefficients_bess
+    print(f"\n Running case {idx:03d} — CAPEX={case['CAPEX']}, OPEX={case['OPEX']}, RES={case['RES_share']}, t={case['t']} → {output_dir}")
+    saturation_point = run_iterations(
+        df=df,
+        max_capacity=max_capacity,
+        step=step,
+        output_dir=output_dir,
+        BESS_duration=BESS_duration,
+        H_block=H_block,
+        annualized_cost_value=case["annualized_cost_value"],
+        annualized_CAPEX_component=case["annualized_CAPEX_component"],
+        annualized_OPEX_component=case["annualized_OPEX_component"],
+        coefficients_bess=coefficients_bess,
+        solver_options=None if threads is None else {"threads": threads},
+        market=market,
+        cache=cache,
+        checkpoint=checkpoint or resume,  # a resumed case keeps checkpointing, so it can be resumed again
+        resume=resume
+    )
+
+    plot_case(case)
+
+    return {"saturation_point": saturation_point, "cache": cache_outcome(cache)}
+
+
+def cache_outcome(cache):
+    return "off" if cache is None else cache.log[-1]["outcome"]
+
+
+def res_groups(cases):
+    # Cases that share a RES level share prices, volumes and therefore the whole dispatch trajectory; the cheapest
+    # case saturates last, so its ladder covers every other case of the group. One sweep job per RES level.
+    groups = {}
+    for case in cases:
+        groups.setdefault(case["RES_share"], []).append(case)
+    jobs = []
+    for members in groups.values():
+        members = sorted(members, key=lambda case: case["annualized_cost_value"])
+        jobs.append({"idx": members[0]["idx"], "output_dir": members[0]["output_dir"], "cases": members})
+    return jobs
+
+
+def run_res_group(job, threads, coefficients_bess, coefficients_res, market=None, cache=None, checkpoint=False, resume=False,
+                  profile=False):
+    # One RES level: the cheapest case is solved as usual and the other CAPEX/OPEX cases are re-priced from its
+    # trajectory (identical results to solving them separately). Returns {case idx: run_case-style result}.
+    from run1_extrapolation import load_initial_prices
+    from run4_RES_iterations import run_iterations, derive_cost_case
+    from results_store import ResultsStore
+    from instrumentation import phase, set_context
+
+    trajectory, *others = job["cases"]
+    start_profile(trajectory, profile)
+
+    with phase("input_load"):
+        df = load_initial_prices(
+            trajectory["RES_current"], trajectory["RES_future"],
+            total_demand_current, trajectory["total_demand_future"],
+            coefficients_res["Day-Ahead Market"],
+            coefficients_res["Imbalance Shortage"],
+            coefficients_res["Imbalance Surplus"],
+            coefficients_res["aFRR Up Contracted"],
+            coefficients_res["aFRR Down Contracted"],
+            market=market
         )
 
-        # Derive symbolic labels
-        res_symbol = {0.5: "A1", 0.7: "A2", 0.9: "A3"}[RES_share]
-        capex_symbol = {900_000: "B1", 700_000: "B2", 500_000: "B3"}[CAPEX]
-        opex_symbol = {130_000: "C1", 80_000: "C2", 30_000: "C3"}[OPEX]
-        combo_str = f"{res_symbol} - {capex_symbol} - {opex_symbol}"
+    print(f"\n Running case {trajectory['idx']:03d} — CAPEX={trajectory['CAPEX']}, OPEX={trajectory['OPEX']}, RES={trajectory['RES_share']}, "
+          f"t={trajectory['t']} → {trajectory['output_dir']} (trajectory for {len(others)} other case(s))")
+    saturation_point, results = run_iterations(
+        df=df,
+        max_capacity=max_capacity,
+        step=step,
+        output_dir=trajectory["output_dir"],
+        BESS_duration=BESS_duration,
+        H_block=H_block,
+        annualized_cost_value=trajectory["annualized_cost_value"],
+        annualized_CAPEX_component=trajectory["annualized_CAPEX_component"],
+        annualized_OPEX_component=trajectory["annualized_OPEX_component"],
+        coefficients_bess=coefficients_bess,
+        solver_options=None if threads is None else {"threads": threads},
+        return_results=True,
+        market=market,
+        cache=cache,
+        checkpoint=checkpoint or resume,
+        resume=resume
+    )
+    saturation_points = {trajectory["idx"]: {"saturation_point": saturation_point, "cache": cache_outcome(cache)}}
+    plot_case(trajectory)
 
-        # Store saturation summary
-        saturation_summary_rows.append({
-            "Case": idx,
-            "Combination": combo_str,
-            "Saturation_Point_MW": saturation_point
-        })
+    trajectory_store = ResultsStore(trajectory["output_dir"], os.path.basename(os.path.normpath(trajectory["output_dir"])))
+    for case in others:
+        set_context(case=case["idx"], iteration=None)
+        with phase("result_io"):
+            saturation_point = derive_cost_case(
+                results, trajectory_store, case["output_dir"],
+                case["annualized_cost_value"], case["annualized_CAPEX_component"], case["annualized_OPEX_component"]
+            )
+        saturation_points[case["idx"]] = {"saturation_point": saturation_point, "cache": "derived"}
+        print(f" Case {case['idx']:03d} — CAPEX={case['CAPEX']}, OPEX={case['OPEX']} derived from case {trajectory['idx']:03d}: "
+              f"saturation at {saturation_point} MW → {case['output_dir']}")
+        plot_case(case)
 
-        results_path = os.path.join(output_dir, "final_results1.xlsx")
-        label = f"Case {idx:03d} — RES {int(RES_share*100)}%"
-        plot_revenues(results_path, label)
-        plot_aggregate_revenue_contributions(results_path, label)
+    return saturation_points
+
+
+def main(dry_run=False, workers=1, threads=None, shared_trajectory=False, cache_dir=".scenario_cache", cache_size_gb=2.0,
+         no_cache=False, checkpoint=False, resume=False, profile=False):
+    cases = scenario_grid()
+    if dry_run:
+        print_plan(cases, workers, shared_trajectory)
+        return
+
+    import pandas as pd
+    from market_data import load_market_data
+    from sweep_runner import run_sweep
+    from scenario_cache import ScenarioCache
 
+    # Load static coefficients and the market data once; workers receive them instead of reloading
+    coefficients_bess, coefficients_res = load_coefficients("bess_price_data.xlsx")
+    market = load_market_data()
 
+    # Trajectories are cached by a hash of all their inputs, so an unchanged case of a rerun is restored, not solved
+    cache = None if no_cache else ScenarioCache(cache_dir, max_bytes=int(cache_size_gb * 1024 ** 3))
+
+    # workers > 1 runs the cases in a process pool, each case logging to {output_dir}/run.log;
+    # sweep_manifest.json tracks the status of every case
+    if shared_trajectory:
+        # One job per RES level; every case of a job gets the job's status and its own saturation point
+        jobs = res_groups(cases)
+        job_statuses = run_sweep(partial(run_res_group, coefficients_bess=coefficients_bess, coefficients_res=coefficients_res, market=market,
+                                         cache=cache, checkpoint=checkpoint, resume=resume, profile=profile),
+                                 jobs, workers=workers, threads_per_worker=threads)
+        by_case = {}
+        for job, status in zip(jobs, job_statuses):
+            for case in job["cases"]:
+                by_case[case["idx"]] = {**status, "result": (status.get("result") or {}).get(case["idx"])}
+        statuses = [by_case[case["idx"]] for case in cases]
+    else:
+        statuses = run_sweep(partial(run_case, coefficients_bess=coefficients_bess, coefficients_res=coefficients_res, market=market,
+                                     cache=cache, checkpoint=checkpoint, resume=resume, profile=profile),
+                             cases, workers=workers, threads_per_worker=threads)
+
+    # Store saturation summary. Column order is part of the format: sensitivity_analysis_plot reads the first three
+    # columns by position, saturation_surrogate reads the case inputs by name
+    results = [status.get("result") or {} for status in statuses]
+    saturation_summary_rows = [{
+        "Case": case["idx"],
+        "Combination": case["combination"],
+        "Saturation_Point_MW": result.get("saturation_point"),
+        "Result_Cache": result.get("cache", "failed" if status["status"] == "failed" else None),
+        # Case inputs, so saturation_surrogate can fit the sweep from this file and the case folders
+        "RES_Share": case["RES_share"],
+        "CAPEX": case["CAPEX"],
+        "OPEX": case["OPEX"],
+        "BESS_Duration": BESS_duration,
+        "Annualized_Cost": case["annualized_cost_value"],
+        "Output_Dir": case["output_dir"],
+    } for case, status, result in zip(cases, statuses, results)]
     pd.DataFrame(saturation_summary_rows).to_excel("saturation_summary.xlsx", index=False)
 
-    print("\nAll cases completed and saved.")
+    outcomes = [row["Result_Cache"] for row in saturation_summary_rows]
+    if cache is not None:
+        print(f"\nResult cache ({cache_dir}): {outcomes.count('hit')} hit(s), {outcomes.count('miss')} miss(es)"
+              + (f", {outcomes.count('derived')} case(s) derived from a shared trajectory" if shared_trajectory else ""))
+
+    if profile:
+        from instrumentation import summarize
+        # With a shared trajectory the derived cases are recorded in their trajectory's file
+        profiled = res_groups(cases) if shared_trajectory else cases
+        summary = summarize([os.path.join(job["output_dir"], "phases.jsonl") for job in profiled])
+        print("\nPhase timings over all cases (per-case JSON lines in {output_dir}/phases.jsonl):")
+        print(summary.to_string(float_format=lambda x: f"{x:,.2f}"))
+
+    failed = [case["output_dir"] for case, status in zip(cases, statuses) if status["status"] == "failed"]
+    if failed:
+        print(f"\n{len(failed)} case(s) failed, see sweep_manifest.json: {', '.join(failed)}")
+    else:
+        print("\nAll cases completed and saved.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the BESS saturation sweep over all CAPEX / OPEX / RES cases")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the scenario grid and the estimated number of LP solves, then exit without loading data")
+    parser.add_argument("--workers", type=int, default=1, help="cases solved in parallel (default 1: serial)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="solver threads per worker (default: CPU count / workers when running in parallel)")
+    parser.add_argument("--shared-trajectory", action="store_true",
+                        help="solve one capacity ladder per RES level and re-price it for every CAPEX/OPEX case")
+    parser.add_argument("--cache-dir", default=".scenario_cache", help="folder of the scenario result cache")
+    parser.add_argument("--cache-size-gb", type=float, default=2.0,
+                        help="size limit of the result cache; least recently used entries are evicted beyond it")
+    parser.add_argument("--no-cache", action="store_true", help="always solve, neither reading nor filling the result cache")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="save every case's loop state to checkpoint.pkl in its output folder after every step")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue interrupted cases from the checkpoint.pkl in their output folder (implies --checkpoint)")
+    parser.add_argument("--profile", action="store_true",
+                        help="record wall time and RSS of every phase of every iteration and print a summary table")
+    main(**vars(parser.parse_args()))
@@ -3,8 +3,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+from results_store import read_excel
+
 def plot_revenues(results_path, res_label):
-    results_df = pd.read_excel(results_path)
+    results_df = read_excel(results_path)
     output_dir = os.path.dirname(results_path)
 
     grouped = results_df.groupby('Total_Capacity').agg({
@@ -55,7 +57,7 @@ def plot_revenues(results_path, res_label):
     plt.close()
 
 def plot_aggregate_revenue_contributions(results_path, res_label):
-    results_df = pd.read_excel(results_path)
+    results_df = read_excel(results_path)
     output_dir = os.path.dirname(results_path)
     grouped_capacity = results_df.groupby("Total_Capacity").agg({
         "Marginal_DA_Revenue": "sum",
@@ -0,0 +1,240 @@
+import os
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+
+from run5_ALL_Cases import annualized_capex
+
+# Surrogate of a finished run5_ALL_Cases sweep, for questions between its grid points without another sweep.
+# The dispatch trajectory of a case depends on its RES share and battery duration only; CAPEX and OPEX just set the
+# annualized cost the marginal revenue is compared with (see run_res_group). So the model is a Gaussian process of
+# the marginal revenue per MW over (RES share, duration, installed capacity), fitted to the revenue_debug.xlsx of every
+# case, and a saturation point is where a curve of that process crosses the case's annualized cost:
+#   - revenue_curve: mean and standard deviation of the marginal revenue per MW along the capacity ladder
+#   - saturation: the crossing of the mean curve, and the spread of the crossings of curves drawn from the posterior
+#   - suggest: the (RES share, duration) ladders whose saturation points are least certain, picked one at a time
+#     with the chosen curve added at its predicted mean before the next pick, so a batch does not cluster
+# The kernel is Matern 5/2 with one length scale per input (on inputs scaled to [0, 1]), fitted by maximum marginal
+# likelihood. A feature with one value in the sweep keeps its initial length scale: away from that value the answers
+# are the prior's, and their uncertainty says so.
+# The fitted kernel parameters are kept in .saturation_surrogate.npz next to the summary, keyed by a hash of the
+# training curves, so later queries of the same sweep only condition the process instead of refitting it.
+
+FEATURES = ["RES_Share", "BESS_Duration", "Total_Capacity"]
+
+
+def load_curves(summary_path="saturation_summary.xlsx"):
+    # (summary, curves): one curve row per ladder step of every case with a revenue_debug.xlsx, case folders relative
+    # to the summary; cases on the same trajectory give the same rows, which are averaged
+    summary = pd.read_excel(summary_path)
+    missing = [column for column in ["RES_Share", "BESS_Duration", "Output_Dir"] if column not in summary.columns]
+    if missing:
+        raise ValueError(f"{summary_path} has no {', '.join(missing)} column(s): it was written before run5 recorded "
+                         f"the case inputs; rerun the sweep (cases still in the scenario cache are restored without solving)")
+    folder = os.path.dirname(os.path.abspath(summary_path))
+    curves = []
+    for _, case in summary.iterrows():
+        path = os.path.join(folder, str(case["Output_Dir"]), "revenue_debug.xlsx")
+        if not os.path.exists(path):
+            continue
+        debug = pd.read_excel(path)
+        curves.append(pd.DataFrame({"RES_Share": case["RES_Share"], "BESS_Duration": case["BESS_Duration"],
+                                    "Total_Capacity": debug["Total_Capacity"],
+                                    "Revenue_per_MW": debug["Marginal_Total_Revenue"] / debug["Step_Size"]}))
+    if not curves:
+        raise ValueError(f"No case of {summary_path} has a revenue_debug.xlsx to fit")
+    return summary, pd.concat(curves).groupby(FEATURES, as_index=False)["Revenue_per_MW"].mean()
+
+
+def matern52(A, B, length_scales):
+    r = np.sqrt(np.maximum((((A[:, None, :] - B[None, :, :]) / length_scales) ** 2).sum(axis=2), 0)) * np.sqrt(5)
+    return (1 + r + r ** 2 / 3) * np.exp(-r)
+
+
+def training_digest(curves):
+    # Hash of the training set: features and targets, in load_curves' (sorted) row order
+    return hashlib.sha256(np.ascontiguousarray(curves[FEATURES + ["Revenue_per_MW"]].to_numpy(dtype=float)).tobytes()).hexdigest()
+
+
+def fitted_surrogate(curves, model_path, refit=False):
+    # SaturationSurrogate of curves with the kernel parameters saved in model_path when they were fitted to the same
+    # training set; otherwise fitted and saved there
+    digest = training_digest(curves)
+    if not refit and os.path.exists(model_path):
+        with np.load(model_path) as saved:
+            if str(saved["digest"]) == digest:
+                return SaturationSurrogate(curves, (saved["length_scales"], float(saved["signal"]), float(saved["noise"])))
+    surrogate = SaturationSurrogate(curves)
+    tmp = model_path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, digest=digest, length_scales=surrogate.length_scales, signal=surrogate.signal, noise=surrogate.noise)
+        os.replace(tmp, model_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return surrogate
+
+
+class SaturationSurrogate:
+
+    def __init__(self, curves, hyperparameters=None):
+        # curves: load_curves()[1]; hyperparameters: (length_scales, signal, noise) of an earlier fit to the same curves
+        self.low = curves[FEATURES].min().values.astype(float)
+        self.span = np.where(curves[FEATURES].max().values > self.low, curves[FEATURES].max().values - self.low, 1.0)
+        self.step = float(np.diff(np.unique(curves["Total_Capacity"])).min()) if curves["Total_Capacity"].nunique() > 1 else float(curves["Total_Capacity"].iloc[0])
+        self.max_capacity = float(curves["Total_Capacity"].max())
+        self.X = self.scaled(curves[FEATURES].values)
+        y = curves["Revenue_per_MW"].values.astype(float)
+        self.y_mean, self.y_std = y.mean(), y.std() or 1.0
+        self.y = (y - self.y_mean) / self.y_std
+        self.observed = set(map(tuple, curves[["RES_Share", "BESS_Duration"]].drop_duplicates().values.tolist()))
+        if hyperparameters is None:
+            self.fit()
+        else:
+            self.length_scales, self.signal, self.noise = np.asarray(hyperparameters[0], dtype=float), *hyperparameters[1:]
+            self.condition(self.X, self.y)
+
+    def scaled(self, X):
+        return (np.asarray(X, dtype=float) - self.low) / self.span
+
+    def fit(self):
+        # Length scales, signal and noise variance by maximum marginal likelihood (log parameters, bounded). The LP
+        # curves are deterministic, but the ladder's path dependence makes them ragged step to step: the noise term
+        # absorbs that instead of bending the fit through every step
+        def negative_log_likelihood(theta):
+            K = np.exp(theta[-2]) * matern52(self.X, self.X, np.exp(theta[:-2])) + np.exp(theta[-1]) * np.eye(len(self.X))
+            try:
+                factor = cho_factor(K, lower=True)
+            except np.linalg.LinAlgError:
+                return 1e10
+            return 0.5 * self.y @ cho_solve(factor, self.y) + np.log(np.diag(factor[0])).sum()
+
+        start = np.log([0.5] * len(FEATURES) + [1.0, 1e-3])
+        bounds = [(np.log(0.05), np.log(5.0))] * len(FEATURES) + [(np.log(0.01), np.log(100.0)), (np.log(1e-8), np.log(0.1))]
+        theta = minimize(negative_log_likelihood, start, method="L-BFGS-B", bounds=bounds).x
+        self.length_scales, self.signal, self.noise = np.exp(theta[:-2]), np.exp(theta[-2]), np.exp(theta[-1])
+        self.condition(self.X, self.y)
+
+    def condition(self, X, y):
+        self.X, self.y = X, y
+        K = self.signal * matern52(X, X, self.length_scales) + self.noise * np.eye(len(X))
+        self.factor = cho_factor(K, lower=True)
+        self.alpha = cho_solve(self.factor, y)
+
+    def predict(self, X):
+        # Posterior mean and covariance of the revenue per MW (the underlying curve, without the noise) at raw feature rows X
+        Xs = self.scaled(X)
+        K_s = self.signal * matern52(self.X, Xs, self.length_scales)
+        mean = K_s.T @ self.alpha
+        cov = self.signal * matern52(Xs, Xs, self.length_scales) - K_s.T @ cho_solve(self.factor, K_s)
+        return self.y_mean + self.y_std * mean, self.y_std ** 2 * cov
+
+    def ladder(self, RES_share, BESS_duration, capacities=None):
+        capacities = np.arange(self.step, self.max_capacity + self.step / 2, self.step) if capacities is None else np.asarray(capacities, dtype=float)
+        return capacities, np.column_stack([np.full(len(capacities), RES_share), np.full(len(capacities), BESS_duration), capacities])
+
+    def revenue_curve(self, RES_share, BESS_duration=4, capacities=None, CAPEX=None, OPEX=None):
+        # Marginal revenue per MW along the ladder (default: the sweep's capacities) with its standard deviation;
+        # with CAPEX and OPEX also the marginal net revenue per MW
+        capacities, X = self.ladder(RES_share, BESS_duration, capacities)
+        mean, cov = self.predict(X)
+        curve = pd.DataFrame({"Total_Capacity": capacities, "Marginal_Revenue_per_MW": mean,
+                              "Std_per_MW": np.sqrt(np.maximum(np.diag(cov), 0))})
+        if CAPEX is not None and OPEX is not None:
+            curve["Marginal_Net_Revenue_per_MW"] = mean - (annualized_capex(CAPEX) + OPEX)
+        return curve
+
+    def saturation(self, RES_share, CAPEX, OPEX, BESS_duration=4, samples=500, seed=0):
+        # Saturation point (MW) of a case: the mean curve's crossing and the spread of the crossings of `samples`
+        # posterior curves (interpolated like interpolate_saturation); None / NaN where a curve does not cross
+        capacities, X = self.ladder(RES_share, BESS_duration)
+        mean, cov = self.predict(X)
+        cost = annualized_capex(CAPEX) + OPEX
+        root = np.linalg.cholesky(cov + 1e-9 * self.y_std ** 2 * np.eye(len(cov)))
+        draws = mean + (root @ np.random.default_rng(seed).standard_normal((len(mean), samples))).T
+        crossings = np.array([crossing(capacities, draw - cost) for draw in draws])
+        crossed = crossings[~np.isnan(crossings)]
+        estimate = crossing(capacities, mean - cost)
+        return {
+            "Saturation_Point_MW": None if np.isnan(estimate) else float(estimate),
+            "Std_MW": float(crossed.std()) if len(crossed) else None,
+            "P5_MW": float(np.percentile(crossed, 5)) if len(crossed) else None,
+            "P95_MW": float(np.percentile(crossed, 95)) if len(crossed) else None,
+            "No_Crossing_Share": float(1 - len(crossed) / samples),
+            "Annualized_Cost": cost,
+        }
+
+    def suggest(self, candidates, count=3, samples=200):
+        # The `count` (RES share, duration) ladders to simulate next: candidates are dicts with RES_Share, CAPEX,
+        # OPEX and BESS_Duration; ladders the sweep already ran are skipped. A ladder scores the largest saturation
+        # uncertainty of its cost cases (a curve that may not cross within the sweep's capacities counts as uncertain
+        # over the whole range)
+        X, y = self.X, self.y
+        ladders = {}
+        for candidate in candidates:
+            if (candidate["RES_Share"], candidate["BESS_Duration"]) not in self.observed:
+                ladders.setdefault((candidate["RES_Share"], candidate["BESS_Duration"]), []).append(candidate)
+        picks = []
+        for _ in range(min(count, len(ladders))):
+            scores = {}
+            for (RES_share, BESS_duration), cases in ladders.items():
+                if (RES_share, BESS_duration) in [(pick["RES_Share"], pick["BESS_Duration"]) for pick in picks]:
+                    continue
+                results = [self.saturation(RES_share, case["CAPEX"], case["OPEX"], BESS_duration, samples) for case in cases]
+                scores[(RES_share, BESS_duration)] = max((result["Std_MW"] or 0) + result["No_Crossing_Share"] * self.max_capacity
+                                                         for result in results)
+            (RES_share, BESS_duration), score = max(scores.items(), key=lambda item: item[1])
+            picks.append({"RES_Share": RES_share, "BESS_Duration": BESS_duration, "Saturation_Std_MW": score})
+            # Pretend the ladder was run and came out at the predicted mean, so the next pick looks elsewhere
+            capacities, new_X = self.ladder(RES_share, BESS_duration)
+            mean, _ = self.predict(new_X)
+            self.condition(np.vstack([self.X, self.scaled(new_X)]), np.concatenate([self.y, (mean - self.y_mean) / self.y_std]))
+        self.condition(X, y)
+        return pd.DataFrame(picks)
+
+
+def crossing(capacities, net):
+    # First positive -> non-positive crossing of a net revenue curve, linearly interpolated; NaN if there is none
+    for i in range(1, len(net)):
+        if net[i - 1] > 0 and net[i] <= 0:
+            return capacities[i - 1] - net[i - 1] * (capacities[i] - capacities[i - 1]) / (net[i] - net[i - 1])
+    return np.nan
+
+
+def candidate_grid(summary, RES_values=None, durations=None):
+    # Every observed CAPEX / OPEX pair at each RES share (default: 9 levels over the sweep's range) and duration
+    pairs = summary[["CAPEX", "OPEX"]].drop_duplicates().values.tolist()
+    RES_values = RES_values or np.linspace(summary["RES_Share"].min(), summary["RES_Share"].max(), 9).round(4).tolist()
+    durations = durations or summary["BESS_Duration"].unique().tolist()
+    return [{"RES_Share": RES, "CAPEX": CAPEX, "OPEX": OPEX, "BESS_Duration": duration}
+            for RES in RES_values for duration in durations for CAPEX, OPEX in pairs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a surrogate of a finished saturation sweep")
+    parser.add_argument("--summary", default="saturation_summary.xlsx", help="run5_ALL_Cases summary (case folders next to it)")
+    parser.add_argument("--query", nargs=3, type=float, metavar=("RES", "CAPEX", "OPEX"),
+                        help="saturation point of one case, with its uncertainty")
+    parser.add_argument("--curve", type=float, metavar="RES", help="marginal revenue per MW along the capacity ladder")
+    parser.add_argument("--duration", type=float, default=4, help="BESS duration (h) of --query / --curve")
+    parser.add_argument("--suggest", type=int, metavar="N", help="the N RES levels to simulate next")
+    parser.add_argument("--res", nargs="+", type=float, help="RES shares --suggest chooses from (default: 9 over the sweep's range)")
+    parser.add_argument("--refit", action="store_true", help="fit the kernel again even if the saved fit matches the sweep")
+    args = parser.parse_args()
+
+    summary, curves = load_curves(args.summary)
+    model_path = os.path.join(os.path.dirname(os.path.abspath(args.summary)), ".saturation_surrogate.npz")
+    surrogate = fitted_surrogate(curves, model_path, args.refit)
+    print(f"Surrogate of {len(curves)} ladder steps from {args.summary}; length scales (scaled "
+          f"{', '.join(FEATURES)}): {', '.join(f'{scale:.3g}' for scale in surrogate.length_scales)}")
+    if args.query:
+        RES, CAPEX, OPEX = args.query
+        print(surrogate.saturation(RES, CAPEX, OPEX, args.duration))
+    if args.curve is not None:
+        print(surrogate.revenue_curve(args.curve, args.duration).to_string(index=False, float_format=lambda x: f"{x:,.0f}"))
+    if args.suggest:
+        print(surrogate.suggest(candidate_grid(summary, args.res), args.suggest).to_string(index=False))
@@ -0,0 +1,139 @@
+import os
+import json
+import glob
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+from excel_cache import file_digest
+from results_store import FORMATS, default_format, _write, _read
+from market_data import MarketData
+
+# Finished run_iterations trajectories, content-addressed: an entry is named by the hash of everything that shapes
+# the trajectory (initial prices, market volumes, coefficients, ladder and cost settings, backend, and the source of
+# the modules that build and update the LP, which carries constants such as the round-trip efficiency).
+# {root}/{key}/ holds the hourly and iterations tables plus meta.json; the least recently used entries are evicted
+# once the cache grows past max_bytes.
+
+# Bump when the entry layout changes so existing entries are ignored
+CACHE_VERSION = 1
+
+# Modules whose code determines a trajectory; editing any of them invalidates every entry
+CODE_FILES = ["run2_BESS_optimization.py", "run3_updatePrices.py", "run4_RES_iterations.py",
+              "bess_matrix_lp.py", "persistent_lp.py", "decomposed_dispatch.py", "solver_backend.py",
+              "price_impact_equilibrium.py", "fixed_point_equilibrium.py", "da_dispatch.py",
+              "heuristic_dispatch.py"]
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def _update(digest, value):
+    # Feeds a value into the hash by content: frames and arrays by their bytes, mappings in key order
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update(digest, value[key])
+    elif isinstance(value, MarketData):
+        for name in value.columns:
+            digest.update(name.encode())
+            _update(digest, np.asarray(value[name]))
+    else:
+        digest.update(repr(value).encode())
+
+
+def code_digest(folder=os.path.dirname(os.path.abspath(__file__))):
+    paths = [os.path.join(folder, name) for name in CODE_FILES]
+    return {os.path.basename(path): file_digest(path) for path in paths if os.path.exists(path)}
+
+
+def scenario_key(**inputs):
+    digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    _update(digest, code_digest())
+    _update(digest, inputs)
+    return digest.hexdigest()[:24]
+
+
+class CachedResults:
+    # The tables of a cache entry, with the .read("hourly") / .read("iterations") interface of ResultAccumulator
+
+    def __init__(self, folder, fmt):
+        self.folder = folder
+        self.fmt = fmt
+
+    def read(self, table):
+        return _read(os.path.join(self.folder, table + FORMATS[self.fmt]), self.fmt)
+
+
+class ScenarioCache:
+    # Small handle (root, size limit, format) that is cheap to send to pool workers; every lookup is appended to
+    # .log as {"key", "outcome": "hit" | "miss"} so callers can report on it
+
+    def __init__(self, root=".scenario_cache", max_bytes=DEFAULT_MAX_BYTES, fmt=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fmt = fmt or default_format()
+        self.log = []
+
+    def get(self, key):
+        # (saturation point, CachedResults) or None
+        folder = os.path.join(self.root, key)
+        meta_path = os.path.join(folder, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            os.utime(meta_path)  # last use, for eviction
+        except (OSError, ValueError):
+            self.log.append({"key": key, "outcome": "miss"})
+            return None
+        self.log.append({"key": key, "outcome": "hit"})
+        return meta["saturation_point"], CachedResults(folder, meta["format"])
+
+    def put(self, key, saturation_point, results):
+        # Written to a private folder and renamed into place, so concurrent workers never see a partial entry
+        folder = os.path.join(self.root, key)
+        tmp = f"{folder}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            for table in ("hourly", "iterations"):
+                _write(results.read(table), os.path.join(tmp, table + FORMATS[self.fmt]), self.fmt)
+            size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(tmp, "*")))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"saturation_point": saturation_point, "format": self.fmt, "bytes": size}, f)
+            os.rename(tmp, folder)
+        except OSError as exc:  # e.g. another worker stored the same key first
+            print(f"Scenario cache: entry {key} not stored: {exc}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+
+    def entries(self):
+        # [(last use, bytes, folder)] of all complete entries, oldest first
+        entries = []
+        for meta_path in glob.glob(os.path.join(self.root, "*", "meta.json")):
+            try:
+                with open(meta_path) as f:
+                    size = json.load(f)["bytes"]
+                entries.append((os.path.getmtime(meta_path), size, os.path.dirname(meta_path)))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        # Drops least recently used entries until the cache fits in max_bytes (the entry `keep` is never dropped)
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, folder in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.basename(folder) == keep:
+                continue
+            shutil.rmtree(folder, ignore_errors=True)
+            total -= size
+            print(f"Scenario cache: evicted {os.path.basename(folder)} ({size / 1e6:.1f} MB)")
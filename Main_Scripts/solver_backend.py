@@ -0,0 +1,87 @@
+import time
+from pyomo.environ import SolverFactory
+from pyomo.opt import TerminationCondition
+
+# Pyomo plugin behind each engine name
+SOLVER_PLUGINS = {"highs": "appsi_highs", "gurobi": "gurobi", "cbc": "cbc"}
+
+# Engines tried, in order, when the requested one is missing or refuses to run (e.g. no Gurobi licence)
+FALLBACK_SOLVERS = ["highs", "cbc"]
+
+# Generic option names mapped to each engine's own; any other key is passed through unchanged
+OPTION_NAMES = {
+    "highs": {"threads": "threads", "method": "solver", "tolerance": "primal_feasibility_tolerance", "time_limit": "time_limit", "mip_gap": "mip_rel_gap"},
+    "gurobi": {"threads": "Threads", "method": "Method", "tolerance": "FeasibilityTol", "time_limit": "TimeLimit", "mip_gap": "MIPGap"},
+    "cbc": {"threads": "threads", "method": None, "tolerance": "primalTolerance", "time_limit": "sec", "mip_gap": "ratioGap"},
+}
+METHOD_VALUES = {
+    "highs": {"auto": "choose", "simplex": "simplex", "dual": "simplex", "primal": "simplex", "barrier": "ipm"},
+    "gurobi": {"auto": -1, "simplex": 1, "primal": 0, "dual": 1, "barrier": 2},
+}
+
+# Termination conditions that come with a usable solution (time limits only count if a solution was loaded)
+ACCEPTED = {TerminationCondition.optimal, TerminationCondition.locallyOptimal, TerminationCondition.globallyOptimal}
+ACCEPTED_WITH_SOLUTION = {TerminationCondition.maxTimeLimit, TerminationCondition.maxIterations}
+
+
+def solver_options(name, options):
+    translated = {}
+    for key, value in (options or {}).items():
+        native = OPTION_NAMES[name].get(key, key)
+        if native is None:
+            continue
+        if key == "method":
+            value = METHOD_VALUES.get(name, {}).get(value, value)
+        translated[native] = value
+    return translated
+
+
+def make_solver(name, options=None):
+    if name not in SOLVER_PLUGINS:
+        raise ValueError(f"Unknown solver '{name}', expected one of {sorted(SOLVER_PLUGINS)}")
+    opt = SolverFactory(SOLVER_PLUGINS[name])
+    if not opt.available(exception_flag=False):
+        return None
+    for key, value in solver_options(name, options).items():
+        opt.options[key] = value
+    return opt
+
+
+def solve_model(model, solver="gurobi", options=None, fallback=FALLBACK_SOLVERS, tee=False, warmstart=False):
+    # Solves with the first engine that is available and runs, checks the termination condition
+    # and returns {"solver", "termination", "wall_time", "bounds"}; bounds are the (lower, upper) objective bounds the
+    # engine reports, which is where the remaining MIP gap of a time-limited solve shows
+    # warmstart passes the current variable values as a starting solution to engines that accept one
+    attempts = []
+    for name in dict.fromkeys([solver] + list(fallback or [])):
+        opt = make_solver(name, options)
+        if opt is None:
+            attempts.append(f"{name}: not available")
+            continue
+
+        kwargs = {"tee": tee, "load_solutions": False}
+        if warmstart and opt.warm_start_capable():
+            kwargs["warmstart"] = True
+        start = time.perf_counter()
+        try:
+            results = opt.solve(model, **kwargs)
+        except Exception as exc:  # licence errors and missing executables surface here
+            attempts.append(f"{name}: {exc}")
+            continue
+        wall_time = time.perf_counter() - start
+
+        termination = results.solver.termination_condition
+        if termination not in ACCEPTED | ACCEPTED_WITH_SOLUTION:
+            raise RuntimeError(f"Solver {name} terminated with '{termination}' ({results.solver.status}); no solution loaded")
+        try:
+            model.solutions.load_from(results)
+        except Exception as exc:
+            raise RuntimeError(f"Solver {name} terminated with '{termination}' but returned no solution: {exc}")
+
+        if attempts:
+            print(f"Solver fallback: {'; '.join(attempts)} -> using {name}")
+        print(f"Solved with {name}: {termination} in {wall_time:.2f} s")
+        bounds = (results.problem.lower_bound, results.problem.upper_bound)
+        return {"solver": name, "termination": str(termination), "wall_time": wall_time, "bounds": bounds}
+
+    raise RuntimeError("No solver could solve the model: " + "; ".join(attempts))
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import traceback
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Thread pools that NumPy/SciPy (BLAS), HiGHS and friends size from the environment
+THREAD_ENV = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"]
+
+
+def limit_threads(threads):
+    # Worker initializer. Workers are spawned, so this runs before the case code imports NumPy and the limits stick.
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    os.environ.setdefault("MPLBACKEND", "Agg")  # plots are written to files, workers have no display
+
+
+def write_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, default=str)
+    os.replace(tmp, path)
+
+
+def _run_one(run_case, case, threads, log):
+    # Runs one case and reports instead of raising, so a failing case does not stop the sweep
+    start = time.time()
+    status = {"status": "done", "started": start, "pid": os.getpid()}
+    try:
+        if log:
+            os.makedirs(case["output_dir"], exist_ok=True)
+            with open(os.path.join(case["output_dir"], "run.log"), "w") as f, contextlib.redirect_stdout(f):
+                status["result"] = run_case(case, threads)
+        else:
+            status["result"] = run_case(case, threads)
+    except Exception:
+        status.update(status="failed", error=traceback.format_exc())
+    status.update(finished=time.time(), wall_time=time.time() - start)
+    return status
+
+
+def run_sweep(run_case, cases, workers=1, threads_per_worker=None, manifest_path="sweep_manifest.json"):
+    # Runs run_case(case, threads) for every case, `workers` at a time, and keeps a status manifest
+    # ({output_dir: status, timing, result or error}) up to date as cases finish.
+    # Returns the per-case statuses in case order. workers=1 runs in this process with its output on the console.
+    workers = max(1, min(workers, len(cases)))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    manifest = {case["output_dir"]: {"case": case["idx"], "status": "queued"} for case in cases}
+    write_manifest(manifest_path, manifest)
+    print(f"Sweep: {len(cases)} case(s) on {workers} worker(s), {threads} solver thread(s) each; manifest in {manifest_path}")
+
+    def record(case, status):
+        manifest[case["output_dir"]].update(status)
+        write_manifest(manifest_path, manifest)
+        done = sum(entry["status"] in ("done", "failed") for entry in manifest.values())
+        print(f"[{done}/{len(cases)}] {case['output_dir']}: {status['status']} in {status['wall_time']:.1f} s")
+        if status["status"] == "failed":
+            print(status["error"], file=sys.stderr)
+
+    if workers == 1:
+        for case in cases:
+            manifest[case["output_dir"]].update(status="running", started=time.time())
+            write_manifest(manifest_path, manifest)
+            record(case, _run_one(run_case, case, threads_per_worker, log=False))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=limit_threads, initargs=(threads,)) as pool:
+            futures = {pool.submit(_run_one, run_case, case, threads, True): case for case in cases}
+            for future in as_completed(futures):
+                record(futures[future], future.result())
+
+    return [manifest[case["output_dir"]] for case in cases]
@@ -9,7 +9,8 @@ usecols = [
     'Imbalance_Price_Surplus', 'Imbalance_Price_Shortage',
     'aFRR_Up_Price_reserve', 'aFRR_Down_Price_reserve'
 ]
-df = pd.read_excel('final_results1.xlsx', usecols=usecols)
+# All sheets: run4 splits final_results1.xlsx over Sheet1..SheetN past the Excel row limit
+df = pd.concat(pd.read_excel('final_results1.xlsx', usecols=usecols, sheet_name=None).values(), ignore_index=True)
 
 # Filter to every 1000 MW
 fixed_capacities = sorted([c for c in df['Total_Capacity'].unique() if c % 1000 == 0])
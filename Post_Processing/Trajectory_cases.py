@@ -4,6 +4,10 @@ import os
 from numpy_financial import irr
 import matplotlib.pyplot as plt
 
+def read_sheets(path):
+    # All sheets of a run4 workbook (split over Sheet1..SheetN past the Excel row limit) as one frame
+    return pd.concat(pd.read_excel(path, sheet_name=None).values(), ignore_index=True)
+
 def build_discounted_matrix_from_trajectory(bess_traj, res_traj, revenues_by_res, n_steps, discount_rate):
     lifetime = 20
     n_years = len(bess_traj) + lifetime  # 15 install years + 20 for lifetime
@@ -111,9 +115,9 @@ def build_worst_case_matrix(revenues_by_res, discount_rate, n_steps, years):
 
 # === Load marginal revenues ===
 raw_revenues_by_res = {
-    50: (df := pd.read_excel("results_case_016/revenue_debug.xlsx"))["Marginal_Net_Revenue"].values + df["Marginal_CAPEX_Cost"].values,
-    70: (df := pd.read_excel("results_case_017/revenue_debug.xlsx"))["Marginal_Net_Revenue"].values + df["Marginal_CAPEX_Cost"].values,
-    90: (df := pd.read_excel("results_case_018/revenue_debug.xlsx"))["Marginal_Net_Revenue"].values + df["Marginal_CAPEX_Cost"].values
+    50: (df := read_sheets("results_case_016/revenue_debug.xlsx"))["Marginal_Net_Revenue"].values + df["Marginal_CAPEX_Cost"].values,
+    70: (df := read_sheets("results_case_017/revenue_debug.xlsx"))["Marginal_Net_Revenue"].values + df["Marginal_CAPEX_Cost"].values,
+    90: (df := read_sheets("results_case_018/revenue_debug.xlsx"))["Marginal_Net_Revenue"].values + df["Marginal_CAPEX_Cost"].values
 }
 max_len = max(len(arr) for arr in raw_revenues_by_res.values())
 installed_capacities = [f"Installed {cap} MW" for cap in range(100, max_len * 100 + 1, 100)]
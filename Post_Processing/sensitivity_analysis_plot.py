@@ -4,7 +4,7 @@ import matplotlib.ticker as ticker
 
 # Load the Excel file
 file_path = "saturation_summary.xlsx"
-df = pd.read_excel(file_path)
+df = pd.read_excel(file_path, usecols=[0, 1, 2])  # Case, Combination, Saturation_Point_MW; run5 appends more columns
 
 # Ensure correct column names
 df.columns = ["Case", "Combination", "Saturation Point"]